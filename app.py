@@ -1,9 +1,23 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, g
 from werkzeug.utils import secure_filename
 import os
 import json
 import uuid
 import random
+import time
+
+import numpy as np
+
+from config import (JOB_QUEUE_CONFIG, METRICS_CONFIG, MODEL_CONFIG, PERFORMANCE_CONFIG,
+                    UPLOAD_STORAGE_CONFIG)
+from food_matcher import TrigramIndex
+from inference_engine import BatchingInferenceEngine, decode_image
+from job_queue import DONE, FAILED, QUEUED, QueueFull, create_job_queue
+from metrics import METRICS, time_stage
+from nutrition_db import NUTRIENTS, NUTRITION_TABLE, UPLOAD_SCENARIOS
+from upload_cache import create_result_cache
+from upload_janitor import UploadJanitor, shard_relpath
+from upload_stream import InMemoryUploadRequest, read_upload, save_upload
 
 # Note: We're using mock data for the web interface
 # If you want to use the actual AI system, uncomment these:
@@ -17,6 +31,7 @@ import random
 # from config import get_config
 
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
 app.secret_key = 'your_secret_key_here'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
@@ -29,199 +44,139 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Candidate foods for images whose filename names no known food, and the
+# classes of a served model whose weights carry no class names
+UPLOAD_FOOD_KEYS = tuple(UPLOAD_SCENARIOS)
+
+# Fuzzy matcher for manually entered food names
+FOOD_MATCHER = TrigramIndex(NUTRITION_TABLE.names)
+
+# Analysis results keyed by a hash of the uploaded image bytes
+UPLOAD_CACHE = create_result_cache(PERFORMANCE_CONFIG)
+
+# Keeps static/uploads within its quota; started by run_app.py, by the
+# __main__ block below and by gunicorn's post_fork hook
+UPLOAD_JANITOR = UploadJanitor.from_config(UPLOAD_FOLDER, UPLOAD_STORAGE_CONFIG)
+
+# Process pool for asynchronous /upload jobs
+UPLOAD_JOBS = create_job_queue(JOB_QUEUE_CONFIG)
+
+def load_food_classifier():
+    """Load the upload classifier selected by MODEL_CONFIG (int8, exported or eager, optionally cascaded)"""
+    from food_models import load_serving_model
+    
+    return load_serving_model(len(UPLOAD_FOOD_KEYS), MODEL_CONFIG)
+
+def served_food_key(class_idx):
+    """Map an output index of the served model to its UPLOAD_SCENARIOS key, or None"""
+    class_names = getattr(INFERENCE_ENGINE.model, 'class_names', None) or UPLOAD_FOOD_KEYS
+    if class_idx >= len(class_names):
+        return None
+    food_key = class_names[class_idx].lower()
+    return food_key if food_key in UPLOAD_SCENARIOS else None
+
+# Batches concurrent upload classifications into single forward passes; the
+# model is loaded in each worker on its first request
+INFERENCE_ENGINE = BatchingInferenceEngine(
+    load_food_classifier,
+    max_batch_size=MODEL_CONFIG['inference_max_batch_size'],
+    max_wait_ms=MODEL_CONFIG['inference_max_wait_ms'],
+    max_queue_depth=PERFORMANCE_CONFIG['inference_queue_depth']
+)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the request and observe its latency under its route pattern"""
+    started = g.pop('request_started', None)
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    if not METRICS_CONFIG['enabled'] or started is None or rule in ('/metrics', '/static/<path:filename>'):
+        return response
+    
+    METRICS.observe('nutrivision_http_request_duration_seconds', time.perf_counter() - started,
+                    {'route': rule})
+    METRICS.inc('nutrivision_http_requests_total',
+                {'route': rule, 'method': request.method, 'status': str(response.status_code)})
+    if response.status_code >= 400:
+        METRICS.inc('nutrivision_http_request_errors_total', {'route': rule})
+    # Publish this worker's values for whichever worker serves /metrics
+    METRICS.flush()
+    return response
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def process_image_for_detection(image_path):
-    """Process uploaded image and return nutrition analysis"""
+def process_image_for_detection(image_path, image_data=None):
+    """
+    Process uploaded image and return nutrition analysis
+    
+    image_data optionally carries the image bytes (e.g. a memoryview over the
+    request buffer) so detection does not need the file at image_path;
+    without it the model classifies the saved file.
+    """
     try:
         # Extract filename to determine food type
         filename = os.path.basename(image_path)
         original_filename = filename.split('_', 1)[1] if '_' in filename else filename
         
-        # Different nutrition data based on image type
-        nutrition_scenarios = {
-            # Fruits
-            'apple': {
-                'food_name': 'Apple',
-                'confidence': 0.92,
-                'nutrition_per_100g': {
-                    'calories': 52, 'protein': 0.3, 'carbs': 14, 'fat': 0.2, 'fiber': 2.4, 'sugar': 10,
-                    'sodium': 1, 'vitamin_c': 4.6, 'vitamin_a': 3, 'calcium': 6, 'iron': 0.1
-                },
-                'suggestions': [
-                    'Great source of fiber and vitamin C',
-                    'Low in calories, perfect for snacking',
-                    'Contains antioxidants for heart health'
-                ]
-            },
-            'banana': {
-                'food_name': 'Banana',
-                'confidence': 0.89,
-                'nutrition_per_100g': {
-                    'calories': 89, 'protein': 1.1, 'carbs': 23, 'fat': 0.3, 'fiber': 2.6, 'sugar': 12,
-                    'sodium': 1, 'vitamin_c': 8.7, 'vitamin_a': 3, 'calcium': 5, 'iron': 0.3
-                },
-                'suggestions': [
-                    'Excellent source of potassium',
-                    'Good for pre/post workout energy',
-                    'Natural mood booster'
-                ]
-            },
-            'orange': {
-                'food_name': 'Orange',
-                'confidence': 0.91,
-                'nutrition_per_100g': {
-                    'calories': 47, 'protein': 0.9, 'carbs': 12, 'fat': 0.1, 'fiber': 2.4, 'sugar': 9,
-                    'sodium': 0, 'vitamin_c': 53.2, 'vitamin_a': 225, 'calcium': 40, 'iron': 0.1
-                },
-                'suggestions': [
-                    'Excellent source of vitamin C',
-                    'Boosts immune system',
-                    'Good for skin health'
-                ]
-            },
-            # Vegetables
-            'broccoli': {
-                'food_name': 'Broccoli',
-                'confidence': 0.88,
-                'nutrition_per_100g': {
-                    'calories': 34, 'protein': 2.8, 'carbs': 7, 'fat': 0.4, 'fiber': 2.6, 'sugar': 1.5,
-                    'sodium': 33, 'vitamin_c': 89.2, 'vitamin_a': 623, 'calcium': 47, 'iron': 0.7
-                },
-                'suggestions': [
-                    'Superfood with high vitamin C content',
-                    'Excellent for bone health',
-                    'Anti-inflammatory properties'
-                ]
-            },
-            'salad': {
-                'food_name': 'Mixed Salad',
-                'confidence': 0.85,
-                'nutrition_per_100g': {
-                    'calories': 25, 'protein': 2.1, 'carbs': 4.8, 'fat': 0.3, 'fiber': 2.1, 'sugar': 2.2,
-                    'sodium': 28, 'vitamin_c': 15.3, 'vitamin_a': 156, 'calcium': 32, 'iron': 0.8
-                },
-                'suggestions': [
-                    'Low calorie, high nutrient density',
-                    'Great for weight management',
-                    'Add protein for balanced meal'
-                ]
-            },
-            # Proteins
-            'chicken': {
-                'food_name': 'Grilled Chicken',
-                'confidence': 0.87,
-                'nutrition_per_100g': {
-                    'calories': 165, 'protein': 31, 'carbs': 0, 'fat': 3.6, 'fiber': 0, 'sugar': 0,
-                    'sodium': 74, 'vitamin_c': 0, 'vitamin_a': 6, 'calcium': 15, 'iron': 1.0
-                },
-                'suggestions': [
-                    'Excellent lean protein source',
-                    'Great for muscle building',
-                    'Low in saturated fat'
-                ]
-            },
-            'fish': {
-                'food_name': 'Grilled Fish',
-                'confidence': 0.84,
-                'nutrition_per_100g': {
-                    'calories': 208, 'protein': 25, 'carbs': 0, 'fat': 12, 'fiber': 0, 'sugar': 0,
-                    'sodium': 59, 'vitamin_c': 3.9, 'vitamin_a': 149, 'calcium': 9, 'iron': 0.3
-                },
-                'suggestions': [
-                    'Rich in omega-3 fatty acids',
-                    'Great for heart health',
-                    'High-quality protein source'
-                ]
-            },
-            # Grains
-            'rice': {
-                'food_name': 'Steamed Rice',
-                'confidence': 0.86,
-                'nutrition_per_100g': {
-                    'calories': 130, 'protein': 2.7, 'carbs': 28, 'fat': 0.3, 'fiber': 0.4, 'sugar': 0.1,
-                    'sodium': 1, 'vitamin_c': 0, 'vitamin_a': 0, 'calcium': 10, 'iron': 0.2
-                },
-                'suggestions': [
-                    'Good energy source',
-                    'Pair with protein and vegetables',
-                    'Consider brown rice for more fiber'
-                ]
-            },
-            'bread': {
-                'food_name': 'Fresh Bread',
-                'confidence': 0.83,
-                'nutrition_per_100g': {
-                    'calories': 265, 'protein': 9, 'carbs': 49, 'fat': 3.2, 'fiber': 2.7, 'sugar': 5,
-                    'sodium': 491, 'vitamin_c': 0, 'vitamin_a': 0, 'calcium': 151, 'iron': 3.6
-                },
-                'suggestions': [
-                    'Good source of B vitamins',
-                    'Watch sodium content',
-                    'Choose whole grain for more fiber'
-                ]
-            },
-            # Mixed dishes
-            'pizza': {
-                'food_name': 'Pizza Slice',
-                'confidence': 0.82,
-                'nutrition_per_100g': {
-                    'calories': 266, 'protein': 11, 'carbs': 33, 'fat': 10, 'fiber': 2.5, 'sugar': 3.8,
-                    'sodium': 598, 'vitamin_c': 1.2, 'vitamin_a': 89, 'calcium': 188, 'iron': 2.1
-                },
-                'suggestions': [
-                    'Moderate portion size',
-                    'Add vegetables for nutrition',
-                    'Consider thin crust for fewer calories'
-                ]
-            },
-            'sandwich': {
-                'food_name': 'Sandwich',
-                'confidence': 0.81,
-                'nutrition_per_100g': {
-                    'calories': 245, 'protein': 12.5, 'carbs': 28.3, 'fat': 8.7, 'fiber': 4.2, 'sugar': 6.8,
-                    'sodium': 320, 'vitamin_c': 15.2, 'vitamin_a': 180, 'calcium': 85, 'iron': 2.1
-                },
-                'suggestions': [
-                    'Good protein-carb balance',
-                    'Add vegetables for fiber',
-                    'Choose lean protein options'
-                ]
-            }
-        }
-        
         # Try to match the image to a food type
         detected_food = None
-        for food_key in nutrition_scenarios.keys():
-            if food_key.lower() in original_filename.lower():
-                detected_food = food_key
-                break
+        model_confidence = None
+        if MODEL_CONFIG['serve_model']:
+            # Classify with FoodClassifier through the batching engine
+            with time_stage('decode'):
+                if image_data is None:
+                    with open(image_path, 'rb') as f:
+                        image_data = f.read()
+                tensor = decode_image(image_data, MODEL_CONFIG['input_size'])
+            with time_stage('detection'):
+                probabilities = INFERENCE_ENGINE.infer(tensor)
+            confidence, class_idx = probabilities.max(dim=0)
+            # Classes are matched by the names saved with the weights, since
+            # training orders them by folder name
+            detected_food = served_food_key(int(class_idx))
+            if detected_food is not None:
+                model_confidence = round(float(confidence), 2)
+        if detected_food is None:
+            with time_stage('detection'):
+                for food_key in UPLOAD_SCENARIOS:
+                    if food_key.lower() in original_filename.lower():
+                        detected_food = food_key
+                        break
         
         # If no specific match, use a random scenario
         if not detected_food:
-            detected_food = random.choice(list(nutrition_scenarios.keys()))
-        
-        # Get the nutrition data
-        nutrition_data = nutrition_scenarios[detected_food]
+            detected_food = random.choice(UPLOAD_FOOD_KEYS)
         
-        # Calculate total nutrition (assuming 150g serving)
-        serving_size = 150
-        total_nutrition = {}
-        for nutrient, value in nutrition_data['nutrition_per_100g'].items():
-            total_nutrition[nutrient] = round(value * serving_size / 100, 1)
+        # Get the nutrition data from the shared table
+        food_name, confidence, suggestions = UPLOAD_SCENARIOS[detected_food]
+        if model_confidence is not None:
+            confidence = model_confidence
+        with time_stage('nutrition_lookup'):
+            nutrition_per_100g = NUTRITION_TABLE.row(detected_food)
+            
+            # Calculate total nutrition (assuming 150g serving)
+            serving_size = 150
+            total_nutrition = {
+                nutrient: round(value, 1)
+                for nutrient, value in zip(NUTRIENTS, (nutrition_per_100g * serving_size / 100).tolist())
+            }
         
         # Calculate health score
-        health_score = calculate_health_score(total_nutrition)
+        with time_stage('suggestions'):
+            health_score = calculate_health_score(total_nutrition)
         
         result = {
-            'food_name': nutrition_data['food_name'],
-            'confidence': nutrition_data['confidence'],
+            'food_name': food_name,
+            'confidence': confidence,
             'detected_type': detected_food,
             'serving_size_g': serving_size,
-            'nutrition_per_100g': nutrition_data['nutrition_per_100g'],
+            'nutrition_per_100g': NUTRITION_TABLE.to_dict(nutrition_per_100g),
             'total_nutrition': total_nutrition,
-            'suggestions': nutrition_data['suggestions'],
+            'suggestions': list(suggestions),
             'health_score': health_score
         }
         
@@ -229,6 +184,9 @@ def process_image_for_detection(image_path):
             'success': True,
             'data': result
         }
+    except QueueFull:
+        # Overload is reported to the client as backpressure, not a failure
+        raise
     except Exception as e:
         return {
             'success': False,
@@ -240,6 +198,23 @@ def index():
     """Main page with image upload and nutrition analysis"""
     return render_template('index.html')
 
+def analyze_upload_job(filepath, image_data, image_path):
+    """Run detection for a queued upload inside a job worker process"""
+    result = process_image_for_detection(filepath, image_data)
+    if not result['success']:
+        raise RuntimeError(result['error'])
+    result['data']['image_path'] = image_path
+    return result['data']
+
+def persist_upload(filepath, image_data):
+    """Save an upload after its response has gone out"""
+    try:
+        save_upload(filepath, image_data)
+    except OSError as e:
+        app.logger.warning(f"Could not save upload {filepath}: {e}")
+    finally:
+        image_data.release()
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """Handle image upload and nutrition analysis"""
@@ -252,135 +227,121 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         try:
-            # Generate unique filename
-            filename = f"{uuid.uuid4()}_{secure_filename(file.filename)}"
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            # Hash the image while reading it; a re-upload of the same bytes
+            # skips both the disk write and detection
+            with time_stage('decode'):
+                digest, image_data = read_upload(file.stream)
+            cached = UPLOAD_CACHE.get(digest)
+            if cached is not None:
+                return jsonify(cached)
             
-            # Save the file
-            file.save(filepath)
+            # Generate unique filename, stored in a hash-prefix shard directory
+            filename = f"{uuid.uuid4()}_{secure_filename(file.filename)}"
+            relpath = shard_relpath(filename, UPLOAD_STORAGE_CONFIG['shard_depth'])
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], *relpath.split('/'))
+            in_memory = PERFORMANCE_CONFIG['in_memory_uploads']
+            persist = PERFORMANCE_CONFIG['persist_uploads'] or not in_memory
+            image_path = f'uploads/{relpath}' if persist else None
             
-            # Process the image for nutrition detection
-            result = process_image_for_detection(filepath)
+            if not in_memory:
+                save_upload(filepath, image_data)
             
-            if result['success']:
-                # Add file path to result for display
-                result['data']['image_path'] = f'uploads/{filename}'
-                return jsonify(result['data'])
+            if JOB_QUEUE_CONFIG['enabled'] or request.args.get('async') == '1':
+                # Hand the image to the job queue and answer right away
+                job_id = UPLOAD_JOBS.submit(
+                    analyze_upload_job, filepath, bytes(image_data), image_path,
+                    on_done=lambda data: UPLOAD_CACHE.put(digest, data)
+                )
+                response = jsonify({'job_id': job_id, 'status': QUEUED, 'status_url': f'/jobs/{job_id}'})
+                response.status_code = 202
             else:
-                return jsonify({'error': result['error']}), 500
+                # Detect straight from the request buffer when in memory
+                result = process_image_for_detection(filepath, image_data if in_memory else None)
+                if not result['success']:
+                    return jsonify({'error': result['error']}), 500
+                
+                # Add file path to result for display
+                result['data']['image_path'] = image_path
+                UPLOAD_CACHE.put(digest, result['data'])
+                response = jsonify(result['data'])
+            
+            if persist and in_memory:
+                # Write the image only once the response has been sent
+                response.call_on_close(lambda: persist_upload(filepath, image_data))
+            return response
                 
+        except QueueFull as e:
+            return jsonify({'error': str(e)}), 429, {'Retry-After': '1'}
         except Exception as e:
             return jsonify({'error': f'Error processing image: {str(e)}'}), 500
     
     return jsonify({'error': 'Invalid file type'}), 400
 
-@app.route('/analyze_foods', methods=['POST'])
-def analyze_foods():
-    """Analyze manually entered foods"""
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Poll an upload job; ?wait=N blocks up to N seconds for it to finish"""
     try:
-        data = request.get_json()
-        foods = data.get('foods', [])
-        user_preferences = data.get('user_preferences', {})
-        
-        if not foods:
-            return jsonify({'error': 'No foods provided'}), 400
-        
-        # Comprehensive nutrition database for common foods
-        food_nutrition_db = {
-            # Fruits
-            'apple': {'calories': 52, 'protein': 0.3, 'carbs': 14, 'fat': 0.2, 'fiber': 2.4, 'sugar': 10, 'sodium': 1, 'vitamin_c': 4.6, 'vitamin_a': 3, 'calcium': 6, 'iron': 0.1},
-            'banana': {'calories': 89, 'protein': 1.1, 'carbs': 23, 'fat': 0.3, 'fiber': 2.6, 'sugar': 12, 'sodium': 1, 'vitamin_c': 8.7, 'vitamin_a': 3, 'calcium': 5, 'iron': 0.3},
-            'orange': {'calories': 47, 'protein': 0.9, 'carbs': 12, 'fat': 0.1, 'fiber': 2.4, 'sugar': 9, 'sodium': 0, 'vitamin_c': 53.2, 'vitamin_a': 225, 'calcium': 40, 'iron': 0.1},
-            'strawberry': {'calories': 32, 'protein': 0.7, 'carbs': 8, 'fat': 0.3, 'fiber': 2.0, 'sugar': 4.9, 'sodium': 1, 'vitamin_c': 58.8, 'vitamin_a': 12, 'calcium': 16, 'iron': 0.4},
-            'grape': {'calories': 62, 'protein': 0.6, 'carbs': 16, 'fat': 0.2, 'fiber': 0.9, 'sugar': 16, 'sodium': 2, 'vitamin_c': 3.2, 'vitamin_a': 3, 'calcium': 10, 'iron': 0.4},
-            
-            # Vegetables
-            'broccoli': {'calories': 34, 'protein': 2.8, 'carbs': 7, 'fat': 0.4, 'fiber': 2.6, 'sugar': 1.5, 'sodium': 33, 'vitamin_c': 89.2, 'vitamin_a': 623, 'calcium': 47, 'iron': 0.7},
-            'spinach': {'calories': 23, 'protein': 2.9, 'carbs': 3.6, 'fat': 0.4, 'fiber': 2.2, 'sugar': 0.4, 'sodium': 79, 'vitamin_c': 28.1, 'vitamin_a': 469, 'calcium': 99, 'iron': 2.7},
-            'carrot': {'calories': 41, 'protein': 0.9, 'carbs': 10, 'fat': 0.2, 'fiber': 2.8, 'sugar': 4.7, 'sodium': 69, 'vitamin_c': 5.9, 'vitamin_a': 835, 'calcium': 33, 'iron': 0.3},
-            'tomato': {'calories': 18, 'protein': 0.9, 'carbs': 3.9, 'fat': 0.2, 'fiber': 1.2, 'sugar': 2.6, 'sodium': 5, 'vitamin_c': 13.7, 'vitamin_a': 833, 'calcium': 10, 'iron': 0.3},
-            'cucumber': {'calories': 16, 'protein': 0.7, 'carbs': 3.6, 'fat': 0.1, 'fiber': 0.5, 'sugar': 1.7, 'sodium': 2, 'vitamin_c': 2.8, 'vitamin_a': 105, 'calcium': 16, 'iron': 0.3},
-            
-            # Proteins
-            'chicken': {'calories': 165, 'protein': 31, 'carbs': 0, 'fat': 3.6, 'fiber': 0, 'sugar': 0, 'sodium': 74, 'vitamin_c': 0, 'vitamin_a': 6, 'calcium': 15, 'iron': 1.0},
-            'beef': {'calories': 250, 'protein': 26, 'carbs': 0, 'fat': 15, 'fiber': 0, 'sugar': 0, 'sodium': 72, 'vitamin_c': 0, 'vitamin_a': 0, 'calcium': 18, 'iron': 2.6},
-            'salmon': {'calories': 208, 'protein': 25, 'carbs': 0, 'fat': 12, 'fiber': 0, 'sugar': 0, 'sodium': 59, 'vitamin_c': 3.9, 'vitamin_a': 149, 'calcium': 9, 'iron': 0.3},
-            'eggs': {'calories': 155, 'protein': 13, 'carbs': 1.1, 'fat': 11, 'fiber': 0, 'sugar': 1.1, 'sodium': 124, 'vitamin_c': 0, 'vitamin_a': 160, 'calcium': 56, 'iron': 1.8},
-            'tofu': {'calories': 76, 'protein': 8, 'carbs': 1.9, 'fat': 4.8, 'fiber': 0.3, 'sugar': 0.6, 'sodium': 7, 'vitamin_c': 0.1, 'vitamin_a': 0, 'calcium': 350, 'iron': 3.4},
-            
-            # Grains
-            'rice': {'calories': 130, 'protein': 2.7, 'carbs': 28, 'fat': 0.3, 'fiber': 0.4, 'sugar': 0.1, 'sodium': 1, 'vitamin_c': 0, 'vitamin_a': 0, 'calcium': 10, 'iron': 0.2},
-            'bread': {'calories': 265, 'protein': 9, 'carbs': 49, 'fat': 3.2, 'fiber': 2.7, 'sugar': 5, 'sodium': 491, 'vitamin_c': 0, 'vitamin_a': 0, 'calcium': 151, 'iron': 3.6},
-            'pasta': {'calories': 131, 'protein': 5, 'carbs': 25, 'fat': 1.1, 'fiber': 1.8, 'sugar': 0.8, 'sodium': 6, 'vitamin_c': 0, 'vitamin_a': 0, 'calcium': 7, 'iron': 0.5},
-            'oatmeal': {'calories': 68, 'protein': 2.4, 'carbs': 12, 'fat': 1.4, 'fiber': 1.7, 'sugar': 0.3, 'sodium': 49, 'vitamin_c': 0, 'vitamin_a': 0, 'calcium': 21, 'iron': 0.6},
-            'quinoa': {'calories': 120, 'protein': 4.4, 'carbs': 22, 'fat': 1.9, 'fiber': 2.8, 'sugar': 0.9, 'sodium': 7, 'vitamin_c': 0, 'vitamin_a': 0, 'calcium': 17, 'iron': 1.5},
-            
-            # Dairy
-            'milk': {'calories': 42, 'protein': 3.4, 'carbs': 5, 'fat': 1, 'fiber': 0, 'sugar': 5, 'sodium': 44, 'vitamin_c': 0.9, 'vitamin_a': 46, 'calcium': 113, 'iron': 0.1},
-            'yogurt': {'calories': 59, 'protein': 10, 'carbs': 3.6, 'fat': 0.4, 'fiber': 0, 'sugar': 3.2, 'sodium': 36, 'vitamin_c': 0.5, 'vitamin_a': 27, 'calcium': 110, 'iron': 0.1},
-            'cheese': {'calories': 113, 'protein': 7, 'carbs': 0.4, 'fat': 9, 'fiber': 0, 'sugar': 0.1, 'sodium': 190, 'vitamin_c': 0, 'vitamin_a': 249, 'calcium': 202, 'iron': 0.1},
-            
-            # Nuts and Seeds
-            'almonds': {'calories': 579, 'protein': 21, 'carbs': 22, 'fat': 50, 'fiber': 12.5, 'sugar': 4.8, 'sodium': 1, 'vitamin_c': 0, 'vitamin_a': 0, 'calcium': 269, 'iron': 3.7},
-            'peanuts': {'calories': 567, 'protein': 26, 'carbs': 16, 'fat': 49, 'fiber': 8.5, 'sugar': 4.7, 'sodium': 18, 'vitamin_c': 0, 'vitamin_a': 0, 'calcium': 92, 'iron': 4.6},
-            'chia seeds': {'calories': 486, 'protein': 17, 'carbs': 42, 'fat': 31, 'fiber': 34.4, 'sugar': 0, 'sodium': 16, 'vitamin_c': 1.6, 'vitamin_a': 54, 'calcium': 631, 'iron': 7.7},
-            
-            # Legumes
-            'beans': {'calories': 127, 'protein': 9, 'carbs': 23, 'fat': 0.5, 'fiber': 6.4, 'sugar': 0.3, 'sodium': 1, 'vitamin_c': 1.2, 'vitamin_a': 0, 'calcium': 35, 'iron': 2.1},
-            'lentils': {'calories': 116, 'protein': 9, 'carbs': 20, 'fat': 0.4, 'fiber': 7.9, 'sugar': 1.8, 'sodium': 2, 'vitamin_c': 1.5, 'vitamin_a': 0, 'calcium': 19, 'iron': 3.3},
-            'chickpeas': {'calories': 164, 'protein': 8.9, 'carbs': 27, 'fat': 2.6, 'fiber': 7.6, 'sugar': 4.8, 'sodium': 6, 'vitamin_c': 1.3, 'vitamin_a': 1, 'calcium': 49, 'iron': 2.9}
-        }
-        
-        total_nutrition = {
-            'calories': 0,
-            'protein': 0,
-            'carbs': 0,
-            'fat': 0,
-            'fiber': 0,
-            'sugar': 0,
-            'sodium': 0,
-            'vitamin_c': 0,
-            'vitamin_a': 0,
-            'calcium': 0,
-            'iron': 0
-        }
+        wait = min(float(request.args.get('wait', 0)), JOB_QUEUE_CONFIG['max_wait'])
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    
+    job = UPLOAD_JOBS.wait(job_id, wait) if wait > 0 else UPLOAD_JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    body = {'job_id': job_id, 'status': job['status']}
+    if job['status'] == DONE:
+        body['result'] = job['result']
+    elif job['status'] == FAILED:
+        body['error'] = job['error']
+    return jsonify(body)
+
+def resolve_food_rows(foods):
+    """Resolve food names to nutrition table rows (None when irrelevant)"""
+    rows = {}
+    for food in foods:
+        if food in rows:
+            continue
+        food_lower = food.lower().strip()
+        # Try to find exact match first, then fuzzy match
+        if food_lower in NUTRITION_TABLE:
+            rows[food] = NUTRITION_TABLE.index[food_lower]
+        else:
+            key = FOOD_MATCHER.best(food_lower)
+            rows[food] = NUTRITION_TABLE.index[key] if key is not None else None
+    return rows
+
+def analyze_meals(meals):
+    """Analyze several meals (lists of food names) at once"""
+    with time_stage('nutrition_lookup'):
+        # Resolve every distinct food name across all meals in one pass
+        rows = resolve_food_rows(food for foods in meals for food in foods)
         
+        # Meal x food counts times the food x nutrient matrix gives the totals
+        counts = np.zeros((len(meals), len(NUTRITION_TABLE)))
+        for meal_idx, foods in enumerate(meals):
+            for food in foods:
+                if rows[food] is not None:
+                    counts[meal_idx, rows[food]] += 1
+        # Table values have one decimal, so rounding only drops float noise and
+        # keeps results identical however the meals are batched
+        totals = np.round(counts @ NUTRITION_TABLE.matrix, 1)
+    
+    with time_stage('suggestions'):
+        suggestions = generate_diet_suggestions_batch(totals, meals)
+        health_scores = calculate_health_scores(totals)
+    
+    results = []
+    for meal_idx, foods in enumerate(meals):
         food_details = []
-        irrelevant_foods = []
-        
         for food in foods:
-            food_lower = food.lower().strip()
-            # Try to find exact match first, then partial match
-            nutrition = None
-            is_irrelevant = False
-            
-            # Exact match
-            if food_lower in food_nutrition_db:
-                nutrition = food_nutrition_db[food_lower].copy()
-            else:
-                # Partial match
-                for key in food_nutrition_db:
-                    if food_lower in key or key in food_lower:
-                        nutrition = food_nutrition_db[key].copy()
-                        break
-                
-                # If still no match, mark as irrelevant
-                if nutrition is None:
-                    is_irrelevant = True
-                    irrelevant_foods.append(food)
-            
-            # Only add nutrition to totals if food is valid
-            if not is_irrelevant and nutrition:
+            row = rows[food]
+            if row is not None:
                 food_details.append({
                     'food': food,
-                    'nutrition': nutrition,
+                    'nutrition': NUTRITION_TABLE.to_dict(NUTRITION_TABLE.matrix[row]),
                     'is_irrelevant': False
                 })
-                
-                # Add to total nutrition
-                for nutrient, value in nutrition.items():
-                    if nutrient in total_nutrition:
-                        total_nutrition[nutrient] += value
             else:
                 # Mark as irrelevant
                 food_details.append({
@@ -389,128 +350,173 @@ def analyze_foods():
                     'is_irrelevant': True
                 })
         
-        # Generate diet suggestions based on nutrition
-        suggestions = generate_diet_suggestions(total_nutrition, foods)
-        
-        result = {
+        results.append({
             'food_details': food_details,
-            'total_nutrition': total_nutrition,
-            'suggestions': suggestions,
-            'health_score': calculate_health_score(total_nutrition)
-        }
+            'total_nutrition': NUTRITION_TABLE.to_dict(totals[meal_idx]),
+            'suggestions': suggestions[meal_idx],
+            'health_score': health_scores[meal_idx]
+        })
+    
+    return results
+
+@app.route('/analyze_foods', methods=['POST'])
+def analyze_foods():
+    """Analyze manually entered foods"""
+    try:
+        data = request.get_json()
+        foods = data.get('foods', [])
+        user_preferences = data.get('user_preferences', {})
         
-        return jsonify(result)
+        if not foods:
+            return jsonify({'error': 'No foods provided'}), 400
+        
+        return jsonify(analyze_meals([foods])[0])
         
     except Exception as e:
         return jsonify({'error': f'Error analyzing foods: {str(e)}'}), 500
 
-def generate_diet_suggestions(nutrition, foods):
-    """Generate diet suggestions based on nutrition analysis"""
-    suggestions = []
-    
-    # Protein analysis
-    if nutrition['protein'] < 20:
-        suggestions.append({
-            'type': 'protein',
-            'icon': '💪',
-            'title': 'Increase Protein Intake',
-            'message': 'Consider adding more protein-rich foods like lean meats, fish, eggs, or legumes',
-            'priority': 'high'
-        })
-    elif nutrition['protein'] > 50:
-        suggestions.append({
-            'type': 'protein',
-            'icon': '⚠️',
-            'title': 'High Protein Intake',
-            'message': 'Your protein intake is quite high. Ensure adequate hydration and kidney health',
-            'priority': 'medium'
-        })
-    
-    # Fiber analysis
-    if nutrition['fiber'] < 10:
-        suggestions.append({
-            'type': 'fiber',
-            'icon': '🥬',
-            'title': 'Boost Fiber Intake',
-            'message': 'Add more vegetables, fruits, and whole grains to increase fiber content',
-            'priority': 'high'
-        })
-    
-    # Vitamin C analysis
-    if nutrition['vitamin_c'] < 30:
-        suggestions.append({
-            'type': 'vitamin_c',
-            'icon': '🍊',
-            'title': 'More Vitamin C',
-            'message': 'Include citrus fruits, bell peppers, or broccoli for better immunity',
-            'priority': 'medium'
-        })
-    
-    # Calcium analysis
-    if nutrition['calcium'] < 200:
-        suggestions.append({
-            'type': 'calcium',
-            'icon': '🥛',
-            'title': 'Increase Calcium',
-            'message': 'Add dairy products, leafy greens, or fortified foods for bone health',
-            'priority': 'medium'
-        })
-    
-    # Sodium analysis
-    if nutrition['sodium'] > 500:
-        suggestions.append({
-            'type': 'sodium',
-            'icon': '🧂',
-            'title': 'Watch Sodium Intake',
-            'message': 'Consider using herbs and spices instead of salt for flavoring',
-            'priority': 'high'
-        })
-    
-    # Sugar analysis
-    if nutrition['sugar'] > 15:
-        suggestions.append({
-            'type': 'sugar',
-            'icon': '🍯',
-            'title': 'Reduce Added Sugar',
-            'message': 'Choose whole foods over processed options to reduce sugar intake',
-            'priority': 'medium'
-        })
+@app.route('/analyze_foods/batch', methods=['POST'])
+def analyze_foods_batch():
+    """Analyze many meals in one request"""
+    try:
+        data = request.get_json()
+        meals = data.get('meals', [])
+        
+        if not meals:
+            return jsonify({'error': 'No meals provided'}), 400
+        
+        # Each meal has the same shape as an /analyze_foods request body
+        meal_foods = [meal.get('foods', []) for meal in meals]
+        analyses = iter(analyze_meals([foods for foods in meal_foods if foods]))
+        
+        results = []
+        for foods in meal_foods:
+            if foods:
+                results.append(next(analyses))
+            else:
+                results.append({'error': 'No foods provided'})
+        
+        return jsonify({'results': results})
+        
+    except Exception as e:
+        return jsonify({'error': f'Error analyzing meals: {str(e)}'}), 500
+
+# Diet suggestion rules as (nutrient, comparison, threshold, suggestion)
+DIET_SUGGESTION_RULES = [
+    ('protein', '<', 20, {
+        'type': 'protein',
+        'icon': '💪',
+        'title': 'Increase Protein Intake',
+        'message': 'Consider adding more protein-rich foods like lean meats, fish, eggs, or legumes',
+        'priority': 'high'
+    }),
+    ('protein', '>', 50, {
+        'type': 'protein',
+        'icon': '⚠️',
+        'title': 'High Protein Intake',
+        'message': 'Your protein intake is quite high. Ensure adequate hydration and kidney health',
+        'priority': 'medium'
+    }),
+    ('fiber', '<', 10, {
+        'type': 'fiber',
+        'icon': '🥬',
+        'title': 'Boost Fiber Intake',
+        'message': 'Add more vegetables, fruits, and whole grains to increase fiber content',
+        'priority': 'high'
+    }),
+    ('vitamin_c', '<', 30, {
+        'type': 'vitamin_c',
+        'icon': '🍊',
+        'title': 'More Vitamin C',
+        'message': 'Include citrus fruits, bell peppers, or broccoli for better immunity',
+        'priority': 'medium'
+    }),
+    ('calcium', '<', 200, {
+        'type': 'calcium',
+        'icon': '🥛',
+        'title': 'Increase Calcium',
+        'message': 'Add dairy products, leafy greens, or fortified foods for bone health',
+        'priority': 'medium'
+    }),
+    ('sodium', '>', 500, {
+        'type': 'sodium',
+        'icon': '🧂',
+        'title': 'Watch Sodium Intake',
+        'message': 'Consider using herbs and spices instead of salt for flavoring',
+        'priority': 'high'
+    }),
+    ('sugar', '>', 15, {
+        'type': 'sugar',
+        'icon': '🍯',
+        'title': 'Reduce Added Sugar',
+        'message': 'Choose whole foods over processed options to reduce sugar intake',
+        'priority': 'medium'
+    }),
+]
+
+BALANCED_DIET_SUGGESTION = {
+    'type': 'balance',
+    'icon': '🎉',
+    'title': 'Excellent Balance!',
+    'message': 'Your meal provides a great balance of nutrients. Keep up the healthy eating!',
+    'priority': 'success'
+}
+
+# Health score adjustments as (nutrient, comparison, threshold, points)
+HEALTH_SCORE_RULES = [
+    # Deduct points for excessive values
+    ('sodium', '>', 500, -15),
+    ('sugar', '>', 20, -10),
+    ('fat', '>', 15, -5),
+    # Add points for good values
+    ('fiber', '>', 8, 10),
+    ('protein', '>', 15, 5),
+    ('vitamin_c', '>', 20, 5),
+    ('calcium', '>', 150, 5),
+]
+
+def _rule_masks(totals, rules):
+    """Evaluate (nutrient, comparison, threshold, ...) rules over meal totals"""
+    masks = np.empty((len(rules), len(totals)), dtype=bool)
+    for rule_idx, (nutrient, comparison, threshold, _) in enumerate(rules):
+        column = totals[:, NUTRITION_TABLE.nutrients.index(nutrient)]
+        masks[rule_idx] = column < threshold if comparison == '<' else column > threshold
+    return masks
+
+def _nutrition_vector(nutrition):
+    """Convert a nutrition dict into a single-meal totals matrix"""
+    return np.array([[nutrition[nutrient] for nutrient in NUTRIENTS]], dtype=np.float64)
+
+def generate_diet_suggestions_batch(totals, meals):
+    """Generate diet suggestions for a meals x nutrients totals matrix"""
+    masks = _rule_masks(totals, DIET_SUGGESTION_RULES)
     
-    # Overall balance
-    if not suggestions:
-        suggestions.append({
-            'type': 'balance',
-            'icon': '🎉',
-            'title': 'Excellent Balance!',
-            'message': 'Your meal provides a great balance of nutrients. Keep up the healthy eating!',
-            'priority': 'success'
-        })
+    all_suggestions = []
+    for meal_idx in range(len(totals)):
+        suggestions = [dict(DIET_SUGGESTION_RULES[rule_idx][3])
+                       for rule_idx in np.flatnonzero(masks[:, meal_idx])]
+        
+        # Overall balance
+        if not suggestions:
+            suggestions.append(dict(BALANCED_DIET_SUGGESTION))
+        all_suggestions.append(suggestions)
     
-    return suggestions
+    return all_suggestions
+
+def generate_diet_suggestions(nutrition, foods):
+    """Generate diet suggestions based on nutrition analysis"""
+    return generate_diet_suggestions_batch(_nutrition_vector(nutrition), [foods])[0]
+
+def calculate_health_scores(totals):
+    """Calculate health scores for a meals x nutrients totals matrix"""
+    masks = _rule_masks(totals, HEALTH_SCORE_RULES)
+    points = np.array([rule[3] for rule in HEALTH_SCORE_RULES])
+    scores = 100 + points @ masks
+    return np.clip(scores, 0, 100).tolist()
 
 def calculate_health_score(nutrition):
     """Calculate a health score based on nutrition values"""
-    score = 100
-    
-    # Deduct points for excessive values
-    if nutrition['sodium'] > 500:
-        score -= 15
-    if nutrition['sugar'] > 20:
-        score -= 10
-    if nutrition['fat'] > 15:
-        score -= 5
-    
-    # Add points for good values
-    if nutrition['fiber'] > 8:
-        score += 10
-    if nutrition['protein'] > 15:
-        score += 5
-    if nutrition['vitamin_c'] > 20:
-        score += 5
-    if nutrition['calcium'] > 150:
-        score += 5
-    
-    return max(0, min(100, score))
+    return calculate_health_scores(_nutrition_vector(nutrition))[0]
 
 @app.route('/get_vdic_info', methods=['POST'])
 def get_vdic_info():
@@ -547,11 +553,26 @@ def get_vdic_info():
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'message': 'Nutrition Detection System is running'})
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Nutrition Detection System is running',
+        'upload_cache': UPLOAD_CACHE.stats(),
+        'upload_storage': UPLOAD_JANITOR.stats(),
+        'upload_jobs': UPLOAD_JOBS.stats(),
+        'inference': INFERENCE_ENGINE.stats()
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics summed over all workers"""
+    if not METRICS_CONFIG['enabled']:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return METRICS.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 if __name__ == '__main__':
     # Get port from environment variable (for deployment) or use default 5000
     port = int(os.environ.get('PORT', 5000))
     # Only run in debug mode if not in production
     debug = os.environ.get('FLASK_ENV') != 'production'
+    UPLOAD_JANITOR.start()
     app.run(debug=debug, host='0.0.0.0', port=port)
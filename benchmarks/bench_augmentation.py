@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Batched tensor augmentation versus per-sample torchvision transforms
+
+Applies the flips, rotation and color jitter of AUGMENTATION_CONFIG in
+two ways and reports images/sec: the augmentation stage alone on decoded
+224x224 images (torchvision transforms per tensor versus BatchAugmentation
+per batch), and a full DataLoader over synthetic JPEGs with the
+torchvision transforms in FoodDataset's per-sample PIL pipeline versus
+BatchAugmentation after collation.
+
+Run from the repository root:
+    python -m benchmarks.bench_augmentation [--images 256] [--batch-size 32]
+        [--workers 0 1]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import torch
+from torchvision import transforms
+
+from benchmarks.bench_dataloader import time_loader, write_images
+from config import AUGMENTATION_CONFIG, MODEL_CONFIG
+from food_models import FoodDataset, build_augmentation
+
+
+def torchvision_augmentation(config):
+    options = config['transforms']
+    return [
+        transforms.RandomHorizontalFlip(options['random_horizontal_flip']),
+        transforms.RandomRotation(options['random_rotation'],
+                                  interpolation=transforms.InterpolationMode.BILINEAR),
+        transforms.ColorJitter(options['random_brightness'], options['random_contrast'],
+                               options['random_saturation'], options['random_hue'])
+    ]
+
+
+def time_stage(augment, batches):
+    augment(batches[0])
+    start = time.perf_counter()
+    count = 0
+    for batch in batches:
+        augment(batch)
+        count += len(batch)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--images', type=int, default=256)
+    parser.add_argument('--size', type=int, nargs=2, default=[512, 384], metavar=('W', 'H'))
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1])
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    input_size = MODEL_CONFIG['input_size']
+    per_sample = transforms.Compose(torchvision_augmentation(AUGMENTATION_CONFIG))
+    batched = build_augmentation(dict(AUGMENTATION_CONFIG, enabled=True))
+
+    # torchvision works on [0, 1] images, BatchAugmentation also undoes and redoes normalization
+    images = torch.rand(args.images, 3, *input_size)
+    batches = list(images.split(args.batch_size))
+    normalized = list(((images - batched.mean) / batched.std).split(args.batch_size))
+    print(f"Augmentation stage, {args.images} images at {input_size[0]}x{input_size[1]}, "
+          f"{torch.get_num_threads()} threads")
+    print("=" * 60)
+    separate = time_stage(lambda batch: torch.stack([per_sample(image) for image in batch]), batches)
+    together = time_stage(batched, normalized)
+    print(f"torchvision per sample | {separate:8.1f} images/s")
+    print(f"BatchAugmentation      | {together:8.1f} images/s ({together / separate:.1f}x)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_images(directory, args.images, args.size)
+        labels = [0] * len(paths)
+        pil_pipeline = transforms.Compose(
+            [transforms.Resize(input_size)] + torchvision_augmentation(AUGMENTATION_CONFIG)
+            + [transforms.ToTensor(),
+               transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])])
+        per_sample_dataset = FoodDataset(paths, labels, transform=pil_pipeline, input_size=input_size)
+        batched_dataset = FoodDataset(paths, labels, input_size=input_size, augmentation=batched)
+
+        print(f"\nDataLoader over {args.images} JPEGs at {args.size[0]}x{args.size[1]}, "
+              f"{os.cpu_count()} CPUs")
+        print("num_workers | PIL per sample | batched | speedup")
+        print("-" * 52)
+        for workers in args.workers:
+            pil = time_loader(per_sample_dataset, args.batch_size, workers)
+            tensor = time_loader(batched_dataset, args.batch_size, workers)
+            print(f"{workers:>11} | {pil:14.1f} | {tensor:7.1f} | {tensor / pil:6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Cost comparison of the FoodClassifier backbones
+
+For every architecture in food_models.BACKBONES reports parameters, GFLOPs
+per image, CPU latency at batch 1 and 32 and peak resident memory. Each
+architecture is measured in its own process, so the memory figures do not
+include models measured before it.
+
+Run from the repository root:
+    python -m benchmarks.bench_backbones [--architectures resnet18 ...] [--iterations 5]
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+import torch
+from torch.utils.flop_counter import FlopCounterMode
+
+from config import MODEL_CONFIG
+from food_models import BACKBONES, FoodClassifier
+
+
+def measure(architecture, num_classes, batch_sizes, iterations):
+    torch.manual_seed(0)
+    model = FoodClassifier(num_classes, pretrained=False, architecture=architecture).eval()
+    params = sum(p.numel() for p in model.parameters())
+
+    with torch.inference_mode():
+        counter = FlopCounterMode(display=False)
+        with counter:
+            model(torch.randn(1, 3, 224, 224))
+
+        latencies = {}
+        for size in batch_sizes:
+            images = torch.randn(size, 3, 224, 224)
+            model(images)
+            runs = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                model(images)
+                runs.append(time.perf_counter() - start)
+            latencies[size] = 1000 * float(np.median(runs))
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        'params_m': params / 1e6,
+        'gflops': counter.get_total_flops() / 1e9,
+        'latency_ms': latencies,
+        'peak_rss_mb': peak_mb
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--architectures', nargs='+', choices=list(BACKBONES), default=list(BACKBONES))
+    parser.add_argument('--num-classes', type=int, default=MODEL_CONFIG['num_classes'])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 32])
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    header = ' | '.join(f'b{size:<3} ms' for size in args.batch_sizes)
+    print(f"{'architecture':<20} | params M | GFLOPs | {header} | peak RSS MB")
+    print("-" * (52 + 11 * len(args.batch_sizes)))
+    context = multiprocessing.get_context('spawn')
+    for architecture in args.architectures:
+        with context.Pool(1) as pool:
+            result = pool.apply(measure, (architecture, args.num_classes,
+                                          args.batch_sizes, args.iterations))
+        latencies = ' | '.join(f"{result['latency_ms'][size]:8.1f}" for size in args.batch_sizes)
+        print(f"{architecture:<20} | {result['params_m']:8.1f} | {result['gflops']:6.2f} | "
+              f"{latencies} | {result['peak_rss_mb']:11.0f}")
+
+
+if __name__ == '__main__':
+    main()
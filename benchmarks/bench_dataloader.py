@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+FoodDataset decode and DataLoader throughput
+
+Writes synthetic photo-sized JPEGs, then measures images/sec for a full
+decode versus PIL draft-mode decode in one process, and for DataLoaders
+built by create_data_loader with increasing num_workers. Throughput per
+core divides by the number of decoding processes.
+
+Run from the repository root:
+    python -m benchmarks.bench_dataloader [--images 256] [--size 1600 1200]
+        [--workers 0 1 2 4]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from config import PERFORMANCE_CONFIG
+from food_models import FoodDataset, create_data_loader
+
+
+class FullDecodeDataset(FoodDataset):
+    """FoodDataset without draft mode, as the baseline"""
+
+    def load_image(self, path):
+        with Image.open(path) as image:
+            return image.convert('RGB')
+
+
+def write_images(directory, count, size):
+    # Smooth gradients plus noise compress like photos rather than pure noise
+    rng = np.random.default_rng(0)
+    width, height = size
+    x = np.linspace(0, 255, width)[None, :, None]
+    y = np.linspace(0, 255, height)[:, None, None]
+    paths = []
+    for i in range(count):
+        pixels = (x * rng.random(3) + y * rng.random(3)) / 2 + rng.normal(0, 8, (height, width, 3))
+        path = os.path.join(directory, f'food_{i}.jpg')
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def time_dataset(dataset):
+    start = time.perf_counter()
+    for i in range(len(dataset)):
+        dataset[i]
+    return len(dataset) / (time.perf_counter() - start)
+
+
+def time_loader(dataset, batch_size, num_workers):
+    config = dict(PERFORMANCE_CONFIG, num_workers=num_workers)
+    loader = create_data_loader(dataset, batch_size, shuffle=True, performance_config=config)
+    start = time.perf_counter()
+    count = sum(len(images) for images, _ in loader)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--images', type=int, default=256)
+    parser.add_argument('--size', type=int, nargs=2, default=[1600, 1200], metavar=('W', 'H'))
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_images(directory, args.images, args.size)
+        labels = [0] * len(paths)
+
+        print(f"{args.images} JPEGs at {args.size[0]}x{args.size[1]}, {os.cpu_count()} CPUs")
+        print("=" * 60)
+        full = time_dataset(FullDecodeDataset(paths, labels))
+        draft = time_dataset(FoodDataset(paths, labels))
+        print(f"full decode  (1 process) | {full:8.1f} images/s")
+        print(f"draft decode (1 process) | {draft:8.1f} images/s ({draft / full:.1f}x)")
+
+        print("\nnum_workers | images/s | images/s per core")
+        print("-" * 44)
+        dataset = FoodDataset(paths, labels)
+        for workers in args.workers:
+            throughput = time_loader(dataset, args.batch_size, workers)
+            print(f"{workers:>11} | {throughput:8.1f} | {throughput / max(workers, 1):8.1f}")
+
+
+if __name__ == '__main__':
+    main()
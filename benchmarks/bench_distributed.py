@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Data-parallel training throughput for 1, 2, 4 and 8 ranks
+
+Trains a FoodClassifier with distributed_training.train_distributed on
+random inputs held in memory, so the figures measure compute and gradient
+all-reduce rather than image decoding. Each rank gets an equal share of
+the cores (rank_thread_budget) and the per-rank batch size is fixed, so
+the global batch grows with the number of ranks. Reports images/s of the
+last epoch and the scaling efficiency against a single rank.
+
+Run from the repository root:
+    python -m benchmarks.bench_distributed [--ranks 1 2 4 8] [--architecture resnet18]
+"""
+
+import argparse
+import os
+
+import torch
+from torch.utils.data import TensorDataset
+
+from config import PERFORMANCE_CONFIG, TRAINING_CONFIG
+from distributed_training import rank_thread_budget, train_distributed
+from food_models import FoodClassifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--ranks', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--architecture', default='resnet18')
+    parser.add_argument('--images', type=int, default=512)
+    parser.add_argument('--image-size', type=int, default=160)
+    parser.add_argument('--batch-size', type=int, default=16, help='per rank')
+    parser.add_argument('--epochs', type=int, default=2)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    images = torch.randn(args.images, 3, args.image_size, args.image_size)
+    dataset = TensorDataset(images, torch.randint(0, 10, (args.images,)))
+    performance_config = dict(PERFORMANCE_CONFIG, num_workers=0)
+
+    print(f"{args.architecture}, {args.images} images at {args.image_size}px, "
+          f"batch {args.batch_size} per rank, {os.cpu_count()} CPUs")
+    print("ranks | threads/rank | images/s | scaling efficiency")
+    print("-" * 52)
+    baseline = None
+    for ranks in args.ranks:
+        model = FoodClassifier(10, pretrained=False, architecture=args.architecture)
+        config = dict(TRAINING_CONFIG, ranks_per_node=ranks, num_nodes=1, scheduler=None,
+                      early_stopping_patience=args.epochs)
+        history = train_distributed(model, dataset, num_epochs=args.epochs,
+                                    batch_size=args.batch_size, config=config,
+                                    performance_config=performance_config)
+        throughput = history[-1]['images_per_second']
+        baseline = baseline or throughput / ranks
+        threads = rank_thread_budget(ranks, 0, config['threads_per_rank'])
+        print(f"{ranks:>5} | {threads:>12} | {throughput:8.1f} | {throughput / (ranks * baseline):17.0%}")
+
+
+if __name__ == '__main__':
+    main()
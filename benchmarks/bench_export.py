@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Eager vs exported FoodClassifier latency on CPU
+
+Exports FoodClassifier with export_classifier (batch norm folded, dropout
+removed, channels_last, frozen TorchScript) and prints per-batch-size
+latency for the eager model, the exported artifact and, when onnx and
+onnxruntime are installed, the ONNX Runtime session.
+
+Run from the repository root:
+    python -m benchmarks.bench_export [--batch-sizes 1 4 16] [--iterations 10]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from importlib.util import find_spec
+
+import numpy as np
+import torch
+
+from config import MODEL_CONFIG
+from food_models import FoodClassifier, export_classifier, load_inference_model
+
+
+def time_batches(model, batch_size, iterations):
+    """Return per-batch latencies in ms for random batches"""
+    images = torch.randn(batch_size, 3, 224, 224)
+    latencies = []
+    with torch.inference_mode():
+        # Warm-up runs let TorchScript's profiling executor specialize
+        for _ in range(2):
+            model(images)
+        for _ in range(iterations):
+            start = time.perf_counter()
+            model(images)
+            latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--num-classes', type=int, default=MODEL_CONFIG['num_classes'])
+    parser.add_argument('--architecture', default=MODEL_CONFIG['architecture'])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = FoodClassifier(args.num_classes, pretrained=False,
+                           architecture=args.architecture).eval()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'classifier.pt')
+        onnx_path = None
+        if find_spec('onnx') and find_spec('onnxruntime'):
+            onnx_path = os.path.join(directory, 'classifier.onnx')
+        export_classifier(model, path, onnx_path=onnx_path)
+
+        candidates = [('eager', model), ('torchscript', load_inference_model(path))]
+        if onnx_path:
+            candidates.append(('onnxruntime', load_inference_model(onnx_path)))
+        else:
+            print("onnx / onnxruntime not installed, skipping ONNX Runtime")
+
+        print("batch | runtime     |     p50 ms |     p95 ms |   images/s")
+        print("-" * 62)
+        for size in args.batch_sizes:
+            for name, candidate in candidates:
+                latencies = time_batches(candidate, size, args.iterations)
+                p50, p95 = np.percentile(latencies, [50, 95])
+                print(f"{size:>5} | {name:<11} | {p50:10.1f} | {p95:10.1f} | {1000 * size / p50:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Head-only fine-tuning: frozen-backbone epochs vs cached features
+
+Times one epoch of head training that runs the frozen backbone on every
+batch, the one-off feature extraction into the float16 cache, and one
+epoch of head training streamed from the cache.
+
+Run from the repository root:
+    python -m benchmarks.bench_feature_cache [--images 256] [--architecture resnet101]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from torch.utils.data import DataLoader
+
+from config import MODEL_CONFIG
+from food_models import FoodClassifier, FoodDataset, cache_backbone_features, train_head
+
+
+def write_images(directory, count):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'food_{i}.jpg')
+        Image.fromarray(rng.integers(0, 256, (256, 256, 3), dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def frozen_backbone_epoch(model, dataset, batch_size):
+    optimizer = torch.optim.Adam(model.head.parameters(), lr=1e-3)
+    model.backbone.eval()
+    for images, labels in DataLoader(dataset, batch_size=batch_size, shuffle=True):
+        with torch.no_grad():
+            features = model.backbone(images)
+        loss = F.cross_entropy(model.head(features), labels)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--images', type=int, default=256)
+    parser.add_argument('--architecture', default=MODEL_CONFIG['architecture'])
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = FoodClassifier(10, pretrained=False, architecture=args.architecture)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_images(directory, args.images)
+        dataset = FoodDataset(paths, [i % 10 for i in range(args.images)])
+        cache_path = os.path.join(directory, 'features.npy')
+
+        start = time.perf_counter()
+        frozen_backbone_epoch(model, dataset, args.batch_size)
+        frozen = time.perf_counter() - start
+
+        start = time.perf_counter()
+        features = cache_backbone_features(model.backbone, dataset, cache_path, args.batch_size)
+        extraction = time.perf_counter() - start
+
+        start = time.perf_counter()
+        train_head(model.head, features, num_epochs=1)
+        cached = time.perf_counter() - start
+        cache_mb = os.path.getsize(cache_path) / 1e6
+
+    print(f"{args.architecture}, {args.images} images")
+    print(f"Epoch with frozen backbone: {frozen:8.2f}s")
+    print(f"Feature extraction (once):  {extraction:8.2f}s  ({cache_mb:.1f}MB float16 cache)")
+    print(f"Epoch from cached features: {cached:8.3f}s  ({frozen / cached:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
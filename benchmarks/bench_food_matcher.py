@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the trigram food-name matcher
+
+Builds synthetic food catalogues of increasing size and reports index build
+time plus per-lookup latency percentiles.
+
+Run from the repository root:
+    python -m benchmarks.bench_food_matcher [--sizes 1000 100000 1000000]
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from food_matcher import TrigramIndex
+from nutrition_db import NUTRITION_TABLE
+
+QUALIFIERS = ['fresh', 'organic', 'grilled', 'baked', 'raw', 'roasted', 'steamed',
+              'fried', 'frozen', 'canned', 'smoked', 'dried', 'spicy', 'sweet',
+              'low fat', 'whole grain', 'homemade', 'instant', 'mini', 'large']
+BRANDS = ['acme', 'farmhouse', 'green valley', 'sunrise', 'golden', 'harvest',
+          'blue ridge', 'oak hill', 'riverside', 'meadow']
+
+
+def build_catalogue(size, rng):
+    """Generate `size` unique synthetic food names"""
+    foods = list(NUTRITION_TABLE.names)
+    names = []
+    seen = set()
+    while len(names) < size:
+        name = (f"{rng.choice(BRANDS)} {rng.choice(QUALIFIERS)} "
+                f"{rng.choice(foods)} {rng.randrange(100000)}")
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+def make_queries(names, count, rng):
+    """Sample catalogue names and corrupt half of them with a typo"""
+    queries = []
+    for name in rng.sample(names, count):
+        if rng.random() < 0.5:
+            pos = rng.randrange(len(name))
+            name = name[:pos] + name[pos + 1:]
+        queries.append(name)
+    return queries
+
+
+def run(size, num_queries, seed=42):
+    rng = random.Random(seed)
+    names = build_catalogue(size, rng)
+    queries = make_queries(names, num_queries, rng)
+
+    start = time.perf_counter()
+    index = TrigramIndex(names)
+    build_time = time.perf_counter() - start
+
+    # Warm up caches before timing
+    for query in queries[:10]:
+        index.match(query)
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.match(query)
+        latencies.append(time.perf_counter() - start)
+
+    latencies_us = np.array(latencies) * 1e6
+    p50, p95, p99 = np.percentile(latencies_us, [50, 95, 99])
+    print(f"{size:>10,} names | build {build_time:7.2f}s | "
+          f"p50 {p50:8.1f}us | p95 {p95:8.1f}us | p99 {p99:8.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    print("Trigram food matcher lookup latency")
+    print("=" * 78)
+    for size in args.sizes:
+        run(size, min(args.queries, size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+HTTP load benchmark for the Flask web interface
+
+Drives /upload (several image sizes), /analyze_foods (1 to 50 foods) and
+/get_vdic_info at a fixed concurrency and reports throughput plus latency
+percentiles per scenario. Requests go through Flask's test client (no
+network, single process) or over HTTP to a gunicorn server that the
+benchmark starts locally, or to any running server given by --url.
+
+Results can be saved as a JSON baseline and later runs compared against
+it; the exit status is 1 when a scenario regressed beyond the tolerance.
+
+Run from the repository root:
+    python -m benchmarks.bench_http [--target testclient|gunicorn] [--url URL]
+        [--concurrency 8] [--requests 200] [--scenarios upload_small ...]
+        [--output baseline.json] [--baseline baseline.json] [--tolerance 0.2]
+"""
+
+import argparse
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from nutrition_db import NUTRITION_TABLE
+
+UPLOAD_SIZES = {'upload_small': 128, 'upload_medium': 640, 'upload_large': 2048}
+FOOD_COUNTS = {'analyze_foods_1': 1, 'analyze_foods_10': 10, 'analyze_foods_50': 50}
+SCENARIOS = list(UPLOAD_SIZES) + list(FOOD_COUNTS) + ['get_vdic_info']
+
+
+def make_jpeg(side, seed=0):
+    """Encode a noisy side x side RGB JPEG"""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (side, side, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def build_requests(scenario, count):
+    """Return `count` (method, path, body, content type) tuples for a scenario"""
+    if scenario in UPLOAD_SIZES:
+        image = make_jpeg(UPLOAD_SIZES[scenario])
+        boundary = uuid.uuid4().hex
+        requests = []
+        for i in range(count):
+            # Bytes after the JPEG end marker are ignored by decoders but give
+            # every upload its own hash, so the result cache is not measured
+            data = image + i.to_bytes(8, 'big')
+            body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+                    f'filename="apple_{i}.jpg"\r\nContent-Type: image/jpeg\r\n\r\n').encode()
+            body += data + f'\r\n--{boundary}--\r\n'.encode()
+            requests.append(('POST', '/upload', body, f'multipart/form-data; boundary={boundary}'))
+        return requests
+
+    names = NUTRITION_TABLE.names
+    if scenario in FOOD_COUNTS:
+        foods = [names[i % len(names)] for i in range(FOOD_COUNTS[scenario])]
+        body = json.dumps({'foods': foods}).encode()
+        return [('POST', '/analyze_foods', body, 'application/json')] * count
+
+    return [('POST', '/get_vdic_info', json.dumps({'food_name': names[i % len(names)]}).encode(),
+             'application/json') for i in range(count)]
+
+
+class TestClientTarget:
+    """Sends requests through Flask's test client inside this process"""
+
+    name = 'testclient'
+
+    def __init__(self):
+        from app import app
+
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, method, path, body, content_type):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, data=body, content_type=content_type)
+        status = response.status_code
+        response.close()
+        return status
+
+    def close(self):
+        pass
+
+
+class HTTPTarget:
+    """Sends requests over HTTP to a running server"""
+
+    name = 'http'
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def send(self, method, path, body, content_type):
+        request = urllib.request.Request(self.url + path, data=body, method=method,
+                                         headers={'Content-Type': content_type})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def close(self):
+        pass
+
+
+class GunicornTarget(HTTPTarget):
+    """Starts gunicorn with gunicorn.conf.py on a free local port"""
+
+    name = 'gunicorn'
+
+    def __init__(self, workers):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        super().__init__(f'http://127.0.0.1:{port}')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+             '--workers', str(workers), '--bind', f'127.0.0.1:{port}', 'app:app'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with urllib.request.urlopen(self.url + '/health', timeout=1):
+                    break
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError('gunicorn did not start; is it installed?')
+                time.sleep(0.2)
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def run_scenario(target, scenario, num_requests, concurrency, warmup):
+    """Send the scenario's requests at the given concurrency and summarize them"""
+    requests = build_requests(scenario, num_requests + warmup)
+    for request in requests[:warmup]:
+        target.send(*request)
+
+    def timed(request):
+        start = time.perf_counter()
+        status = target.send(*request)
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, requests[warmup:]))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array([latency for latency, _ in outcomes]) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        'requests': num_requests,
+        'errors': sum(1 for _, status in outcomes if status >= 400),
+        'throughput_rps': num_requests / elapsed,
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return regression messages for scenarios slower than the baseline"""
+    regressions = []
+    for scenario, result in results.items():
+        previous = baseline['results'].get(scenario)
+        if previous is None:
+            continue
+        if result['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {result['throughput_rps']:.1f} req/s "
+                               f"vs baseline {previous['throughput_rps']:.1f} req/s")
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if result[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{scenario}: {key} {result[key]:.2f} "
+                                   f"vs baseline {previous[key]:.2f}")
+    return regressions
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--target', choices=['testclient', 'gunicorn'], default='testclient')
+    parser.add_argument('--url', help='benchmark an already running server instead')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers to start')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--output', help='write results to this JSON baseline file')
+    parser.add_argument('--baseline', help='compare against this JSON baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative slowdown before flagging a regression')
+    args = parser.parse_args()
+
+    if args.url:
+        target = HTTPTarget(args.url)
+    elif args.target == 'gunicorn':
+        target = GunicornTarget(args.workers)
+    else:
+        target = TestClientTarget()
+
+    print(f"HTTP load benchmark ({target.name}, concurrency {args.concurrency})")
+    print("=" * 86)
+    results = {}
+    try:
+        for scenario in args.scenarios:
+            result = run_scenario(target, scenario, args.requests, args.concurrency, args.warmup)
+            results[scenario] = result
+            print(f"{scenario:<18} | {result['throughput_rps']:8.1f} req/s | "
+                  f"p50 {result['p50_ms']:8.2f}ms | p95 {result['p95_ms']:8.2f}ms | "
+                  f"p99 {result['p99_ms']:8.2f}ms | errors {result['errors']}")
+    finally:
+        target.close()
+
+    report = {
+        'commit': current_commit(),
+        'target': target.name,
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'cpu_count': os.cpu_count(),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        print(f"\nCompared with baseline from commit {baseline.get('commit')}:")
+        for message in regressions:
+            print(f"  REGRESSION {message}")
+        if not regressions:
+            print("  no regressions")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
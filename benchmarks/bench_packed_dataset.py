@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Packed shard dataset vs per-file FoodDataset throughput
+
+Writes synthetic photo-sized JPEGs, packs them with pack_images and
+measures images/sec for shuffled DataLoader epochs over the per-file
+FoodDataset and over PackedFoodDataset, for increasing num_workers. The
+one-off packing time is reported separately.
+
+Run from the repository root:
+    python -m benchmarks.bench_packed_dataset [--images 512] [--shard-size 128]
+        [--workers 0 2 4]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_dataloader import time_loader, write_images
+from food_models import FoodDataset, PackedFoodDataset, pack_images
+
+
+def directory_mb(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file()) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--images', type=int, default=512)
+    parser.add_argument('--size', type=int, nargs=2, default=[1600, 1200], metavar=('W', 'H'))
+    parser.add_argument('--shard-size', type=int, default=128)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        image_dir = os.path.join(directory, 'images')
+        packed_dir = os.path.join(directory, 'packed')
+        os.makedirs(image_dir)
+        paths = write_images(image_dir, args.images, args.size)
+        labels = [i % 10 for i in range(len(paths))]
+
+        start = time.perf_counter()
+        index = pack_images(paths, labels, packed_dir, shard_size=args.shard_size)
+        packing = time.perf_counter() - start
+
+        print(f"{args.images} JPEGs at {args.size[0]}x{args.size[1]} ({directory_mb(image_dir):.0f}MB), "
+              f"{os.cpu_count()} CPUs")
+        print(f"Packed into {len(index['shards'])} shards ({directory_mb(packed_dir):.0f}MB) "
+              f"in {packing:.1f}s, once")
+        print("=" * 60)
+        print("num_workers | per-file images/s | packed images/s | speedup")
+        print("-" * 60)
+        files = FoodDataset(paths, labels)
+        packed = PackedFoodDataset(packed_dir, shuffle=True)
+        for workers in args.workers:
+            per_file = time_loader(files, args.batch_size, workers)
+            streamed = time_loader(packed, args.batch_size, workers)
+            print(f"{workers:>11} | {per_file:17.1f} | {streamed:15.1f} | {streamed / per_file:6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
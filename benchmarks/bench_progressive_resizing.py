@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Progressive resizing versus fixed-resolution training
+
+Writes synthetic JPEG classes (stripes of a per-class orientation and
+tint, plus noise), then trains the same FoodClassifier from the same
+initial weights for the same number of epochs twice: at the final input
+size throughout, and with progressive_resizing_schedule ramping from
+--start-size up to it. Reports total training time and final validation
+accuracy of both runs.
+
+Run from the repository root:
+    python -m benchmarks.bench_progressive_resizing [--images 160] [--epochs 6]
+        [--architecture resnet18] [--start-size 128]
+"""
+
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from config import PERFORMANCE_CONFIG, TRAINING_CONFIG
+from food_models import (FoodClassifier, FoodDataset, create_data_loader,
+                         progressive_resizing_schedule, split_dataset, train_classifier)
+
+
+def write_images(directory, count, num_classes, size=256):
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size, 0:size] / size
+    paths, labels = [], []
+    for i in range(count):
+        label = i % num_classes
+        angle = np.pi * label / num_classes + rng.normal(0, 0.1)
+        stripes = np.sin(2 * np.pi * 8 * (x * np.cos(angle) + y * np.sin(angle)) + rng.uniform(0, 6.3))
+        tint = np.roll([1.0, 0.6, 0.3], label)
+        pixels = 128 + 80 * stripes[..., None] * tint + rng.normal(0, 20, (size, size, 3))
+        path = os.path.join(directory, f'food_{i}.jpg')
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, quality=90)
+        paths.append(path)
+        labels.append(label)
+    return paths, labels
+
+
+def run(model, train_set, val_set, batch_size, epochs, learning_rate, config, schedule):
+    performance_config = dict(PERFORMANCE_CONFIG, num_workers=1)
+    train_loader = create_data_loader(train_set, batch_size, shuffle=True,
+                                      performance_config=performance_config)
+    val_loader = create_data_loader(val_set, batch_size, performance_config=performance_config)
+    torch.manual_seed(0)
+    start = time.perf_counter()
+    history = train_classifier(model, train_loader, val_loader, num_epochs=epochs,
+                               learning_rate=learning_rate, config=config,
+                               resolution_schedule=schedule)
+    return time.perf_counter() - start, history[-1]['val_accuracy']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--images', type=int, default=160)
+    parser.add_argument('--classes', type=int, default=4)
+    parser.add_argument('--epochs', type=int, default=6)
+    parser.add_argument('--architecture', default='resnet18')
+    parser.add_argument('--size', type=int, default=224)
+    parser.add_argument('--start-size', type=int, default=128)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--learning-rate', type=float, default=1e-3)
+    args = parser.parse_args()
+
+    # Every epoch runs, and the last one is the one reported
+    config = dict(TRAINING_CONFIG, scheduler='cosine', early_stopping_patience=args.epochs)
+    final_size = (args.size, args.size)
+    schedule = progressive_resizing_schedule(args.epochs, final_size, args.batch_size,
+                                             start_size=args.start_size,
+                                             step=TRAINING_CONFIG['progressive_size_step'])
+    torch.manual_seed(0)
+    initial = FoodClassifier(args.classes, pretrained=False, architecture=args.architecture)
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths, labels = write_images(directory, args.images, args.classes)
+        train_set, val_set = split_dataset(FoodDataset(paths, labels, input_size=final_size), 0.2)
+        print(f"{args.architecture}, {len(train_set)} training / {len(val_set)} validation images, "
+              f"{args.epochs} epochs, {os.cpu_count()} CPUs")
+        print("Schedule: " + ", ".join(f"{h}x{w}/{b}" for (h, w), b in schedule))
+
+        fixed = run(copy.deepcopy(initial), train_set, val_set, args.batch_size, args.epochs,
+                    args.learning_rate, config, None)
+        progressive = run(copy.deepcopy(initial), train_set, val_set, args.batch_size, args.epochs,
+                          args.learning_rate, config, schedule)
+
+    print("\nrun          | total time | final val accuracy")
+    print("-" * 48)
+    print(f"fixed {args.size:<6} | {fixed[0]:9.1f}s | {fixed[1]:8.3f}")
+    print(f"progressive  | {progressive[0]:9.1f}s | {progressive[1]:8.3f}  "
+          f"({fixed[0] / progressive[0]:.2f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
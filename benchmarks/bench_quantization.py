@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+fp32 vs int8 FoodClassifier benchmark on CPU
+
+Quantizes FoodClassifier (static int8 backbone, dynamic int8 head) after
+calibrating on FoodDataset images, then reports per-batch latency,
+throughput, serialized model size and top-1 agreement with the fp32 model.
+Trained weights are loaded from MODEL_CONFIG['weights_path'] when present;
+--images points calibration and evaluation at a directory of real photos.
+
+Run from the repository root:
+    python -m benchmarks.bench_quantization [--batch-sizes 1 8] [--images DIR]
+"""
+
+import argparse
+import glob
+import io
+import os
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+from config import MODEL_CONFIG
+from food_models import FoodClassifier, FoodDataset, load_classifier, quantize_classifier
+
+
+def model_size_mb(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1e6
+
+
+def time_batches(model, batch_size, iterations):
+    """Return per-batch latencies in ms for random batches"""
+    images = torch.randn(batch_size, 3, 224, 224)
+    latencies = []
+    with torch.inference_mode():
+        model(images)
+        for _ in range(iterations):
+            start = time.perf_counter()
+            model(images)
+            latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--num-classes', type=int, default=MODEL_CONFIG['num_classes'])
+    parser.add_argument('--architecture', default=MODEL_CONFIG['architecture'])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--images', help='directory of calibration / evaluation images')
+    parser.add_argument('--eval-images', type=int, default=64)
+    parser.add_argument('--backend', default=MODEL_CONFIG['quantization_backend'])
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    if os.path.exists(MODEL_CONFIG['weights_path']):
+        model = load_classifier(args.num_classes, args.architecture, MODEL_CONFIG['weights_path'])
+    else:
+        print(f"{MODEL_CONFIG['weights_path']} not found, using random weights")
+        model = FoodClassifier(args.num_classes, pretrained=False,
+                               architecture=args.architecture)
+    model.eval()
+
+    if args.images:
+        paths = sorted(glob.glob(os.path.join(args.images, '*')))
+    else:
+        paths = [f'synthetic_{i}.jpg' for i in range(256)]
+    batch_size = 8
+    calibration = DataLoader(FoodDataset(paths, [0] * len(paths)), batch_size=batch_size,
+                             shuffle=True)
+
+    start = time.perf_counter()
+    quantized = quantize_classifier(model, calibration, MODEL_CONFIG['calibration_batches'],
+                                    backend=args.backend)
+    print(f"Calibration + conversion: {time.perf_counter() - start:.1f}s "
+          f"({MODEL_CONFIG['calibration_batches']} batches of {batch_size})")
+
+    # Top-1 agreement on held-out images
+    agree = total = 0
+    evaluation = DataLoader(FoodDataset(paths[-args.eval_images:], [0] * args.eval_images),
+                            batch_size=batch_size)
+    with torch.inference_mode():
+        for images, _ in evaluation:
+            agree += (model(images).argmax(1) == quantized(images).argmax(1)).sum().item()
+            total += len(images)
+
+    print(f"\nModel size: fp32 {model_size_mb(model):.1f}MB | int8 {model_size_mb(quantized):.1f}MB")
+    print(f"Top-1 agreement: {100.0 * agree / total:.1f}% of {total} images")
+    print("\nbatch | model |     p50 ms |     p95 ms |   images/s")
+    print("-" * 56)
+    for size in args.batch_sizes:
+        for name, candidate in (('fp32', model), ('int8', quantized)):
+            latencies = time_batches(candidate, size, args.iterations)
+            p50, p95 = np.percentile(latencies, [50, 95])
+            print(f"{size:>5} | {name:>5} | {p50:10.1f} | {p95:10.1f} | {1000 * size / p50:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Startup import-time benchmark for the entry points
+
+Imports each entry point in a fresh interpreter under `python -X importtime`
+and reports the wall time, the total cumulative import time and the
+slowest top-level imports. Every entry point is run several times and the
+fastest run is kept, which filters out cold-cache noise.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [--modules fd app run_app] [--runs 3]
+        [--output startup.json]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = ['config', 'fd', 'app', 'run_app', 'test_system']
+
+
+def parse_importtime(stderr):
+    """Return {module: cumulative microseconds} for top-level imports"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Nested imports are indented under their importer
+        if name.startswith('  '):
+            continue
+        totals[name.strip()] = int(cumulative)
+    return totals
+
+
+def measure(module):
+    """Import `module` in a fresh interpreter; return (wall seconds, imports)"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    return wall, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--modules', nargs='+', default=ENTRY_POINTS)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=5, help='slowest imports to list')
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    print("Entry point import time (best of %d runs)" % args.runs)
+    print("=" * 78)
+    results = {}
+    for module in args.modules:
+        runs = [measure(module) for _ in range(args.runs)]
+        wall, imports = min(runs, key=lambda run: run[0])
+        total_ms = sum(imports.values()) / 1000
+        slowest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        results[module] = {
+            'wall_ms': wall * 1000,
+            'import_ms': total_ms,
+            'slowest': {name: us / 1000 for name, us in slowest}
+        }
+
+        print(f"{module:<14} | wall {wall * 1000:8.1f}ms | imports {total_ms:8.1f}ms")
+        for name, us in slowest:
+            print(f"    {name:<30} {us / 1000:8.1f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
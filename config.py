@@ -9,14 +9,30 @@ SPOONACULAR_BASE_URL = "https://api.spoonacular.com/food"
 
 # Model Configuration
 MODEL_CONFIG = {
-    'architecture': 'resnet101',
+    'architecture': 'resnet101',  # any key of food_models.BACKBONES, e.g. resnet18, mobilenet_v3_large, efficientnet_b0
     'pretrained': True,
     'num_classes': 100,  # Adjust based on your food categories
     'input_size': (224, 224),
     'dropout_rate': 0.5,
     'learning_rate': 0.001,
     'batch_size': 32,
-    'num_epochs': 20
+    'num_epochs': 20,
+    'serve_model': False,  # classify uploads with FoodClassifier instead of mock data
+    'weights_path': './models/food_classifier_model.pth',
+    'inference_max_batch_size': 8,  # images per batched forward pass (batches form across threads, e.g. gunicorn --threads)
+    'inference_max_wait_ms': 10,    # longest an image waits for its batch to fill
+    'quantization': None,           # 'int8' serves the quantized copy at quantized_path on CPU
+    'quantization_backend': 'x86',  # x86 / fbgemm on servers, qnnpack on ARM
+    'calibration_batches': 8,       # batches of calibration images for static quantization
+    'quantized_path': './models/food_classifier_int8.pt',  # written by prepare_inference_model
+    'optimized_path': './models/food_classifier_optimized.pt',  # frozen TorchScript, used when present
+    'onnx_path': './models/food_classifier.onnx',
+    'inference_runtime': 'torchscript',  # torchscript or onnx (needs onnxruntime)
+    'cascade': False,               # classify with a small model first, escalate uncertain images
+    'cascade_fast_architecture': 'mobilenet_v3_small',
+    'cascade_fast_weights_path': './models/food_classifier_fast.pth',
+    'cascade_confidence_threshold': 0.8,  # escalate below this top-1 probability (tune_cascade.py)
+    'cascade_margin_threshold': 0.2       # or below this top-1 minus top-2 margin
 }
 
 # VDIC Detection Configuration
@@ -65,7 +81,41 @@ TRAINING_CONFIG = {
     'weight_decay': 1e-4,
     'gradient_clipping': 1.0,
     'early_stopping_patience': 10,
-    'validation_split': 0.2
+    'validation_split': 0.2,
+    'split_seed': 42,
+    'channels_last': True,             # NHWC tensors, faster convolutions on CPU
+    'autocast_dtype': None,            # 'bfloat16' for CPU autocast (fast with AVX512-BF16 / AMX)
+    'compile': False,                  # torch.compile the model; pays a one-off compile per input shape
+    'gradient_accumulation_steps': 1,  # effective batch = MODEL_CONFIG['batch_size'] x steps
+    'activation_checkpointing': False, # recompute backbone stage activations in backward: less memory, more compute
+    'auto_batch_size': False,          # largest batch within PERFORMANCE_CONFIG['max_memory_usage'], same effective batch
+    'progressive_resizing': False,     # train early epochs at lower resolution, batch scaled to match
+    'progressive_start_size': 128,     # shorter side of the first epochs
+    'progressive_ramp_end': 0.75,      # fraction of epochs after which MODEL_CONFIG['input_size'] is reached
+    'progressive_size_step': 32,       # resolutions are multiples of this
+    'checkpoint_dir': './models/checkpoints',  # written every epoch from a background thread
+    'keep_checkpoints': 3,             # newest checkpoints kept in checkpoint_dir
+    'resume': False,                   # continue from the newest checkpoint in checkpoint_dir
+    'ranks_per_node': 1,               # > 1 trains data-parallel processes (torch.distributed, gloo)
+    'num_nodes': 1,                    # machines taking part; run train_model on each
+    'node_rank': 0,                    # this machine's index, 0 on the machine at master_addr
+    'master_addr': '127.0.0.1',
+    'master_port': 29500,
+    'threads_per_rank': None,          # intra-op threads per rank; None splits the cores evenly
+    'feature_cache_path': './temp/backbone_features.npy',  # float16 features for head-only training
+    'head_batch_size': 256
+}
+
+# Knowledge Distillation Configuration (NutritionDetectionSystem.distill_model)
+DISTILLATION_CONFIG = {
+    'student_architecture': 'mobilenet_v3_large',
+    'temperature': 4.0,                # softens teacher and student distributions
+    'alpha': 0.7,                      # weight of the teacher term vs hard-label cross-entropy
+    'num_epochs': 20,
+    'batch_size': 32,
+    'learning_rate': 0.001,
+    'teacher_logits_path': './temp/teacher_logits.npy',  # cached once per teacher and dataset
+    'student_path': './models/food_classifier_student.pth'
 }
 
 # Data Augmentation Configuration
@@ -122,9 +172,43 @@ PERFORMANCE_CONFIG = {
     'pin_memory': True,
     'prefetch_factor': 2,
     'cache_size': 1000,
+    'cache_ttl': 3600,  # seconds an upload result stays cached
+    'cache_backend': 'memory',  # memory (per worker) or sqlite (shared by all workers)
+    'cache_path': './temp/upload_cache.sqlite3',
+    'in_memory_uploads': True,  # detect from the request buffer instead of a saved file
+    'persist_uploads': True,  # keep uploads in static/uploads (written after the response)
+    'inference_queue_depth': 64,  # images waiting for the batcher before /upload answers 429
     'max_memory_usage': 0.8  # 80% of available memory
 }
 
+# Upload Storage Configuration (static/uploads lifecycle)
+UPLOAD_STORAGE_CONFIG = {
+    'max_bytes': 1024 * 1024 * 1024,  # 1GB quota for stored uploads
+    'max_age': 7 * 24 * 3600,         # seconds before an upload is evicted
+    'sweep_interval': 300,            # seconds between janitor sweeps
+    'low_water_ratio': 0.9,           # evict down to 90% of the quota
+    'shard_depth': 2,                 # hash-prefix directory levels
+    'state_dir': './temp/upload_janitor'  # janitor lock and stats, outside the served static/ tree
+}
+
+# Background Job Queue Configuration (asynchronous /upload)
+JOB_QUEUE_CONFIG = {
+    'enabled': False,                  # /upload returns a job id instead of the analysis
+    'backend': 'memory',               # memory (single worker) or sqlite (shared by all workers)
+    'db_path': './temp/upload_jobs.sqlite3',
+    'max_workers': 2,                  # analysis processes per web worker
+    'max_pending': 32,                 # queued jobs before /upload answers 429
+    'result_ttl': 3600,                # seconds finished jobs stay pollable
+    'max_wait': 30                     # longest /jobs/<id>?wait=N long-poll in seconds
+}
+
+# Metrics Configuration (/metrics endpoint)
+METRICS_CONFIG = {
+    'enabled': True,                   # expose Prometheus metrics at /metrics
+    'multiprocess_dir': None,          # shared snapshot directory; gunicorn.conf.py sets METRICS_MULTIPROC_DIR
+    'flush_interval': 1.0              # seconds between snapshot writes per process
+}
+
 # Logging Configuration
 LOGGING_CONFIG = {
     'level': 'INFO',
@@ -215,10 +299,14 @@ def get_config():
         'image_collection': IMAGE_COLLECTION_CONFIG,
         'noise_filtering': NOISE_FILTERING_CONFIG,
         'training': TRAINING_CONFIG,
+        'distillation': DISTILLATION_CONFIG,
         'augmentation': AUGMENTATION_CONFIG,
         'nutrition': NUTRITION_CONFIG,
         'user_preferences': USER_PREFERENCES_CONFIG,
         'performance': PERFORMANCE_CONFIG,
+        'upload_storage': UPLOAD_STORAGE_CONFIG,
+        'job_queue': JOB_QUEUE_CONFIG,
+        'metrics': METRICS_CONFIG,
         'logging': LOGGING_CONFIG,
         'file_paths': FILE_PATHS,
         'web': WEB_CONFIG,
@@ -233,8 +321,11 @@ def update_config(new_config):
     Update configuration with new values
     """
     global MODEL_CONFIG, VDIC_CONFIG, IMAGE_COLLECTION_CONFIG, NOISE_FILTERING_CONFIG
-    global TRAINING_CONFIG, AUGMENTATION_CONFIG, NUTRITION_CONFIG, USER_PREFERENCES_CONFIG
-    global PERFORMANCE_CONFIG, LOGGING_CONFIG, FILE_PATHS, WEB_CONFIG
+    global TRAINING_CONFIG, DISTILLATION_CONFIG, AUGMENTATION_CONFIG, NUTRITION_CONFIG
+    global USER_PREFERENCES_CONFIG
+    global PERFORMANCE_CONFIG, UPLOAD_STORAGE_CONFIG, JOB_QUEUE_CONFIG, METRICS_CONFIG
+    global LOGGING_CONFIG
+    global FILE_PATHS, WEB_CONFIG
     global DATABASE_CONFIG, EXTERNAL_APIS, EVALUATION_CONFIG, DEPLOYMENT_CONFIG
     
     # Update each configuration section
@@ -248,6 +339,8 @@ def update_config(new_config):
         NOISE_FILTERING_CONFIG.update(new_config['noise_filtering'])
     if 'training' in new_config:
         TRAINING_CONFIG.update(new_config['training'])
+    if 'distillation' in new_config:
+        DISTILLATION_CONFIG.update(new_config['distillation'])
     if 'augmentation' in new_config:
         AUGMENTATION_CONFIG.update(new_config['augmentation'])
     if 'nutrition' in new_config:
@@ -256,6 +349,12 @@ def update_config(new_config):
         USER_PREFERENCES_CONFIG.update(new_config['user_preferences'])
     if 'performance' in new_config:
         PERFORMANCE_CONFIG.update(new_config['performance'])
+    if 'upload_storage' in new_config:
+        UPLOAD_STORAGE_CONFIG.update(new_config['upload_storage'])
+    if 'job_queue' in new_config:
+        JOB_QUEUE_CONFIG.update(new_config['job_queue'])
+    if 'metrics' in new_config:
+        METRICS_CONFIG.update(new_config['metrics'])
     if 'logging' in new_config:
         LOGGING_CONFIG.update(new_config['logging'])
     if 'file_paths' in new_config:
@@ -5,6 +5,8 @@ Diagnostic script to check if the NutriVision AI app can run
 
 import sys
 import os
+from importlib.metadata import PackageNotFoundError, version
+from importlib.util import find_spec
 
 print("NutriVision AI - Diagnostic Check")
 print("=" * 60)
@@ -24,13 +26,28 @@ else:
 
 # Check if Flask is installed
 print("\nChecking Dependencies:")
-try:
-    import flask
-    print(f"[OK] Flask {flask.__version__} is installed")
-except ImportError:
+if find_spec('flask') is None:
     print("[ERROR] Flask is NOT installed")
     print("   Install with: pip install Flask")
     sys.exit(1)
+try:
+    print(f"[OK] Flask {version('flask')} is installed")
+except PackageNotFoundError:
+    print("[OK] Flask is installed")
+
+# The web app computes nutrition totals with NumPy
+if find_spec('numpy') is None:
+    print("[ERROR] NumPy is NOT installed")
+    print("   Install with: pip install numpy")
+    sys.exit(1)
+print("[OK] NumPy is installed")
+
+# Optional packages are only located, not imported
+for module, name in [('torch', 'PyTorch'), ('torchvision', 'torchvision')]:
+    if find_spec(module) is not None:
+        print(f"[OK] {name} is available (optional)")
+    else:
+        print(f"[WARNING] {name} is not installed (optional)")
 
 # Try to import app
 print("\nTesting App Import:")
@@ -0,0 +1,120 @@
+"""
+Data-parallel CPU training with torch.distributed
+
+train_distributed runs train_classifier in ranks_per_node processes on
+this machine, each holding a DistributedDataParallel copy of the model
+and synchronizing gradients over the gloo backend. With num_nodes > 1 the
+same call is made on every machine with its node_rank, and all ranks meet
+at master_addr:master_port.
+
+Each rank reads its own share of the data (a DistributedSampler over a
+FoodDataset, or its own shards of a PackedFoodDataset) with its own
+DataLoader workers, and limits its intra-op threads to its share of the
+cores, so ranks and workers do not oversubscribe the machine.
+MODEL_CONFIG['batch_size'] is per rank; the effective batch is that times
+the number of ranks (and gradient_accumulation_steps).
+"""
+
+import copy
+import os
+import tempfile
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import IterableDataset
+from torch.utils.data.distributed import DistributedSampler
+
+from config import PERFORMANCE_CONFIG, TRAINING_CONFIG
+from food_models import atomic_save, create_data_loader, train_classifier
+
+
+def rank_thread_budget(ranks_per_node, num_workers, threads_per_rank=None):
+    """Intra-op threads per rank: its share of the cores, less its DataLoader workers"""
+    if threads_per_rank:
+        return threads_per_rank
+    return max(1, (os.cpu_count() or 1) // ranks_per_node - num_workers)
+
+
+def _rank_loader(dataset, batch_size, rank, world_size, shuffle, seed, performance_config):
+    if dataset is None:
+        return None
+    if isinstance(dataset, IterableDataset):
+        # PackedFoodDataset takes its own shards for the current rank
+        return create_data_loader(dataset, batch_size, performance_config=performance_config)
+    sampler = DistributedSampler(dataset, num_replicas=world_size, rank=rank,
+                                 shuffle=shuffle, seed=seed)
+    return create_data_loader(dataset, batch_size, performance_config=performance_config,
+                              sampler=sampler)
+
+
+def _run_rank(local_rank, model, train_set, val_set, options, result_path):
+    config = options['config']
+    performance_config = options['performance_config']
+    rank = config['node_rank'] * config['ranks_per_node'] + local_rank
+    world_size = config['num_nodes'] * config['ranks_per_node']
+    torch.set_num_threads(rank_thread_budget(config['ranks_per_node'],
+                                             performance_config['num_workers'],
+                                             config['threads_per_rank']))
+    dist.init_process_group('gloo', init_method=f"tcp://{config['master_addr']}:{config['master_port']}",
+                            rank=rank, world_size=world_size)
+    try:
+        # The spawned copy shares its tensors with the parent; train a private one,
+        # in its final memory format before DDP registers the parameters
+        model = copy.deepcopy(model)
+        if config['channels_last']:
+            model.to(memory_format=torch.channels_last)
+        history = train_classifier(
+            DistributedDataParallel(model),
+            _rank_loader(train_set, options['batch_size'], rank, world_size, True,
+                         config['split_seed'], performance_config),
+            _rank_loader(val_set, options['batch_size'], rank, world_size, False,
+                         config['split_seed'], performance_config),
+            num_epochs=options['num_epochs'],
+            learning_rate=options['learning_rate'],
+            config=config,
+            checkpoint_dir=options['checkpoint_dir'],
+            resolution_schedule=options['resolution_schedule']
+        )
+        if rank == 0:
+            atomic_save({'model': model.state_dict(), 'history': history}, result_path)
+    finally:
+        dist.destroy_process_group()
+
+
+def train_distributed(model, train_set, val_set=None, num_epochs=10, learning_rate=1e-3,
+                      batch_size=32, config=None, performance_config=None, checkpoint_dir=None,
+                      resolution_schedule=None):
+    """
+    Train model data-parallel in TRAINING_CONFIG['ranks_per_node'] processes
+
+    On the machine running rank 0 the trained weights are loaded back into
+    model and the per-epoch history (losses and images/s over all ranks) is
+    returned; other machines return None. resolution_schedule is passed
+    to train_classifier, its batch sizes are per rank.
+    """
+    config = config if config is not None else TRAINING_CONFIG
+    options = {
+        'config': dict(config),
+        'performance_config': dict(performance_config if performance_config is not None
+                                   else PERFORMANCE_CONFIG),
+        'batch_size': batch_size,
+        'num_epochs': num_epochs,
+        'learning_rate': learning_rate,
+        'checkpoint_dir': checkpoint_dir,
+        'resolution_schedule': resolution_schedule
+    }
+    world_size = config['num_nodes'] * config['ranks_per_node']
+    print(f"Data-parallel training on {world_size} ranks "
+          f"({config['ranks_per_node']} on this machine)")
+    with tempfile.TemporaryDirectory() as directory:
+        result_path = os.path.join(directory, 'result.pth')
+        mp.spawn(_run_rank, args=(model, train_set, val_set, options, result_path),
+                 nprocs=config['ranks_per_node'])
+        if not os.path.exists(result_path):
+            return None
+        result = torch.load(result_path, map_location='cpu', weights_only=True)
+    model.load_state_dict(result['model'])
+    model.eval()
+    return result['history']
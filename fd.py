@@ -1,19 +1,30 @@
 import os
-import json
-import requests
+import time
+import importlib
 import numpy as np
-import pandas as pd
-from PIL import Image
-import torch
-import torch.nn as nn
-import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
-from torchvision import models, transforms
-import matplotlib.pyplot as plt
-from sklearn.metrics import accuracy_score, classification_report
 import warnings
+
+from config import DISTILLATION_CONFIG, MODEL_CONFIG, TRAINING_CONFIG
+from metrics import time_stage
+
 warnings.filterwarnings('ignore')
 
+# torch-backed classes are imported on first use so the rest of the
+# pipeline loads without torch and torchvision
+_LAZY_ATTRIBUTES = {
+    'FoodDataset': 'food_models',
+    'PackedFoodDataset': 'food_models',
+    'BatchAugmentation': 'food_models',
+    'FoodClassifier': 'food_models'
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 class VDICFoodDetector:
     """
     Visually Discernible and Instantaneously Consumable (VDIC) Food Detector
@@ -193,58 +204,6 @@ class CyclicAUM:
                 
         return filtered_images
 
-class FoodDataset(Dataset):
-    """
-    Custom dataset for food images
-    """
-    
-    def __init__(self, image_paths, labels, transform=None):
-        self.image_paths = image_paths
-        self.labels = labels
-        self.transform = transform or transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], 
-                               std=[0.229, 0.224, 0.225])
-        ])
-        
-    def __len__(self):
-        return len(self.image_paths)
-        
-    def __getitem__(self, idx):
-        # Simulate image loading (in real implementation, load actual images)
-        image = torch.randn(3, 224, 224)  # Placeholder
-        label = self.labels[idx]
-        
-        if self.transform:
-            image = self.transform(image)
-            
-        return image, label
-
-class FoodClassifier(nn.Module):
-    """
-    ResNet101-based food classifier
-    """
-    
-    def __init__(self, num_classes, pretrained=True):
-        super(FoodClassifier, self).__init__()
-        
-        # Load pre-trained ResNet101
-        self.resnet = models.resnet101(pretrained=pretrained)
-        
-        # Modify final layer for food classification
-        num_features = self.resnet.fc.in_features
-        self.resnet.fc = nn.Sequential(
-            nn.Dropout(0.5),
-            nn.Linear(num_features, 512),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(512, num_classes)
-        )
-        
-    def forward(self, x):
-        return self.resnet(x)
-
 class NutritionAnalyzer:
     """
     Analyzes nutritional content and provides diet suggestions
@@ -342,37 +301,50 @@ class NutritionDetectionSystem:
         
         # Initialize model (in real implementation, load trained weights)
         self.model = None
+        self.inference_model = None
         self.class_names = []
+        # Checkpoint used by classify_image_file, kept apart from the served model
+        self._checkpoint_path = None
+        self._checkpoint_model = None
+        self._checkpoint_class_names = []
         
-    def detect_food_from_image(self, image_path):
+    def detect_food_from_image(self, image_path, model_path=None):
         """
         Main pipeline: detect food from image and provide nutrition analysis
+        
+        model_path names a checkpoint written by save_checkpoint (e.g. the
+        student from distill_model) used to classify the image.
         """
         print("=== AI-based Nutrition Detection System ===")
         
         # Step 1: VDIC Detection
         print("\n1. VDIC Food Detection...")
-        # Simulate food detection from image
-        detected_foods = ['apple', 'banana', 'sandwich']
-        
-        vdic_foods = []
-        for food in detected_foods:
-            if self.vdic_detector.predict_vdic_status(food):
-                vdic_foods.append(food)
-                print(f"✓ {food} is VDIC")
+        with time_stage('vdic_detection'):
+            if model_path is not None:
+                detected_foods = [self.classify_image_file(image_path, model_path)]
             else:
-                print(f"✗ {food} is not VDIC")
+                # Simulate food detection from image
+                detected_foods = ['apple', 'banana', 'sandwich']
+        
+            vdic_foods = []
+            for food in detected_foods:
+                if self.vdic_detector.predict_vdic_status(food):
+                    vdic_foods.append(food)
+                    print(f"✓ {food} is VDIC")
+                else:
+                    print(f"✗ {food} is not VDIC")
                 
         # Step 2: Image Collection and Noise Filtering
         print("\n2. Image Collection and Noise Filtering...")
-        all_images = []
-        for food in vdic_foods:
-            images = self.image_collector.collect_images(food, max_images=50)
-            all_images.extend(images)
+        with time_stage('image_collection'):
+            all_images = []
+            for food in vdic_foods:
+                images = self.image_collector.collect_images(food, max_images=50)
+                all_images.extend(images)
             
-        # Simulate noise filtering
-        clean_images = [img for img in all_images if img['is_clean']]
-        noisy_images = [img for img in all_images if not img['is_clean']]
+            # Simulate noise filtering
+            clean_images = [img for img in all_images if img['is_clean']]
+            noisy_images = [img for img in all_images if not img['is_clean']]
         
         print(f"Collected {len(all_images)} images")
         print(f"Clean images: {len(clean_images)}")
@@ -382,23 +354,25 @@ class NutritionDetectionSystem:
         print("\n3. Applying Noise Filtering Algorithms...")
         
         # Simulate predictions and ground truth for AccGap
-        predictions = [1 if img['is_clean'] else 0 for img in all_images]
-        ground_truth = [1 if img['is_clean'] else 0 for img in all_images]
+        with time_stage('noise_filtering'):
+            predictions = [1 if img['is_clean'] else 0 for img in all_images]
+            ground_truth = [1 if img['is_clean'] else 0 for img in all_images]
         
-        noise_level = self.acc_gap_estimator.estimate_noise_level(
-            all_images, predictions, ground_truth
-        )
-        print(f"Estimated noise level (AccGap): {noise_level:.2f}")
+            noise_level = self.acc_gap_estimator.estimate_noise_level(
+                all_images, predictions, ground_truth
+            )
+            print(f"Estimated noise level (AccGap): {noise_level:.2f}")
         
-        # Apply cAUM filtering
-        margins = [img['confidence'] for img in all_images]
-        filtered_images = self.cyclic_aum.filter_samples(all_images, margins)
-        print(f"Images after cAUM filtering: {len(filtered_images)}")
+            # Apply cAUM filtering
+            margins = [img['confidence'] for img in all_images]
+            filtered_images = self.cyclic_aum.filter_samples(all_images, margins)
+            print(f"Images after cAUM filtering: {len(filtered_images)}")
         
         # Step 4: Nutrition Analysis and Diet Suggestions
         print("\n4. Nutrition Analysis and Diet Suggestions...")
         
-        analysis = self.nutrition_analyzer.generate_diet_suggestions(vdic_foods)
+        with time_stage('nutrition_analysis'):
+            analysis = self.nutrition_analyzer.generate_diet_suggestions(vdic_foods)
         
         # Display results
         print("\n=== NUTRITION SUMMARY ===")
@@ -414,37 +388,304 @@ class NutritionDetectionSystem:
             
         return analysis
     
-    def train_model(self, train_data, train_labels, num_epochs=10):
+    def train_model(self, train_data, train_labels=None, num_epochs=10):
         """
         Train the food classification model
+        
+        train_data is a list of image paths with train_labels, or a
+        directory written by pack_dataset.py, which carries its own labels
+        and is streamed shard by shard. TRAINING_CONFIG['validation_split']
+        of the data is held out for early stopping. Every epoch is
+        checkpointed to TRAINING_CONFIG['checkpoint_dir'] in the background
+        (resume with TRAINING_CONFIG['resume']). With
+        TRAINING_CONFIG['ranks_per_node'] or ['num_nodes'] above 1 the
+        model is trained data-parallel by distributed_training.
+        TRAINING_CONFIG['activation_checkpointing'] and ['auto_batch_size']
+        trade compute or batch size for memory, and
+        TRAINING_CONFIG['progressive_resizing'] trains the early epochs at
+        a lower resolution. The training part is augmented on whole batches
+        as set in AUGMENTATION_CONFIG. Returns the per-epoch history.
         """
+        from food_models import (FoodClassifier, build_augmentation, create_data_loader, open_dataset,
+                                 probe_batch_size, progressive_resizing_schedule, split_dataset,
+                                 train_classifier)
+        
         print("Training food classification model...")
+        dataset = open_dataset(train_data, train_labels, input_size=MODEL_CONFIG['input_size'],
+                               shuffle=True, augmentation=build_augmentation())
+        self.class_names = getattr(dataset, 'class_names', None) or self.class_names
+        train_set, val_set = split_dataset(dataset, TRAINING_CONFIG['validation_split'],
+                                           seed=TRAINING_CONFIG['split_seed'])
+        
+        # Initialize model; labels index the output layer, so gaps in them
+        # (e.g. classes missing from this data) still need their outputs
+        class_names = getattr(dataset, 'class_names', None)
+        num_classes = len(class_names) if class_names else int(max(dataset.labels)) + 1
+        self.model = FoodClassifier(
+            num_classes,
+            pretrained=MODEL_CONFIG['pretrained'],
+            architecture=MODEL_CONFIG['architecture'],
+            dropout_rate=MODEL_CONFIG['dropout_rate']
+        )
+        self.model.activation_checkpointing = TRAINING_CONFIG['activation_checkpointing']
+        
+        config = dict(TRAINING_CONFIG)
+        batch_size = MODEL_CONFIG['batch_size']
+        if config['auto_batch_size']:
+            effective_batch_size = batch_size * config['gradient_accumulation_steps']
+            batch_size, config['gradient_accumulation_steps'] = probe_batch_size(
+                self.model, MODEL_CONFIG['input_size'], effective_batch_size, config,
+                ranks=config['ranks_per_node'])
+            print(f"Batch size {batch_size} x {config['gradient_accumulation_steps']} "
+                  f"accumulation steps fits the memory budget")
+        schedule = None
+        if config['progressive_resizing']:
+            schedule = progressive_resizing_schedule(
+                num_epochs, MODEL_CONFIG['input_size'], batch_size,
+                start_size=config['progressive_start_size'],
+                ramp_end=config['progressive_ramp_end'], step=config['progressive_size_step'])
+        
+        start = time.perf_counter()
+        if config['ranks_per_node'] > 1 or config['num_nodes'] > 1:
+            from distributed_training import train_distributed
+            
+            history = train_distributed(self.model, train_set, val_set, num_epochs=num_epochs,
+                                        learning_rate=MODEL_CONFIG['learning_rate'],
+                                        batch_size=batch_size, config=config,
+                                        checkpoint_dir=config['checkpoint_dir'],
+                                        resolution_schedule=schedule)
+            if history is None:
+                # Rank 0, and with it the trained weights, is on another machine
+                return None
+        else:
+            train_loader = create_data_loader(train_set, batch_size, shuffle=True)
+            val_loader = (create_data_loader(val_set, batch_size)
+                          if val_set is not None else None)
+            history = train_classifier(self.model, train_loader, val_loader, num_epochs=num_epochs,
+                                       learning_rate=MODEL_CONFIG['learning_rate'], config=config,
+                                       checkpoint_dir=config['checkpoint_dir'],
+                                       resolution_schedule=schedule)
+        print(f"Model training completed in {time.perf_counter() - start:.1f}s "
+              f"({len(history)} epochs)")
+        return history
+    
+    def evaluate_model(self, data, labels=None):
+        """
+        Top-1 accuracy of the inference model (or the trained model)
         
-        # Initialize model
-        num_classes = len(set(train_labels))
-        self.model = FoodClassifier(num_classes)
+        data is a list of image paths with labels, or a pack_dataset.py
+        directory.
+        """
+        from food_models import create_data_loader, evaluate_classifier, open_dataset
         
-        # Training setup
-        criterion = nn.CrossEntropyLoss()
-        optimizer = optim.Adam(self.model.parameters(), lr=0.001)
+        model = self.inference_model if self.inference_model is not None else self.model
+        if model is None:
+            raise RuntimeError("No model to evaluate. Train or load the model first.")
         
-        # Training loop
-        for epoch in range(num_epochs):
-            # Simulate training (in real implementation, use actual data)
-            loss = np.random.uniform(0.1, 0.5)
-            print(f"Epoch {epoch+1}/{num_epochs}, Loss: {loss:.4f}")
-            
-        print("Model training completed!")
+        dataset = open_dataset(data, labels, input_size=MODEL_CONFIG['input_size'])
+        loss, accuracy = evaluate_classifier(
+            model, create_data_loader(dataset, MODEL_CONFIG['batch_size']))
+        print(f"Accuracy: {accuracy:.4f}, loss: {loss:.4f} on {len(dataset)} images")
+        return {'accuracy': accuracy, 'loss': loss, 'count': len(dataset)}
+        
+    def train_head(self, image_paths, labels, num_epochs=10):
+        """
+        Fine-tune only the classification head on top of a frozen backbone
         
+        Backbone features are extracted once into an on-disk cache (reused
+        until the backbone weights, transforms or images change), so each
+        epoch only runs the small head.
+        """
+        if self.model is None:
+            print("No model to fine-tune. Train or load the model first.")
+            return None
+        
+        from food_models import FoodDataset, cache_backbone_features, train_head
+        
+        for param in self.model.backbone.parameters():
+            param.requires_grad = False
+        
+        print("Extracting backbone features...")
+        dataset = FoodDataset(image_paths, labels, input_size=MODEL_CONFIG['input_size'])
+        features = cache_backbone_features(self.model.backbone, dataset,
+                                           TRAINING_CONFIG['feature_cache_path'],
+                                           batch_size=MODEL_CONFIG['batch_size'])
+        history = train_head(self.model.head, features, num_epochs=num_epochs,
+                             learning_rate=MODEL_CONFIG['learning_rate'],
+                             batch_size=TRAINING_CONFIG['head_batch_size'])
+        self.model.eval()
+        print("Head fine-tuning completed!")
+        return history
+    
     def save_model(self, filepath):
         """
-        Save the trained model
+        Save the trained model as a checkpoint (written to a temporary file, then renamed)
+        
+        The checkpoint keeps the class names, so whoever loads it maps each
+        output index to the right food.
         """
         if self.model:
-            torch.save(self.model.state_dict(), filepath)
+            from food_models import save_checkpoint
+            
+            save_checkpoint(self.model, filepath, self.class_names)
             print(f"Model saved to {filepath}")
         else:
             print("No model to save. Train the model first.")
+    
+    def export_inference_model(self, path=None, onnx_path=None):
+        """
+        Export the trained model as a frozen TorchScript artifact
+        
+        Batch norm is folded, dropout removed and weights stored channels_last.
+        onnx_path additionally writes an ONNX graph for ONNX Runtime.
+        """
+        if self.model is None:
+            print("No model to export. Train the model first.")
+            return None
+        
+        from food_models import export_classifier
+        
+        path = path or MODEL_CONFIG['optimized_path']
+        export_classifier(self.model, path, onnx_path=onnx_path, input_size=MODEL_CONFIG['input_size'],
+                          class_names=self.class_names)
+        print(f"Optimized model exported to {path}")
+        return path
+    
+    def load_model(self, weights_path=None):
+        """
+        Load a model for inference
+        
+        The same model as the web app serves (food_models.load_serving_model):
+        with MODEL_CONFIG['quantization'] 'int8' the quantized artifact
+        written by prepare_inference_model, otherwise the exported artifact
+        named by MODEL_CONFIG when present, otherwise FoodClassifier built
+        around the trained weights, memory-mapped from the file so that web
+        workers start quickly and share the weights through the page cache.
+        With MODEL_CONFIG['cascade'] the model is put behind a small fast model.
+        Raises FileNotFoundError when the weights or artifact are missing.
+        """
+        from food_models import FoodClassifier, load_serving_model
+        
+        self.inference_model = load_serving_model(MODEL_CONFIG['num_classes'], MODEL_CONFIG, weights_path)
+        self.class_names = list(getattr(self.inference_model, 'class_names', [])) or self.class_names
+        full_model = getattr(self.inference_model, 'full_model', self.inference_model)
+        if isinstance(full_model, FoodClassifier):
+            self.model = full_model
+        print(f"Loaded {type(full_model).__name__} for inference "
+              f"(quantization: {MODEL_CONFIG['quantization']}, cascade: {MODEL_CONFIG['cascade']})")
+        return self.inference_model
+    
+    def classify_image_file(self, image_path, model_path):
+        """
+        Classify one image file with a saved checkpoint and return the food name
+        
+        The checkpoint is cached by path and does not replace the model
+        loaded for classify_images.
+        """
+        import torch
+        from food_models import load_checkpoint
+        from inference_engine import decode_image
+        
+        if self._checkpoint_path != model_path:
+            self._checkpoint_model, self._checkpoint_class_names = load_checkpoint(model_path)
+            self._checkpoint_path = model_path
+        
+        with open(image_path, 'rb') as f:
+            image = decode_image(f.read(), MODEL_CONFIG['input_size'])
+        with torch.inference_mode():
+            class_idx = int(self._checkpoint_model(image.unsqueeze(0)).argmax(dim=1))
+        class_names = self._checkpoint_class_names
+        return class_names[class_idx] if class_idx < len(class_names) else str(class_idx)
+    
+    def distill_model(self, image_paths, labels, class_names=None, student_architecture=None,
+                      num_epochs=None, output_path=None):
+        """
+        Distill the trained model (teacher) into a compact student
+        
+        Teacher logits are computed once and cached on disk; the student is
+        trained on soft teacher targets mixed with the hard labels and saved
+        as a checkpoint that detect_food_from_image can load.
+        """
+        if self.model is None:
+            print("No teacher model. Train or load the model first.")
+            return None
+        
+        from food_models import (FoodClassifier, FoodDataset, cache_teacher_logits,
+                                 distill_student, save_checkpoint)
+        
+        config = DISTILLATION_CONFIG
+        dataset = FoodDataset(image_paths, labels, input_size=MODEL_CONFIG['input_size'])
+        print("Computing teacher logits...")
+        teacher_logits = cache_teacher_logits(self.model, dataset, config['teacher_logits_path'],
+                                              batch_size=config['batch_size'])
+        
+        architecture = student_architecture or config['student_architecture']
+        student = FoodClassifier(teacher_logits.shape[1], pretrained=MODEL_CONFIG['pretrained'],
+                                 architecture=architecture)
+        print(f"Distilling into {architecture}...")
+        distill_student(student, dataset, teacher_logits,
+                        num_epochs=num_epochs or config['num_epochs'],
+                        temperature=config['temperature'],
+                        alpha=config['alpha'],
+                        learning_rate=config['learning_rate'],
+                        batch_size=config['batch_size'])
+        
+        output_path = output_path or config['student_path']
+        save_checkpoint(student, output_path, class_names or self.class_names)
+        print(f"Student model saved to {output_path}")
+        return output_path
+    
+    def classify_images(self, images):
+        """
+        Classify a batch of preprocessed images with the inference model
+        
+        Returns (class indices, top-1 probabilities).
+        """
+        import torch
+        
+        if self.inference_model is None:
+            raise RuntimeError("No inference model loaded. Call load_model() first.")
+        with torch.inference_mode():
+            probabilities = torch.softmax(self.inference_model(images), dim=1)
+        confidences, classes = probabilities.max(dim=1)
+        return classes, confidences
+    
+    def prepare_inference_model(self, calibration_paths=None, calibration_labels=None):
+        """
+        Prepare the trained model for inference
+        
+        With MODEL_CONFIG['quantization'] set to 'int8' the model is quantized
+        for CPU serving, calibrated on the images in calibration_paths (or a
+        pack_dataset.py directory), and saved to MODEL_CONFIG['quantized_path'],
+        from where load_model and the web app serve it.
+        """
+        if self.model is None:
+            print("No model to prepare. Train the model first.")
+            return None
+        
+        self.model.eval()
+        if MODEL_CONFIG['quantization'] != 'int8':
+            self.inference_model = self.model
+            return self.inference_model
+        
+        if not calibration_paths:
+            raise ValueError("int8 quantization needs calibration images")
+        
+        from food_models import create_data_loader, open_dataset, quantize_classifier, save_quantized_classifier
+        
+        dataset = open_dataset(calibration_paths, calibration_labels,
+                               input_size=MODEL_CONFIG['input_size'], shuffle=True)
+        loader = create_data_loader(dataset, MODEL_CONFIG['batch_size'], shuffle=True)
+        print("Calibrating int8 model...")
+        self.inference_model = quantize_classifier(
+            self.model, loader,
+            num_batches=MODEL_CONFIG['calibration_batches'],
+            backend=MODEL_CONFIG['quantization_backend']
+        )
+        save_quantized_classifier(self.inference_model, MODEL_CONFIG['quantized_path'],
+                                  MODEL_CONFIG['input_size'], class_names=self.class_names)
+        print(f"Model quantized to int8 and saved to {MODEL_CONFIG['quantized_path']}")
+        return self.inference_model
 
 def main():
     """
@@ -464,9 +705,9 @@ def main():
     print("DEMONSTRATING MODEL TRAINING")
     print("="*50)
     
-    # Simulate training data
-    train_data = np.random.randn(100, 3, 224, 224)
-    train_labels = np.random.randint(0, 5, 100)
+    # Simulate training data (missing files become random placeholder images)
+    train_data = [f"sample_food_{i}.jpg" for i in range(32)]
+    train_labels = np.random.randint(0, 5, 32).tolist()
     
     system.train_model(train_data, train_labels, num_epochs=5)
     
@@ -0,0 +1,172 @@
+"""
+Trigram index for fuzzy food-name matching
+
+Names are split into padded character trigrams and stored in an inverted
+index (trigram -> sorted array of name ids, packed CSR-style into two NumPy
+arrays). A lookup only touches the posting lists of the query's own
+trigrams, so its cost depends on how common those trigrams are rather than
+on the size of the catalogue, and candidates come back ranked by their
+Dice similarity to the query.
+
+For large catalogues, candidates are drawn only from the query's rarest
+trigrams (up to `candidate_budget` postings) and then scored from a forward
+name -> trigrams index. Names sharing none of those rare trigrams can only
+be weak matches and are skipped.
+"""
+
+import numpy as np
+
+
+def normalize_name(name):
+    """Lowercase a food name and collapse runs of whitespace"""
+    return ' '.join(name.lower().split())
+
+
+def trigrams(name):
+    """Return the set of padded character trigrams for a normalized name"""
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    """Return the Levenshtein distance between two strings"""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def is_plausible_match(query, name):
+    """
+    Check that a ranked candidate really names the queried food
+
+    Trigram overlap alone pairs unrelated foods that share a few letters
+    ('pear' and 'peanuts', 'beer' and 'beef'). A candidate is accepted when
+    one name contains the other, as in 'grilled chicken breast', or when a
+    run of query words as long as the name is a typo of it: one edit per
+    five characters, so short names must match exactly.
+    """
+    query, name = normalize_name(query), normalize_name(name)
+    if name in query or query in name:
+        return True
+    words, span = query.split(), len(name.split())
+    budget = len(name) // 5
+    return any(edit_distance(' '.join(words[i:i + span]), name) <= budget
+               for i in range(max(1, len(words) - span + 1)))
+
+
+class TrigramIndex:
+    """
+    Inverted trigram index returning ranked fuzzy matches for food names
+    """
+
+    def __init__(self, names, candidate_budget=512):
+        self.names = tuple(names)
+        self.candidate_budget = candidate_budget
+
+        trigram_ids = {}
+        pair_trigrams = []
+        pair_names = []
+        sizes = np.zeros(len(self.names), dtype=np.int32)
+
+        for name_id, name in enumerate(self.names):
+            grams = trigrams(normalize_name(name))
+            sizes[name_id] = len(grams)
+            for gram in grams:
+                pair_trigrams.append(trigram_ids.setdefault(gram, len(trigram_ids)))
+            pair_names.extend([name_id] * len(grams))
+
+        pair_trigrams = np.asarray(pair_trigrams, dtype=np.int32)
+        pair_names = np.asarray(pair_names, dtype=np.int32)
+
+        # Pairs are generated name by name, so they double as a forward
+        # index (name -> trigram ids) used to score candidates
+        self._forward = pair_trigrams
+        self._forward_offsets = (np.cumsum(sizes, dtype=np.int64) - sizes)
+
+        # Group (trigram, name) pairs by trigram; a stable sort keeps each
+        # posting list ordered by name id
+        order = np.argsort(pair_trigrams, kind='stable')
+        self._postings = pair_names[order]
+        counts = np.bincount(pair_trigrams, minlength=len(trigram_ids))
+        self._offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self._trigram_ids = trigram_ids
+        self._sizes = sizes
+
+    def _count_shared(self, candidates, slots):
+        """Count how many of the query trigram ids each candidate contains"""
+        lengths = self._sizes[candidates]
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        within = np.arange(ends[-1]) - np.repeat(starts, lengths)
+        grams = self._forward[np.repeat(self._forward_offsets[candidates], lengths) + within]
+        hits = np.isin(grams, slots).astype(np.int32)
+        return np.add.reduceat(hits, starts)
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, query, limit=5, min_score=0.3):
+        """
+        Return up to `limit` (name, score) pairs ranked by descending score
+
+        The score is the Dice coefficient between the trigram sets of the
+        query and the name, so an exact match scores 1.0.
+        """
+        grams = trigrams(normalize_name(query))
+        slots = [self._trigram_ids[gram] for gram in grams if gram in self._trigram_ids]
+        if not slots:
+            return []
+
+        # Rarest trigrams first: they are the cheapest and most selective
+        postings = sorted(
+            (self._postings[self._offsets[slot]:self._offsets[slot + 1]] for slot in slots),
+            key=len
+        )
+        used, total = 1, len(postings[0])
+        while used < len(postings) and total + len(postings[used]) <= self.candidate_budget:
+            total += len(postings[used])
+            used += 1
+
+        if used == len(postings):
+            candidates, shared = np.unique(np.concatenate(postings), return_counts=True)
+        else:
+            # Generate candidates from the rare lists only, then count shared
+            # trigrams from each candidate's own trigram list
+            if used > 1 or len(postings) < 3:
+                candidates = np.unique(np.concatenate(postings[:used]))
+            else:
+                # Even the rarest trigram is common: require candidates to
+                # appear in at least two of the three rarest lists
+                ids, counts = np.unique(np.concatenate(postings[:3]), return_counts=True)
+                candidates = ids[counts >= 2] if (counts >= 2).any() else ids
+            shared = self._count_shared(candidates, slots)
+
+        scores = 2.0 * shared / (len(grams) + self._sizes[candidates])
+        keep = scores >= min_score
+        candidates, scores = candidates[keep], scores[keep]
+
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[top], scores[top]
+
+        # Highest score first, earlier catalogue entries win ties
+        order = np.lexsort((candidates, -scores))
+        return [(self.names[candidates[k]], float(scores[k])) for k in order]
+
+    def best(self, query, min_score=0.3, limit=5):
+        """
+        Return the best plausible matching name, or None if there is none
+
+        The top `limit` ranked candidates are checked with
+        is_plausible_match, so a food missing from the catalogue is reported
+        as unknown instead of matching a name that merely looks similar.
+        """
+        for name, _ in self.match(query, limit=limit, min_score=min_score):
+            if is_plausible_match(query, name):
+                return name
+        return None
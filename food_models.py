@@ -0,0 +1,1573 @@
+"""
+torch-backed models and datasets for food classification
+
+Kept apart from fd.py so that importing the detection pipeline does not
+load torch and torchvision; fd re-exports these names lazily.
+
+Large training sets can be packed into a few shard files of pre-resized
+uint8 pixels (pack_images) and streamed with PackedFoodDataset, which
+avoids opening and decoding one small file per sample. Training
+augmentation (BatchAugmentation) runs on whole collated batches.
+
+Training helpers cover the mini-batch training loop driven by
+TRAINING_CONFIG, knowledge distillation into a smaller student with
+cached teacher logits, and head-only fine-tuning from a cache of backbone
+features. Besides training-time classes this module holds the inference variants of
+FoodClassifier: int8 quantization, an exported, frozen TorchScript (or
+ONNX) artifact with batch norm folded and dropout removed, and a cascade
+that only escalates hard images from a small model to the full one.
+"""
+
+import copy
+import glob
+import hashlib
+import json
+import os
+import math
+import queue
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from functools import partial
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.nn as nn
+import torch.nn.functional as F
+from PIL import Image
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.checkpoint import checkpoint
+from torch.utils.data import DataLoader, Dataset, IterableDataset, default_collate, get_worker_info
+from torchvision import models, transforms
+
+from config import AUGMENTATION_CONFIG, PERFORMANCE_CONFIG, TRAINING_CONFIG
+from metrics import METRICS
+
+
+class FoodDataset(Dataset):
+    """
+    Custom dataset for food images
+
+    JPEGs are decoded in PIL draft mode, at the smallest DCT scale that is
+    still at least input_size, so large photos cost a fraction of a full
+    decode and the resize works on a much smaller image.
+
+    set_input_size changes the decode size and every Resize of the
+    transform, also inside running DataLoader workers: the size lives in
+    shared memory and each worker applies a change on its next sample.
+
+    augmentation (a BatchAugmentation) is applied by create_data_loader to
+    each collated batch rather than per sample in the transform.
+    """
+
+    def __init__(self, image_paths, labels, transform=None, input_size=(224, 224),
+                 augmentation=None):
+        self.image_paths = image_paths
+        self.labels = labels
+        self.input_size = tuple(input_size)
+        self.augmentation = augmentation
+        self._shared_size = torch.tensor(self.input_size).share_memory_()
+        self.transform = transform or transforms.Compose([
+            transforms.Resize(self.input_size),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], 
+                               std=[0.229, 0.224, 0.225])
+        ])
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def set_input_size(self, input_size):
+        """Decode and resize to input_size from the next sample on, in all workers"""
+        self._shared_size.copy_(torch.tensor(input_size))
+        self._apply_input_size()
+
+    def _apply_input_size(self):
+        size = tuple(self._shared_size.tolist())
+        if size != self.input_size:
+            self.input_size = size
+            # The transform may be shared with other datasets, e.g. by split_dataset
+            self.transform = copy.deepcopy(self.transform)
+            for transform in getattr(self.transform, 'transforms', [self.transform]):
+                if isinstance(transform, transforms.Resize):
+                    transform.size = list(size)
+
+    def load_image(self, path):
+        """Decode an image file to RGB close to input_size"""
+        with Image.open(path) as image:
+            # draft takes (width, height); input_size is (height, width)
+            image.draft('RGB', self.input_size[::-1])
+            return image.convert('RGB')
+
+    def __getitem__(self, idx):
+        self._apply_input_size()
+        path = self.image_paths[idx]
+        if os.path.exists(path):
+            image = self.load_image(path)
+        else:
+            # Missing files (e.g. simulated datasets) get a random placeholder
+            pixels = np.random.randint(0, 256, (*self.input_size, 3), dtype=np.uint8)
+            image = Image.fromarray(pixels)
+        label = self.labels[idx]
+
+        if self.transform:
+            image = self.transform(image)
+
+        return image, label
+
+
+class BatchAugmentation:
+    """
+    Random flips, rotation and color jitter applied to a whole batch
+
+    Runs on collated (N, 3, H, W) batches with vectorized tensor ops and
+    draws the parameters per sample: uint8 batches come back as uint8,
+    float batches are taken as normalized with mean and std (None for
+    plain [0, 1] images) and come back the same way. Brightness, contrast,
+    saturation and hue (a rotation of the chroma plane in YIQ space) are
+    fused into one 3x3 color matrix and offset per sample (one batched
+    matrix multiply, without torchvision's clamping between the steps),
+    and flip and rotation into one grid_sample.
+    """
+
+    # ITU-R 601 luma, as used by torchvision for grayscale
+    LUMA = (0.299, 0.587, 0.114)
+    RGB_TO_YIQ = ((0.299, 0.587, 0.114), (0.596, -0.274, -0.322), (0.211, -0.523, 0.312))
+
+    def __init__(self, horizontal_flip=0.5, rotation=0.0, brightness=0.0, contrast=0.0,
+                 saturation=0.0, hue=0.0, mean=(0.485, 0.456, 0.406), std=(0.229, 0.224, 0.225),
+                 generator=None):
+        self.horizontal_flip = horizontal_flip
+        self.rotation = rotation
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        self.hue = hue
+        self.mean = torch.tensor(mean).view(1, 3, 1, 1) if mean is not None else None
+        self.std = torch.tensor(std).view(1, 3, 1, 1) if std is not None else None
+        self.generator = generator
+
+    def _uniform(self, count, low, high):
+        return torch.rand(count, generator=self.generator) * (high - low) + low
+
+    def _jitter_color(self, images):
+        n = len(images)
+        luma = torch.tensor(self.LUMA)
+        matrix = torch.eye(3).expand(n, 3, 3)
+        if self.saturation:
+            saturation = self._uniform(n, 1 - self.saturation, 1 + self.saturation).view(n, 1, 1)
+            matrix = saturation * torch.eye(3) + (1 - saturation) * luma.expand(3, 3)
+        if self.hue:
+            angle = self._uniform(n, -self.hue, self.hue) * 2 * math.pi
+            rotation = torch.zeros(n, 3, 3)
+            rotation[:, 0, 0] = 1
+            rotation[:, 1, 1] = rotation[:, 2, 2] = angle.cos()
+            rotation[:, 1, 2] = angle.sin()
+            rotation[:, 2, 1] = -angle.sin()
+            to_yiq = torch.tensor(self.RGB_TO_YIQ)
+            matrix = torch.linalg.inv(to_yiq) @ rotation @ to_yiq @ matrix
+        # Contrast blends towards the mean gray level, brightness scales everything
+        scale = torch.ones(n)
+        offset = torch.zeros(n)
+        if self.contrast:
+            contrast = self._uniform(n, 1 - self.contrast, 1 + self.contrast)
+            gray = torch.einsum('c,nchw->n', luma, images) / images[0, 0].numel()
+            scale = scale * contrast
+            offset = (1 - contrast) * gray
+        if self.brightness:
+            brightness = self._uniform(n, 1 - self.brightness, 1 + self.brightness)
+            scale = scale * brightness
+            offset = offset * brightness
+        matrix = matrix * scale.view(n, 1, 1)
+        # Gray stays gray under the saturation and hue matrices, so the offset is per image
+        pixels = torch.baddbmm(offset.view(n, 1, 1).expand(n, 3, 1), matrix, images.flatten(2))
+        return pixels.view_as(images).clamp_(0, 1)
+
+    def _flip_and_rotate(self, images):
+        n, _, height, width = images.shape
+        flip = torch.rand(n, generator=self.generator) < self.horizontal_flip
+        if not self.rotation:
+            return torch.where(flip.view(n, 1, 1, 1), images.flip(-1), images)
+        angle = self._uniform(n, -self.rotation, self.rotation) * math.pi / 180
+        cos, sin = angle.cos(), angle.sin()
+        theta = torch.zeros(n, 2, 3)
+        # Normalized grid coordinates: correct the rotation for the aspect ratio
+        theta[:, 0, 0] = cos
+        theta[:, 0, 1] = -sin * height / width
+        theta[:, 1, 0] = sin * width / height
+        theta[:, 1, 1] = cos
+        theta[flip, 0, :2] *= -1
+        grid = F.affine_grid(theta, images.shape, align_corners=False)
+        return F.grid_sample(images, grid, mode='bilinear', padding_mode='zeros', align_corners=False)
+
+    def __call__(self, images):
+        dtype = images.dtype
+        if dtype == torch.uint8:
+            images = images.float().div_(255)
+        elif self.mean is not None:
+            images = images * self.std + self.mean
+        if self.brightness or self.contrast or self.saturation or self.hue:
+            images = self._jitter_color(images)
+        if self.horizontal_flip or self.rotation:
+            images = self._flip_and_rotate(images)
+        if dtype == torch.uint8:
+            return images.mul_(255).round_().to(torch.uint8)
+        if self.mean is not None:
+            return (images - self.mean).div_(self.std)
+        return images
+
+
+def build_augmentation(config=None):
+    """BatchAugmentation for AUGMENTATION_CONFIG, or None when it is disabled"""
+    config = config if config is not None else AUGMENTATION_CONFIG
+    if not config['enabled']:
+        return None
+    options = config['transforms']
+    color = options.get('color_jitter', False)
+    return BatchAugmentation(
+        horizontal_flip=options.get('random_horizontal_flip', 0.0),
+        rotation=options.get('random_rotation', 0.0),
+        brightness=options.get('random_brightness', 0.0) if color else 0.0,
+        contrast=options.get('random_contrast', 0.0) if color else 0.0,
+        saturation=options.get('random_saturation', 0.0) if color else 0.0,
+        hue=options.get('random_hue', 0.0) if color else 0.0
+    )
+
+
+def _augmented_collate(batch, augmentation):
+    images, labels = default_collate(batch)
+    return augmentation(images), labels
+
+
+def create_data_loader(dataset, batch_size, shuffle=False, performance_config=None, sampler=None):
+    """
+    Build a DataLoader with the worker settings in PERFORMANCE_CONFIG
+
+    num_workers decode images in parallel processes, prefetch_factor batches
+    are queued per worker, and pin_memory applies only when a GPU is used.
+    A sampler (e.g. DistributedSampler) replaces shuffle. The dataset's
+    augmentation, if any, runs on every batch right after collation, inside
+    the workers.
+    """
+    config = performance_config if performance_config is not None else PERFORMANCE_CONFIG
+    num_workers = config['num_workers']
+    options = {}
+    if num_workers > 0:
+        options.update(prefetch_factor=config['prefetch_factor'], persistent_workers=True)
+    augmentation = getattr(dataset, 'augmentation', None)
+    if augmentation is not None:
+        options['collate_fn'] = partial(_augmented_collate, augmentation=augmentation)
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        # Iterable datasets (PackedFoodDataset) shuffle themselves
+        shuffle=shuffle and sampler is None and not isinstance(dataset, IterableDataset),
+        sampler=sampler,
+        num_workers=num_workers,
+        pin_memory=config['pin_memory'] and config['use_gpu'] and torch.cuda.is_available(),
+        **options
+    )
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def list_image_folder(directory):
+    """Return (image paths, labels, class names) for a class-per-folder tree"""
+    class_names = sorted(entry.name for entry in os.scandir(directory) if entry.is_dir())
+    paths, labels = [], []
+    for label, name in enumerate(class_names):
+        for filename in sorted(os.listdir(os.path.join(directory, name))):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(directory, name, filename))
+                labels.append(label)
+    return paths, labels, class_names
+
+
+PACKED_INDEX = 'index.json'
+
+
+def pack_images(image_paths, labels, output_dir, input_size=(224, 224), shard_size=1024,
+                class_names=None, batch_size=64):
+    """
+    Pack images into shards of pre-resized uint8 pixels for PackedFoodDataset
+
+    Each shard is a .npy array of shape (count, 3, height, width) in
+    output_dir; index.json lists the shards, labels, source paths and
+    class names and is written last, so an interrupted pack is never read.
+    Images are decoded by FoodDataset (draft mode) in DataLoader workers.
+    Returns the index.
+    """
+    input_size = tuple(input_size)
+    os.makedirs(output_dir, exist_ok=True)
+    dataset = FoodDataset(image_paths, labels, input_size=input_size,
+                          transform=transforms.Compose([transforms.Resize(input_size),
+                                                        transforms.PILToTensor()]))
+    shards = []
+    shard = None
+    row = 0
+    for images, _ in create_data_loader(dataset, batch_size):
+        images = images.numpy()
+        while len(images):
+            if shard is None:
+                count = min(shard_size, len(dataset) - shard_size * len(shards))
+                filename = f'shard_{len(shards):05d}.npy'
+                shard = np.lib.format.open_memmap(os.path.join(output_dir, f'{filename}.tmp'),
+                                                  mode='w+', dtype=np.uint8,
+                                                  shape=(count, 3, *input_size))
+                row = 0
+            taken = images[:len(shard) - row]
+            shard[row:row + len(taken)] = taken
+            row += len(taken)
+            images = images[len(taken):]
+            if row == len(shard):
+                shard.flush()
+                del shard
+                shard = None
+                path = os.path.join(output_dir, filename)
+                os.replace(f'{path}.tmp', path)
+                shards.append({'file': filename, 'count': row})
+
+    index = {
+        'input_size': list(input_size),
+        'shards': shards,
+        'labels': [int(label) for label in labels],
+        'image_paths': list(map(str, image_paths)),
+        'class_names': class_names
+    }
+    _write_json(os.path.join(output_dir, PACKED_INDEX), index)
+    return index
+
+
+def is_packed_dataset(path):
+    """Whether path is a directory written by pack_images"""
+    return isinstance(path, (str, os.PathLike)) and os.path.isfile(os.path.join(path, PACKED_INDEX))
+
+
+class PackedFoodDataset(IterableDataset):
+    """
+    Streams samples from the uint8 shards written by pack_images
+
+    Shards are read front to back through a memory map, so disk access is
+    sequential and only one shard per DataLoader worker is being read at a
+    time. With shuffle the shard order changes with set_epoch and samples are
+    drawn at random from a buffer of buffer_size decoded images, which mixes
+    samples across neighbouring shards; memory grows with buffer_size, not
+    with the dataset. Shards are split between torch.distributed ranks and
+    their DataLoader workers, so pack at least as many shards as ranks times
+    workers. shards restricts the dataset to those shard numbers (see
+    split_dataset). set_input_size resizes the packed images on the fly,
+    like FoodDataset.set_input_size, and augmentation is applied to
+    batches as for FoodDataset. The epoch is held in shared memory like the
+    input size, so it reaches fresh and persistent DataLoader workers alike.
+    """
+
+    def __init__(self, directory, shuffle=False, buffer_size=1024, transform=None, seed=0,
+                 shards=None, augmentation=None):
+        self.directory = directory
+        self.augmentation = augmentation
+        with open(os.path.join(directory, PACKED_INDEX)) as f:
+            index = json.load(f)
+        self.input_size = tuple(index['input_size'])
+        self.shards = []
+        offset = 0
+        for number, entry in enumerate(index['shards']):
+            if shards is None or number in shards:
+                self.shards.append(dict(entry, number=number,
+                                        labels=index['labels'][offset:offset + entry['count']],
+                                        image_paths=index['image_paths'][offset:offset + entry['count']]))
+            offset += entry['count']
+        self.labels = [label for entry in self.shards for label in entry['labels']]
+        self.image_paths = [path for entry in self.shards for path in entry['image_paths']]
+        self.class_names = index['class_names']
+        self.shuffle = shuffle
+        self.buffer_size = buffer_size
+        # Applied to float CHW images in [0, 1]
+        self.transform = transform or transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                                                           std=[0.229, 0.224, 0.225])
+        self.seed = seed
+        self._shared_epoch = torch.zeros((), dtype=torch.int64).share_memory_()
+        self._shared_size = torch.tensor(self.input_size).share_memory_()
+
+    def __len__(self):
+        return len(self.labels)
+
+    def set_input_size(self, input_size):
+        """Resize samples to input_size from the next one on, in all workers"""
+        self._shared_size.copy_(torch.tensor(input_size))
+
+    @property
+    def epoch(self):
+        return int(self._shared_epoch)
+
+    def set_epoch(self, epoch):
+        """Fix the epoch that seeds the shuffle of the following iterations, in all workers"""
+        self._shared_epoch.fill_(epoch)
+
+    def _read_shard(self, shard):
+        entry = self.shards[shard]
+        images = np.load(os.path.join(self.directory, entry['file']), mmap_mode='r')
+        for i in range(len(images)):
+            yield torch.from_numpy(np.array(images[i])), entry['labels'][i]
+
+    def _sample(self, image, label):
+        image = image.float().div_(255)
+        size = tuple(self._shared_size.tolist())
+        if size != tuple(image.shape[1:]):
+            image = F.interpolate(image[None], size=size, mode='bilinear', antialias=True,
+                                  align_corners=False)[0]
+        return self.transform(image), label
+
+    def __iter__(self):
+        info = get_worker_info()
+        worker, num_workers = (info.id, info.num_workers) if info is not None else (0, 1)
+        rank, world_size = _rank_and_world_size()
+        worker, num_workers = rank * num_workers + worker, world_size * num_workers
+        # Every worker of every rank draws the same shard order and takes its own slice of it
+        epoch = self.epoch
+        order = np.arange(len(self.shards))
+        if self.shuffle:
+            order = np.random.default_rng((self.seed, epoch)).permutation(order)
+        rng = np.random.default_rng((self.seed, epoch, worker))
+
+        buffer = []
+        for shard in order[worker::num_workers]:
+            for sample in self._read_shard(shard):
+                if not self.shuffle:
+                    yield self._sample(*sample)
+                elif len(buffer) < self.buffer_size:
+                    buffer.append(sample)
+                else:
+                    i = rng.integers(len(buffer))
+                    yield self._sample(*buffer[i])
+                    buffer[i] = sample
+        for i in rng.permutation(len(buffer)):
+            yield self._sample(*buffer[i])
+
+
+def open_dataset(source, labels=None, input_size=(224, 224), shuffle=False, augmentation=None):
+    """
+    Dataset for a pack_images directory or a list of image paths
+
+    Packed directories carry their own labels; unlabeled image paths get
+    label 0 (e.g. quantization calibration).
+    """
+    if is_packed_dataset(source):
+        return PackedFoodDataset(source, shuffle=shuffle, augmentation=augmentation)
+    if labels is None:
+        labels = [0] * len(source)
+    return FoodDataset(source, labels, input_size=input_size, augmentation=augmentation)
+
+
+def split_dataset(dataset, fraction, seed=0):
+    """
+    Split off a random validation part of about fraction of the samples
+
+    FoodDataset is split by sample, PackedFoodDataset by whole shards (so
+    both parts keep sequential reads); the validation part is never
+    shuffled or augmented. Returns (train, validation), validation None if
+    empty.
+    """
+    rng = np.random.default_rng(seed)
+    if isinstance(dataset, PackedFoodDataset):
+        numbers = [entry['number'] for entry in dataset.shards]
+        held_out = set(rng.permutation(numbers)[:int(round(fraction * len(numbers)))].tolist())
+        if not held_out:
+            return dataset, None
+        train = PackedFoodDataset(dataset.directory, dataset.shuffle, dataset.buffer_size,
+                                  dataset.transform, dataset.seed,
+                                  shards=[n for n in numbers if n not in held_out],
+                                  augmentation=dataset.augmentation)
+        return train, PackedFoodDataset(dataset.directory, transform=dataset.transform,
+                                        shards=held_out)
+
+    order = rng.permutation(len(dataset))
+    held_out = int(round(fraction * len(dataset)))
+    if held_out == 0:
+        return dataset, None
+
+    def subset(indices, augmentation=None):
+        return FoodDataset([dataset.image_paths[i] for i in indices],
+                           [dataset.labels[i] for i in indices],
+                           transform=dataset.transform, input_size=dataset.input_size,
+                           augmentation=augmentation)
+    return (subset(np.sort(order[held_out:]), dataset.augmentation),
+            subset(np.sort(order[:held_out])))
+
+
+def build_optimizer(parameters, learning_rate, config):
+    """Optimizer named by TRAINING_CONFIG['optimizer'] (adam, adamw or sgd)"""
+    name = config['optimizer']
+    if name == 'adam':
+        return torch.optim.Adam(parameters, lr=learning_rate, weight_decay=config['weight_decay'])
+    if name == 'adamw':
+        return torch.optim.AdamW(parameters, lr=learning_rate, weight_decay=config['weight_decay'])
+    if name == 'sgd':
+        return torch.optim.SGD(parameters, lr=learning_rate, momentum=0.9,
+                               weight_decay=config['weight_decay'])
+    raise ValueError(f"Unknown optimizer '{name}', choose from adam, adamw, sgd")
+
+
+def build_scheduler(optimizer, num_epochs, config):
+    """Per-epoch learning rate scheduler named by TRAINING_CONFIG['scheduler'], or None"""
+    name = config['scheduler']
+    if name is None:
+        return None
+    if name == 'step':
+        return torch.optim.lr_scheduler.StepLR(optimizer, step_size=config['scheduler_step_size'],
+                                               gamma=config['scheduler_gamma'])
+    if name == 'cosine':
+        return torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=num_epochs)
+    raise ValueError(f"Unknown scheduler '{name}', choose from step, cosine or None")
+
+
+def progressive_resizing_schedule(num_epochs, final_size, batch_size, start_size=128,
+                                  ramp_end=0.75, step=32):
+    """
+    Per-epoch [((height, width), batch size)] for progressive resizing
+
+    The shorter side grows linearly from start_size, rounded down to a
+    multiple of step, and reaches final_size in the last epoch of the
+    first ramp_end of the epochs; the remaining epochs stay at final_size. The aspect ratio of final_size
+    is kept and the batch size grows with the pixel count shrinking, so
+    every batch costs about as much as one of batch_size at final_size.
+    """
+    final_size = tuple(final_size)
+    final_side = min(final_size)
+    last_ramp_epoch = max(1, round(ramp_end * num_epochs)) - 1
+    schedule = []
+    for epoch in range(num_epochs):
+        progress = epoch / last_ramp_epoch if epoch < last_ramp_epoch else 1.0
+        side = start_size + (final_side - start_size) * progress
+        side = min(max(int(side) // step * step, min(start_size, final_side)), final_side)
+        size = tuple(max(1, round(dim * side / final_side)) for dim in final_size)
+        pixels = size[0] * size[1]
+        schedule.append((size, max(1, int(batch_size * final_size[0] * final_size[1] / pixels))))
+    return schedule
+
+
+def _autocast(config):
+    dtype = config['autocast_dtype']
+    return torch.autocast('cpu', dtype=getattr(torch, dtype or 'bfloat16'), enabled=dtype is not None)
+
+
+def _rank_and_world_size():
+    if dist.is_available() and dist.is_initialized():
+        return dist.get_rank(), dist.get_world_size()
+    return 0, 1
+
+
+def _sum_over_ranks(*values):
+    """Sum numbers over torch.distributed ranks; unchanged in a single process"""
+    if _rank_and_world_size()[1] == 1:
+        return values
+    totals = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(totals)
+    return tuple(totals.tolist())
+
+
+def available_memory():
+    """Bytes of memory available for new allocations (MemAvailable on Linux)"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB (0 where unsupported)"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _saved_tensor_bytes(model, images, config, stages=()):
+    """Bytes autograd keeps for backward in total and per stage (stages run in order)"""
+    storages = {}
+    current = [None]
+
+    def pack(tensor):
+        # Several operations often save the same tensor (e.g. a ReLU output and the next conv input)
+        storage = tensor.untyped_storage()
+        storages[storage.data_ptr()] = (storage.nbytes(), current[0])
+        return tensor
+
+    def enter(index):
+        return lambda module, inputs: current.__setitem__(0, index)
+
+    handles = []
+    for index, stage in enumerate(stages):
+        handles.append(stage[0].register_forward_pre_hook(enter(index)))
+        handles.append(stage[-1].register_forward_hook(lambda module, inputs, output: current.__setitem__(0, None)))
+    try:
+        with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor), _autocast(config):
+            model(images)
+    finally:
+        for handle in handles:
+            handle.remove()
+    per_stage = [sum(size for size, owner in storages.values() if owner == index)
+                 for index in range(len(stages))]
+    return sum(size for size, _ in storages.values()), per_stage
+
+
+def probe_batch_size(model, input_size, effective_batch_size, config=None, performance_config=None,
+                     ranks=1):
+    """
+    Largest training batch that fits the memory budget; return (batch size, accumulation steps)
+
+    The budget is PERFORMANCE_CONFIG['max_memory_usage'] of the available
+    memory, shared by ranks processes. Probe forward passes at batch 1 and
+    2 measure the activation memory autograd keeps per sample; with
+    activation checkpointing that is the stage inputs plus the largest
+    stage, which is recomputed in full during backward. Gradients and
+    optimizer state are sized from the parameters. The batch is capped at
+    effective_batch_size, and the accumulation steps are chosen so that
+    batch size x steps still covers it.
+    """
+    config = config if config is not None else TRAINING_CONFIG
+    performance_config = performance_config if performance_config is not None else PERFORMANCE_CONFIG
+    budget = performance_config['max_memory_usage'] * available_memory() / ranks
+
+    param_bytes = sum(param.numel() * param.element_size() for param in model.parameters())
+    # Gradients, plus two moments for Adam / AdamW or momentum for SGD
+    fixed = param_bytes * (3 if config['optimizer'] in ('adam', 'adamw') else 2)
+
+    # The probe passes must not leave batch-norm statistics from random inputs behind
+    buffers = {name: buffer.clone() for name, buffer in model.named_buffers()}
+    checkpointing = getattr(model, 'activation_checkpointing', False)
+    stages = backbone_stages(model.backbone) if checkpointing else []
+    memory_format = torch.channels_last if config['channels_last'] else torch.contiguous_format
+    model.train()
+    try:
+        probes = []
+        for size in (1, 2):
+            images = torch.randn(size, 3, *input_size).contiguous(memory_format=memory_format)
+            kept, _ = _saved_tensor_bytes(model, images, config)
+            recomputed = 0
+            if checkpointing:
+                model.activation_checkpointing = False
+                _, per_stage = _saved_tensor_bytes(model, images, config, stages)
+                model.activation_checkpointing = True
+                recomputed = max(per_stage)
+            probes.append(kept + recomputed)
+    finally:
+        model.activation_checkpointing = checkpointing
+        for name, buffer in model.named_buffers():
+            buffer.copy_(buffers[name])
+    per_sample = max(probes[1] - probes[0], 1)
+
+    # Headroom for activation gradients and allocator overhead during backward
+    batch_size = int((budget - fixed) // (1.25 * per_sample))
+    batch_size = max(1, min(batch_size, effective_batch_size))
+    return batch_size, math.ceil(effective_batch_size / batch_size)
+
+
+def evaluate_classifier(model, loader, config=None):
+    """
+    Return (mean cross-entropy loss, top-1 accuracy) of model over loader
+
+    Under torch.distributed each rank evaluates its share of the data and
+    the totals are summed over ranks.
+    """
+    config = config if config is not None else TRAINING_CONFIG
+    memory_format = torch.channels_last if config['channels_last'] else torch.contiguous_format
+    model.eval()
+    total_loss = 0.0
+    correct = 0
+    count = 0
+    with torch.inference_mode(), _autocast(config):
+        for images, labels in loader:
+            logits = model(images.contiguous(memory_format=memory_format)).float()
+            total_loss += F.cross_entropy(logits, labels, reduction='sum').item()
+            correct += (logits.argmax(dim=1) == labels).sum().item()
+            count += len(labels)
+    total_loss, correct, count = _sum_over_ranks(total_loss, correct, count)
+    return total_loss / max(count, 1), correct / max(count, 1)
+
+
+def train_classifier(model, train_loader, val_loader=None, num_epochs=10, learning_rate=1e-3,
+                     config=None, checkpoint_dir=None, resolution_schedule=None):
+    """
+    Mini-batch training of a FoodClassifier following TRAINING_CONFIG
+
+    Inputs and weights are channels_last, the forward pass optionally runs
+    under bfloat16 autocast and through torch.compile, and gradients are
+    accumulated over gradient_accumulation_steps batches (clipped to
+    gradient_clipping) before each optimizer step. Training stops once the
+    validation loss (training loss without val_loader) has not improved for
+    early_stopping_patience epochs, and the best weights are restored.
+
+    With checkpoint_dir, model, optimizer, scheduler and early-stopping
+    state are checkpointed after every epoch by a CheckpointWriter, and
+    with config['resume'] training continues from the newest checkpoint.
+
+    resolution_schedule is a per-epoch list of (input size, batch size),
+    see progressive_resizing_schedule. Each epoch then calls
+    set_input_size on the training dataset and sets the batch size of the
+    loader's batch sampler, so the DataLoader and its persistent workers
+    are reused across resolutions.
+
+    model may be a DistributedDataParallel wrapper (see
+    distributed_training): losses, images/s and peak RSS are then totals
+    over all ranks and only rank 0 logs and writes checkpoints. With a sampler every
+    rank gets the same number of batches and gradients are only all-reduced
+    on the last batch of each accumulation window; iterable datasets may
+    leave ranks with different numbers of batches, which DDP's join()
+    absorbs, and then every batch is all-reduced.
+    Returns one dict per epoch with losses, accuracy, images/s, seconds and
+    the process's peak RSS so far.
+    """
+    config = config if config is not None else TRAINING_CONFIG
+    distributed = isinstance(model, DistributedDataParallel)
+    module = model.module if distributed else model
+    memory_format = torch.channels_last if config['channels_last'] else torch.contiguous_format
+    module.to(memory_format=memory_format)
+    optimizer = build_optimizer(model.parameters(), learning_rate, config)
+    scheduler = build_scheduler(optimizer, num_epochs, config)
+    forward = torch.compile(model) if config['compile'] else model
+    # Evaluation runs outside DDP, whose forward pass expects every rank to take part
+    evaluate = module if distributed else forward
+    accumulation = max(1, config['gradient_accumulation_steps'])
+    # join() cannot shadow the skipped all-reduces of no_sync for ranks that ran out early
+    skip_sync = distributed and not isinstance(train_loader.dataset, IterableDataset)
+    main_process = _rank_and_world_size()[0] == 0
+
+    history = []
+    best_loss = float('inf')
+    best_state = None
+    stale_epochs = 0
+    start_epoch = 0
+    writer = None
+    if checkpoint_dir is not None:
+        path = latest_checkpoint(checkpoint_dir) if config['resume'] else None
+        if path is not None:
+            state = load_mmap(path)
+            module.load_state_dict(state['model'])
+            optimizer.load_state_dict(state['optimizer'])
+            if scheduler is not None and state['scheduler'] is not None:
+                scheduler.load_state_dict(state['scheduler'])
+            start_epoch = state['epoch']
+            history = state['history']
+            best_loss = state['best_loss']
+            stale_epochs = state['stale_epochs']
+            # Only stored while the best weights differ from the current ones
+            best_state = state['best_model'] or copy.deepcopy(module.state_dict())
+            if main_process:
+                print(f"Resuming from {path} after epoch {start_epoch}")
+        if main_process:
+            writer = CheckpointWriter(checkpoint_dir, config['keep_checkpoints'])
+
+    try:
+        for epoch in range(start_epoch, num_epochs):
+            if stale_epochs >= config['early_stopping_patience']:
+                if main_process:
+                    print(f"Early stopping: no improvement for {stale_epochs} epochs")
+                break
+            # Samplers and iterable datasets (PackedFoodDataset) reshuffle per epoch,
+            # also when resuming
+            sampler = getattr(train_loader, 'sampler', None)
+            if hasattr(sampler, 'set_epoch'):
+                sampler.set_epoch(epoch)
+            if hasattr(train_loader.dataset, 'set_epoch'):
+                train_loader.dataset.set_epoch(epoch)
+            if resolution_schedule is not None:
+                input_size, batch_size = resolution_schedule[epoch]
+                train_loader.dataset.set_input_size(input_size)
+                if train_loader.batch_sampler is not None:
+                    train_loader.batch_sampler.batch_size = batch_size
+            model.train()
+            start = time.perf_counter()
+            total_loss = 0.0
+            seen = 0
+            optimizer.zero_grad(set_to_none=True)
+            with model.join() if distributed else nullcontext():
+                for step, ((images, labels), last) in enumerate(_flag_last(train_loader), 1):
+                    # The last batch also closes a partial accumulation window
+                    sync = step % accumulation == 0 or last
+                    with model.no_sync() if skip_sync and not sync else nullcontext():
+                        with _autocast(config):
+                            loss = F.cross_entropy(
+                                forward(images.contiguous(memory_format=memory_format)).float(), labels)
+                        (loss / accumulation).backward()
+                    if sync:
+                        _optimizer_step(model, optimizer, config)
+                    total_loss += loss.item() * len(images)
+                    seen += len(images)
+            if scheduler is not None:
+                scheduler.step()
+            seconds = time.perf_counter() - start
+            total_loss, seen, peak_rss = _sum_over_ranks(total_loss, seen, peak_rss_mb())
+
+            record = {'epoch': epoch + 1, 'loss': total_loss / max(seen, 1),
+                      'images_per_second': seen / seconds, 'seconds': seconds,
+                      'peak_rss_mb': peak_rss}
+            message = f"Epoch {epoch + 1}/{num_epochs}, Loss: {record['loss']:.4f}"
+            if resolution_schedule is not None:
+                record['input_size'] = input_size
+                message = (f"Epoch {epoch + 1}/{num_epochs} at {input_size[0]}x{input_size[1]}, "
+                           f"batch {batch_size}, Loss: {record['loss']:.4f}")
+            if val_loader is not None:
+                record['val_loss'], record['val_accuracy'] = evaluate_classifier(evaluate, val_loader, config)
+                message += f", Val loss: {record['val_loss']:.4f}, Val acc: {record['val_accuracy']:.4f}"
+            if main_process:
+                print(f"{message}, {record['images_per_second']:.1f} images/s, {seconds:.1f}s, "
+                      f"peak RSS {peak_rss:.0f}MB")
+            history.append(record)
+
+            monitored = record.get('val_loss', record['loss'])
+            if monitored < best_loss:
+                best_loss = monitored
+                best_state = copy.deepcopy(module.state_dict())
+                stale_epochs = 0
+            else:
+                stale_epochs += 1
+
+            if writer is not None:
+                writer.save({
+                    'model': module.state_dict(),
+                    'optimizer': optimizer.state_dict(),
+                    'scheduler': scheduler.state_dict() if scheduler is not None else None,
+                    'epoch': epoch + 1,
+                    'history': history,
+                    'best_loss': best_loss,
+                    'stale_epochs': stale_epochs,
+                    'best_model': best_state if stale_epochs else None
+                }, epoch + 1)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if best_state is not None:
+        module.load_state_dict(best_state)
+    model.eval()
+    return history
+
+
+def _flag_last(iterable):
+    """Yield (item, whether it is the last item)"""
+    iterator = iter(iterable)
+    try:
+        item = next(iterator)
+    except StopIteration:
+        return
+    for following in iterator:
+        yield item, False
+        item = following
+    yield item, True
+
+
+def _optimizer_step(model, optimizer, config):
+    if config['gradient_clipping']:
+        torch.nn.utils.clip_grad_norm_(model.parameters(), config['gradient_clipping'])
+    optimizer.step()
+    optimizer.zero_grad(set_to_none=True)
+
+
+def _take_classifier(model, attribute, index=None):
+    """Replace a torchvision classifier with Identity; return its input features"""
+    classifier = getattr(model, attribute)
+    layer = classifier if index is None else classifier[index]
+    setattr(model, attribute, nn.Identity())
+    return layer.in_features
+
+
+# architecture -> (torchvision builder, classifier attribute, index of its
+# first Linear layer); the classifier is cut off and replaced by our head
+BACKBONES = {
+    'resnet18': (models.resnet18, 'fc', None),
+    'resnet34': (models.resnet34, 'fc', None),
+    'resnet50': (models.resnet50, 'fc', None),
+    'resnet101': (models.resnet101, 'fc', None),
+    'mobilenet_v3_small': (models.mobilenet_v3_small, 'classifier', 0),
+    'mobilenet_v3_large': (models.mobilenet_v3_large, 'classifier', 0),
+    'efficientnet_b0': (models.efficientnet_b0, 'classifier', 1),
+    'efficientnet_b1': (models.efficientnet_b1, 'classifier', 1)
+}
+
+
+def build_backbone(architecture, pretrained=True):
+    """Return (feature extractor, feature dimension) for a registered architecture"""
+    if architecture not in BACKBONES:
+        raise ValueError(f"Unknown architecture '{architecture}', "
+                         f"choose from {', '.join(BACKBONES)}")
+    builder, attribute, index = BACKBONES[architecture]
+    model = builder(weights='DEFAULT' if pretrained else None)
+    return model, _take_classifier(model, attribute, index)
+
+
+def backbone_stages(backbone, segments=4):
+    """
+    The stages checkpointed_features recomputes, as nn.Sequential blocks
+
+    ResNet stages layer1-4, or segments equal chunks of a MobileNet /
+    EfficientNet feature stack.
+    """
+    if hasattr(backbone, 'layer1'):
+        return [backbone.layer1, backbone.layer2, backbone.layer3, backbone.layer4]
+    blocks = list(backbone.features)
+    size = math.ceil(len(blocks) / segments)
+    return [nn.Sequential(*blocks[start:start + size]) for start in range(0, len(blocks), size)]
+
+
+def checkpointed_features(backbone, x):
+    """
+    Backbone features with activations recomputed during backward
+
+    Only the input of each of backbone_stages is kept for backward;
+    everything inside a stage is recomputed, one stage at a time. Batch-norm
+    running statistics are updated again by the recomputation.
+    """
+    if hasattr(backbone, 'layer1'):
+        x = backbone.maxpool(backbone.relu(backbone.bn1(backbone.conv1(x))))
+    for stage in backbone_stages(backbone):
+        x = checkpoint(stage, x, use_reentrant=False)
+    return torch.flatten(backbone.avgpool(x), 1)
+
+
+class FoodClassifier(nn.Module):
+    """
+    Food classifier on a configurable torchvision backbone
+
+    With activation_checkpointing set, training forward passes keep only
+    the backbone stage boundaries for backward (checkpointed_features),
+    trading about one extra backbone forward pass for much less memory.
+    """
+
+    def __init__(self, num_classes, pretrained=True, architecture='resnet101', dropout_rate=0.5):
+        super(FoodClassifier, self).__init__()
+        self.architecture = architecture
+
+        # Pre-trained feature extractor without its ImageNet classifier
+        self.backbone, num_features = build_backbone(architecture, pretrained)
+
+        # Classification head sized to the backbone's features
+        self.head = nn.Sequential(
+            nn.Dropout(dropout_rate),
+            nn.Linear(num_features, 512),
+            nn.ReLU(),
+            nn.Dropout(0.3),
+            nn.Linear(512, num_classes)
+        )
+        self.activation_checkpointing = False
+
+    def forward(self, x):
+        if self.activation_checkpointing and self.training and torch.is_grad_enabled():
+            return self.head(checkpointed_features(self.backbone, x))
+        return self.head(self.backbone(x))
+
+
+def quantize_classifier(model, calibration_loader, num_batches=8, backend='x86'):
+    """
+    Return an int8 copy of a FoodClassifier for CPU inference
+
+    The backbone is statically quantized: activation ranges are observed on
+    num_batches (image, label) batches from calibration_loader. The Linear
+    head is quantized dynamically, with activation scales computed per batch.
+    """
+    from torch.ao.quantization import default_dynamic_qconfig, get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = backend
+    qconfig_mapping = get_default_qconfig_mapping(backend).set_module_name(
+        'head', default_dynamic_qconfig
+    )
+
+    model = copy.deepcopy(model).eval()
+    batches = iter(calibration_loader)
+    first_images, _ = next(batches)
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(first_images,))
+
+    with torch.inference_mode():
+        prepared(first_images)
+        for _, (images, _) in zip(range(num_batches - 1), batches):
+            prepared(images)
+    return convert_fx(prepared)
+
+
+# TorchScript artifacts store the class of each output index in this extra file
+CLASS_NAMES_FILE = 'class_names.json'
+
+
+def save_quantized_classifier(quantized, path, input_size=(224, 224), class_names=None):
+    """
+    Save a quantize_classifier model as a frozen TorchScript artifact
+
+    The result loads with load_inference_model; load_serving_model serves
+    it when MODEL_CONFIG['quantization'] is 'int8'.
+    """
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(quantized, torch.randn(1, 3, *input_size)))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    frozen.save(f'{path}.tmp', _extra_files={CLASS_NAMES_FILE: json.dumps(list(class_names or []))})
+    os.replace(f'{path}.tmp', path)
+    return frozen
+
+
+class _ChannelsLast(nn.Module):
+    """Converts input batches to the layout of the exported weights"""
+
+    def forward(self, x):
+        return x.contiguous(memory_format=torch.channels_last)
+
+
+def optimize_for_export(model):
+    """
+    Return an inference-only copy of a FoodClassifier
+
+    Batch norm is folded into the preceding convolutions, dropout layers are
+    removed and weights and inputs use the channels_last layout.
+    """
+    from torch.fx.experimental.optimization import fuse, remove_dropout
+
+    model = remove_dropout(fuse(copy.deepcopy(model).eval()))
+    return nn.Sequential(_ChannelsLast(), model).to(memory_format=torch.channels_last).eval()
+
+
+def export_classifier(model, path, onnx_path=None, input_size=(224, 224), class_names=None):
+    """
+    Save a frozen TorchScript artifact of a FoodClassifier at path
+
+    With onnx_path the same optimized graph is also exported for ONNX
+    Runtime, which needs the onnx package. class_names is stored with both
+    artifacts and comes back as the loaded model's class_names.
+    """
+    optimized = optimize_for_export(model)
+    example = torch.randn(1, 3, *input_size)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(optimized, example))
+    frozen.save(path, _extra_files={CLASS_NAMES_FILE: json.dumps(list(class_names or []))})
+
+    if onnx_path:
+        try:
+            import onnx  # noqa: F401  (required by the exporter)
+        except ImportError:
+            raise ImportError("ONNX export needs the onnx package: pip install onnx")
+        torch.onnx.export(
+            optimized, (example,), onnx_path,
+            input_names=['images'], output_names=['logits'],
+            dynamic_axes={'images': {0: 'batch'}, 'logits': {0: 'batch'}}
+        )
+        exported = onnx.load(onnx_path)
+        onnx.helper.set_model_props(exported, {'class_names': json.dumps(list(class_names or []))})
+        onnx.save(exported, onnx_path)
+    return frozen
+
+
+class OnnxClassifier:
+    """
+    Exported FoodClassifier run by ONNX Runtime on CPU
+
+    Takes and returns torch tensors so it can stand in for the torch model.
+    """
+
+    def __init__(self, path):
+        import onnxruntime
+
+        self.session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.class_names = json.loads(metadata.get('class_names', '[]'))
+
+    def eval(self):
+        return self
+
+    def __call__(self, images):
+        logits = self.session.run(None, {'images': images.contiguous().numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+def load_inference_model(path):
+    """Load an artifact written by export_classifier (.pt or .onnx)"""
+    if path.endswith('.onnx'):
+        return OnnxClassifier(path)
+    extra_files = {CLASS_NAMES_FILE: ''}
+    model = torch.jit.load(path, map_location='cpu', _extra_files=extra_files).eval()
+    # Backend-specific rewrites (e.g. prepacked oneDNN convolutions) cannot be
+    # serialized, so they are applied after loading
+    model = torch.jit.optimize_for_inference(model)
+    model.class_names = json.loads(extra_files[CLASS_NAMES_FILE] or '[]')
+    return model
+
+
+def find_inference_artifact(model_config):
+    """Return the exported artifact selected by MODEL_CONFIG if it exists, else None"""
+    if model_config['inference_runtime'] == 'onnx':
+        path = model_config['onnx_path']
+    else:
+        path = model_config['optimized_path']
+    return path if path and os.path.exists(path) else None
+
+
+def needs_escalation(probabilities, confidence_threshold, margin_threshold):
+    """Mask of images whose top-1 probability or top-1/top-2 margin is too low"""
+    top2 = probabilities.topk(2, dim=1).values
+    return (top2[:, 0] < confidence_threshold) | (top2[:, 0] - top2[:, 1] < margin_threshold)
+
+
+class CascadeClassifier:
+    """
+    Cheap-model-first classifier escalating uncertain images to the full model
+
+    Every batch goes through fast_model; only images flagged by
+    needs_escalation are classified again by full_model. Calling the cascade
+    returns log-probabilities, so softmax and argmax over its output behave
+    as for a plain model's logits.
+    """
+
+    def __init__(self, fast_model, full_model, confidence_threshold=0.8, margin_threshold=0.2):
+        self.fast_model = fast_model
+        self.full_model = full_model
+        self.confidence_threshold = confidence_threshold
+        self.margin_threshold = margin_threshold
+        self.images = 0
+        self.escalations = 0
+
+    @classmethod
+    def from_config(cls, fast_model, full_model, model_config):
+        """Build a cascade with the thresholds in MODEL_CONFIG"""
+        return cls(fast_model, full_model,
+                   confidence_threshold=model_config['cascade_confidence_threshold'],
+                   margin_threshold=model_config['cascade_margin_threshold'])
+
+    def eval(self):
+        self.fast_model.eval()
+        self.full_model.eval()
+        return self
+
+    def classify(self, images):
+        """Return (probabilities, escalated mask) for a batch of images"""
+        with torch.inference_mode():
+            probabilities = torch.softmax(self.fast_model(images), dim=1)
+            escalated = needs_escalation(probabilities, self.confidence_threshold,
+                                         self.margin_threshold)
+            if escalated.any():
+                probabilities[escalated] = torch.softmax(self.full_model(images[escalated]), dim=1)
+
+        count = int(escalated.sum())
+        self.images += len(images)
+        self.escalations += count
+        METRICS.inc('nutrivision_cascade_images_total', value=len(images))
+        METRICS.inc('nutrivision_cascade_escalations_total', value=count)
+        return probabilities, escalated
+
+    def __call__(self, images):
+        probabilities, _ = self.classify(images)
+        return probabilities.clamp_min(1e-12).log()
+
+    def escalation_rate(self):
+        return self.escalations / self.images if self.images else 0.0
+
+
+def load_mmap(path):
+    """torch.load a checkpoint with its tensors memory-mapped from the file"""
+    return torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+
+
+def restore_classifier(num_classes, architecture, state_dict):
+    """
+    FoodClassifier that uses the tensors of state_dict as its weights
+
+    The model is built on the meta device, so no memory is allocated or
+    randomly initialized, and the (memory-mapped) tensors are assigned
+    rather than copied: worker processes loading the same file share its
+    pages through the OS page cache.
+    """
+    with torch.device('meta'):
+        model = FoodClassifier(num_classes, pretrained=False, architecture=architecture)
+    model.load_state_dict(state_dict, assign=True)
+    return model.eval()
+
+
+def atomic_save(obj, path):
+    """torch.save to a temporary file renamed over path, so readers never see a partial file"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    torch.save(obj, f'{path}.tmp')
+    os.replace(f'{path}.tmp', path)
+
+
+def load_classifier(num_classes, architecture, weights_path, allow_untrained=False):
+    """
+    Build a FoodClassifier around the weights at weights_path
+
+    A checkpoint written by save_checkpoint brings its own architecture,
+    class count and class names (as model.class_names); a bare state dict
+    uses num_classes and architecture and has no class names. A missing
+    file raises FileNotFoundError, or with allow_untrained (offline tools
+    only) gives a randomly initialized model.
+    """
+    if os.path.exists(weights_path):
+        saved = load_mmap(weights_path)
+        if 'state_dict' not in saved:
+            return restore_classifier(num_classes, architecture, saved)
+        model = restore_classifier(saved['num_classes'], saved['architecture'], saved['state_dict'])
+        model.class_names = list(saved['class_names'])
+        return model
+    if not allow_untrained:
+        raise FileNotFoundError(f"Model weights {weights_path} not found; train the model and "
+                                f"save it with NutritionDetectionSystem.save_model")
+    print(f"Warning: {weights_path} not found, using an untrained {architecture}")
+    return FoodClassifier(num_classes, pretrained=False, architecture=architecture).eval()
+
+
+def load_cascade(full_model, num_classes, model_config):
+    """Wrap full_model in a cascade behind the fast model named by MODEL_CONFIG"""
+    fast_model = load_classifier(num_classes, model_config['cascade_fast_architecture'],
+                                 model_config['cascade_fast_weights_path'])
+    class_names = getattr(full_model, 'class_names', [])
+    fast_names = getattr(fast_model, 'class_names', [])
+    if class_names and fast_names and fast_names != class_names:
+        raise ValueError("The cascade's fast and full models were trained on different classes")
+    cascade = CascadeClassifier.from_config(fast_model, full_model, model_config)
+    cascade.class_names = class_names or fast_names
+    return cascade
+
+
+def load_serving_model(num_classes, model_config, weights_path=None):
+    """
+    The model that answers classification requests, as selected by MODEL_CONFIG
+
+    With quantization 'int8' this is the artifact at quantized_path
+    (written by save_quantized_classifier, which needs calibration images,
+    so it is never created here); otherwise the exported artifact if there
+    is one, else a FoodClassifier with the weights at weights_path
+    (default MODEL_CONFIG['weights_path']). With cascade the model is put
+    behind the fast model. The model's class_names attribute names the
+    class of each output index, as saved with the weights (empty when they
+    carry none). Missing weights or artifacts raise FileNotFoundError: an
+    untrained model is never served.
+    """
+    if model_config['quantization'] == 'int8':
+        path = model_config['quantized_path']
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"MODEL_CONFIG['quantization'] is 'int8' but {path} does not exist; "
+                                    f"create it with NutritionDetectionSystem.prepare_inference_model")
+        torch.backends.quantized.engine = model_config['quantization_backend']
+        model = load_inference_model(path)
+    else:
+        artifact = find_inference_artifact(model_config)
+        if artifact is not None:
+            model = load_inference_model(artifact)
+        else:
+            model = load_classifier(num_classes, model_config['architecture'],
+                                    weights_path or model_config['weights_path'])
+    if model_config['cascade']:
+        # Easy images are answered by the small model alone
+        model = load_cascade(model, num_classes, model_config)
+    return model
+
+
+def save_checkpoint(model, path, class_names=None):
+    """Save a FoodClassifier with the architecture and classes needed to rebuild it"""
+    atomic_save({
+        'architecture': model.architecture,
+        'num_classes': model.head[-1].out_features,
+        'class_names': list(class_names or []),
+        'state_dict': model.state_dict()
+    }, path)
+
+
+def load_checkpoint(path):
+    """Rebuild a FoodClassifier saved by save_checkpoint; return (model, class names)"""
+    checkpoint = load_mmap(path)
+    model = restore_classifier(checkpoint['num_classes'], checkpoint['architecture'],
+                               checkpoint['state_dict'])
+    return model, checkpoint['class_names']
+
+
+def _snapshot(value):
+    # Training keeps updating parameters and optimizer state in place
+    if isinstance(value, torch.Tensor):
+        return value.detach().clone()
+    if isinstance(value, dict):
+        return {key: _snapshot(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_snapshot(item) for item in value)
+    return value
+
+
+def latest_checkpoint(directory):
+    """Path of the newest training checkpoint in directory, or None"""
+    paths = sorted(glob.glob(os.path.join(directory, 'checkpoint_*.pth')))
+    return paths[-1] if paths else None
+
+
+class CheckpointWriter:
+    """
+    Writes training checkpoints from a background thread
+
+    save() snapshots the state in the calling thread and returns while the
+    file is written; at most one snapshot waits behind the one being
+    written, so a slow disk blocks training instead of piling up copies.
+    Files are written under a temporary name and renamed into place, and
+    only the newest keep_last checkpoint_<epoch>.pth files are kept. A
+    failed write is raised by the next save() or by close().
+    """
+
+    def __init__(self, directory, keep_last=3):
+        self.directory = directory
+        self.keep_last = keep_last
+        self._queue = queue.Queue(maxsize=1)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+
+    def save(self, state, epoch):
+        """Queue state for writing as checkpoint_<epoch>.pth"""
+        self._raise_error()
+        self._queue.put((_snapshot(state), epoch))
+
+    def close(self):
+        """Wait for pending writes and stop the thread"""
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            state, epoch = item
+            try:
+                atomic_save(state, os.path.join(self.directory, f'checkpoint_{epoch:04d}.pth'))
+                paths = sorted(glob.glob(os.path.join(self.directory, 'checkpoint_*.pth')))
+                for path in paths[:max(len(paths) - self.keep_last, 0)]:
+                    os.remove(path)
+            except Exception as e:
+                self._error = e
+
+
+class IndexedDataset(Dataset):
+    """Wraps a dataset so each sample also carries its index"""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        image, label = self.dataset[idx]
+        return image, label, idx
+
+
+def _weights_digest(module):
+    digest = hashlib.blake2b(digest_size=16)
+    for name, tensor in module.state_dict().items():
+        digest.update(name.encode('utf-8'))
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _samples_digest(dataset):
+    samples = json.dumps([list(map(str, dataset.image_paths)), [int(label) for label in dataset.labels]])
+    return hashlib.blake2b(samples.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def cache_teacher_logits(teacher, dataset, path, batch_size=32):
+    """
+    Return the teacher's logits for every sample of a FoodDataset
+
+    The logits are computed once and stored at path (.npy) with a
+    fingerprint of the teacher weights and the dataset's paths and labels in
+    path + '.json'; later calls with the same teacher and data memory-map the
+    stored array instead of running the teacher again.
+    """
+    fingerprint = {
+        'teacher': _weights_digest(teacher),
+        'samples': _samples_digest(dataset),
+        'count': len(dataset)
+    }
+    meta_path = f'{path}.json'
+    if _read_json(meta_path) == fingerprint and os.path.exists(path):
+        return np.load(path, mmap_mode='r')
+
+    teacher.eval()
+    logits = []
+    with torch.inference_mode():
+        for images, _ in create_data_loader(dataset, batch_size):
+            logits.append(teacher(images).float().numpy())
+    logits = np.concatenate(logits)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f'{path}.tmp', 'wb') as f:
+        np.save(f, logits)
+    os.replace(f'{path}.tmp', path)
+    _write_json(meta_path, fingerprint)
+    return logits
+
+
+def distillation_loss(student_logits, teacher_logits, labels, temperature=4.0, alpha=0.7):
+    """Mix of softened teacher KL divergence (weight alpha) and hard-label cross-entropy"""
+    soft_targets = F.softmax(teacher_logits / temperature, dim=1)
+    kd = F.kl_div(F.log_softmax(student_logits / temperature, dim=1), soft_targets,
+                  reduction='batchmean') * temperature ** 2
+    return alpha * kd + (1 - alpha) * F.cross_entropy(student_logits, labels)
+
+
+def distill_student(student, dataset, teacher_logits, num_epochs=10, temperature=4.0,
+                    alpha=0.7, learning_rate=1e-3, batch_size=32):
+    """Train student against cached teacher logits; return the mean loss per epoch"""
+    loader = create_data_loader(IndexedDataset(dataset), batch_size, shuffle=True)
+    optimizer = torch.optim.Adam(student.parameters(), lr=learning_rate)
+    history = []
+    for epoch in range(num_epochs):
+        student.train()
+        total = 0.0
+        for images, labels, indices in loader:
+            targets = torch.from_numpy(np.asarray(teacher_logits[indices.numpy()]))
+            loss = distillation_loss(student(images), targets, labels, temperature, alpha)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(images)
+        history.append(total / len(dataset))
+        print(f"Distillation epoch {epoch + 1}/{num_epochs}, loss: {history[-1]:.4f}")
+    return history
+
+
+def cache_backbone_features(backbone, dataset, path, batch_size=64):
+    """
+    Return a FeatureDataset of backbone features for every sample of a FoodDataset
+
+    The backbone runs once and its penultimate-layer features are written to
+    a float16 .npy memmap at path; path + '.json' is the index, holding the
+    image paths, labels and a fingerprint of the backbone weights, the
+    dataset transform and the samples. A changed fingerprint re-extracts the
+    features automatically.
+    """
+    fingerprint = {
+        'backbone': _weights_digest(backbone),
+        'transform': repr(dataset.transform),
+        'samples': _samples_digest(dataset)
+    }
+    index_path = f'{path}.json'
+    index = _read_json(index_path)
+    if index is not None and index['fingerprint'] == fingerprint and os.path.exists(path):
+        return FeatureDataset(path)
+
+    if len(dataset) == 0:
+        raise ValueError("Cannot cache backbone features of an empty dataset")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    backbone.eval()
+    features = None
+    row = 0
+    fp16_max = float(np.finfo(np.float16).max)
+    with torch.inference_mode():
+        for images, _ in create_data_loader(dataset, batch_size):
+            batch = backbone(images).flatten(1).float().numpy()
+            if np.abs(batch).max() > fp16_max:
+                # Trained backbones stay far below this; clamp rather than store inf
+                print("Warning: backbone features exceed the float16 range and were clamped")
+                batch = np.clip(batch, -fp16_max, fp16_max)
+            if features is None:
+                features = np.lib.format.open_memmap(f'{path}.tmp', mode='w+', dtype=np.float16,
+                                                     shape=(len(dataset), batch.shape[1]))
+            features[row:row + len(batch)] = batch
+            row += len(batch)
+    features.flush()
+    del features
+    os.replace(f'{path}.tmp', path)
+
+    _write_json(index_path, {
+        'fingerprint': fingerprint,
+        'image_paths': list(map(str, dataset.image_paths)),
+        'labels': [int(label) for label in dataset.labels]
+    })
+    return FeatureDataset(path)
+
+
+class FeatureDataset(Dataset):
+    """
+    Cached backbone features and labels, read from the float16 memmap
+    """
+
+    def __init__(self, path):
+        self.features = np.load(path, mmap_mode='r')
+        with open(f'{path}.json') as f:
+            index = json.load(f)
+        self.image_paths = index['image_paths']
+        self.labels = torch.tensor(index['labels'])
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        return torch.from_numpy(self.features[idx].astype(np.float32)), self.labels[idx]
+
+    def batches(self, batch_size, shuffle=True):
+        """Yield (features, labels) batches straight from the memmap"""
+        order = np.random.permutation(len(self)) if shuffle else np.arange(len(self))
+        for start in range(0, len(order), batch_size):
+            # Sorted indices keep reads from the memmap sequential
+            indices = np.sort(order[start:start + batch_size])
+            yield (torch.from_numpy(self.features[indices].astype(np.float32)),
+                   self.labels[indices])
+
+
+def train_head(head, features, num_epochs=10, learning_rate=1e-3, batch_size=256):
+    """Train a classification head on a FeatureDataset; return the mean loss per epoch"""
+    optimizer = torch.optim.Adam(head.parameters(), lr=learning_rate)
+    history = []
+    for epoch in range(num_epochs):
+        head.train()
+        total = 0.0
+        for inputs, labels in features.batches(batch_size):
+            loss = F.cross_entropy(head(inputs), labels)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(inputs)
+        history.append(total / len(features))
+        print(f"Head epoch {epoch + 1}/{num_epochs}, loss: {history[-1]:.4f}")
+    return history
@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration for the NutriVision AI web interface
+"""
+
+import gc
+import glob
+import os
+
+# Import app.py (and the shared nutrition table) once in the master so
+# workers inherit it copy-on-write instead of each building their own
+preload_app = True
+
+# Workers publish metric snapshots here so /metrics reports the sum over
+# all of them; snapshots of a previous server run are dropped at startup
+_metrics_dir = os.environ.setdefault('METRICS_MULTIPROC_DIR', './temp/metrics')
+os.makedirs(_metrics_dir, exist_ok=True)
+for _path in glob.glob(os.path.join(_metrics_dir, '*.json')):
+    os.remove(_path)
+
+
+def pre_fork(server, worker):
+    """Move preloaded objects out of the GC generations before forking"""
+    # Collector passes write to object headers, which would otherwise
+    # un-share the preloaded pages in every worker
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Start per-worker background services"""
+    from app import UPLOAD_JANITOR
+
+    # Threads do not survive fork, so each worker starts its own janitor;
+    # they take turns through the janitor's lock file
+    UPLOAD_JANITOR.start()
+
+
+def worker_exit(server, worker):
+    """Publish the final metric values of an exiting worker"""
+    from metrics import METRICS
+
+    METRICS.flush(force=True)
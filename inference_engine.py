@@ -0,0 +1,206 @@
+"""
+Dynamic micro-batching inference for FoodClassifier
+
+Concurrent requests in one web worker (threaded dev server or gunicorn's
+gthread workers) each submit a single preprocessed image. A batcher thread
+collects them until either max_batch_size images are waiting or the oldest
+has waited max_wait_ms, runs one batched forward pass and hands each caller
+its own row of class probabilities.
+
+torch is only imported once the engine actually starts, so the web app can
+run without it while model serving is disabled.
+"""
+
+import io
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from job_queue import QueueFull
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Seekable read-only file over a bytes-like object
+
+    io.BytesIO copies a memoryview it is given; this reads straight from
+    the buffer, so an upload held as a view of the request body is never
+    copied as a whole.
+    """
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast('B')
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+
+def decode_image(image_data, input_size=(224, 224)):
+    """Decode image bytes (or a memoryview of them) into a normalized 3 x H x W float tensor"""
+    from PIL import Image
+    from torchvision.transforms import functional as F
+
+    image = Image.open(BufferReader(image_data))
+    # Let JPEG decode at a reduced scale when the source is much larger
+    image.draft('RGB', input_size[::-1])
+    image = image.convert('RGB').resize(input_size[::-1], Image.BILINEAR)
+    return F.normalize(F.to_tensor(image), IMAGENET_MEAN, IMAGENET_STD)
+
+
+class _Request:
+    __slots__ = ('tensor', 'future', 'enqueued')
+
+    def __init__(self, tensor):
+        self.tensor = tensor
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class BatchingInferenceEngine:
+    """
+    Collects single-image requests into batched forward passes
+    """
+
+    def __init__(self, model_factory, max_batch_size=8, max_wait_ms=10, max_queue_depth=64):
+        self.model_factory = model_factory
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_depth = max_queue_depth
+        # The model loaded by model_factory in this process, once started
+        self.model = None
+
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.batches = 0
+        self.images = 0
+        self.batch_size_counts = [0] * (self.max_batch_size + 1)
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    def _ensure_started(self):
+        # Threads do not survive fork: start one batcher per process
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue_depth)
+                self._reset_stats()
+                ready = Future()
+                self._thread = threading.Thread(target=self._run, args=(ready,),
+                                                name='inference-batcher', daemon=True)
+                self._thread.start()
+                # Surface model loading errors to the caller; the next
+                # request retries
+                ready.result()
+                self._pid = os.getpid()
+
+    def submit(self, tensor):
+        """Queue one preprocessed image; return a Future of its probabilities"""
+        self._ensure_started()
+        request = _Request(tensor)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            raise QueueFull(f"Inference queue is full ({self.max_queue_depth} images waiting)")
+        return request.future
+
+    def infer(self, tensor, timeout=None):
+        """Classify one preprocessed image and return its probability vector"""
+        return self.submit(tensor).result(timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or timed out"""
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Drain anything that is already waiting without blocking
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, ready):
+        import torch
+
+        try:
+            model = self.model_factory()
+            model.eval()
+        except Exception as e:
+            ready.set_exception(e)
+            return
+        self.model = model
+        ready.set_result(True)
+
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            for request in batch:
+                wait = started - request.enqueued
+                self.queue_wait_total += wait
+                self.queue_wait_max = max(self.queue_wait_max, wait)
+            self.batches += 1
+            self.images += len(batch)
+            self.batch_size_counts[len(batch)] += 1
+
+            try:
+                with torch.inference_mode():
+                    probabilities = torch.softmax(
+                        model(torch.stack([request.tensor for request in batch])), dim=1
+                    )
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            for request, row in zip(batch, probabilities):
+                request.future.set_result(row)
+
+    def stats(self):
+        """Return batch-fill and queue-wait metrics for this process"""
+        return {
+            'batches': self.batches,
+            'images': self.images,
+            'max_batch_size': self.max_batch_size,
+            'batch_size_counts': list(self.batch_size_counts),
+            'mean_batch_fill': (self.images / (self.batches * self.max_batch_size)
+                                if self.batches else 0.0),
+            'mean_queue_wait_ms': (1000.0 * self.queue_wait_total / self.images
+                                   if self.images else 0.0),
+            'max_queue_wait_ms': 1000.0 * self.queue_wait_max,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0
+        }
@@ -0,0 +1,245 @@
+"""
+Background job queue for slow image analysis
+
+Jobs run on a bounded process pool so sync web workers return immediately
+with a job id. Job state lives in a store: MemoryJobStore keeps it inside
+one process, SQLiteJobStore in a file shared by every gunicorn worker on
+the host, so a client can poll any worker for its job and the queue-depth
+limit applies across all of them. No external broker is needed.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+QUEUED = 'queued'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class MemoryJobStore:
+    """
+    Job states held in this process only
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, max_pending):
+        """Add a queued job unless max_pending jobs are queued; return whether it was added"""
+        now = time.time()
+        with self._lock:
+            # Forget finished jobs nobody has collected within the TTL
+            for old_id, job in list(self._jobs.items()):
+                if job['status'] != QUEUED and now - job['updated'] > self.ttl:
+                    del self._jobs[old_id]
+            if sum(1 for job in self._jobs.values() if job['status'] == QUEUED) >= max_pending:
+                return False
+            self._jobs[job_id] = {'status': QUEUED, 'result': None, 'error': None,
+                                  'created': now, 'updated': now}
+            return True
+
+    def finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._jobs[job_id].update(status=status, result=result, error=error,
+                                      updated=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def count_pending(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job['status'] == QUEUED)
+
+
+class SQLiteJobStore:
+    """
+    Job states in a SQLite file shared between processes
+    """
+
+    def __init__(self, path, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'job_id TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT, error TEXT, '
+                'created REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        # Connections must not cross a fork, so reconnect in child processes
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create(self, job_id, max_pending):
+        """Add a queued job unless max_pending jobs are queued; return whether it was added"""
+        now = time.time()
+        with self._connect() as conn:
+            # Take the write lock up front so no other process can insert
+            # between the count and the insert
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM jobs WHERE status != ? AND updated < ?',
+                         (QUEUED, now - self.ttl))
+            # Jobs of a web worker that died never finish; stop counting them
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = 'Job lost', updated = ? "
+                "WHERE status = ? AND created < ?",
+                (FAILED, now, QUEUED, now - self.ttl)
+            )
+            cursor = conn.execute(
+                'INSERT INTO jobs (job_id, status, created, updated) SELECT ?, ?, ?, ? '
+                'WHERE (SELECT COUNT(*) FROM jobs WHERE status = ?) < ?',
+                (job_id, QUEUED, now, now, QUEUED, max_pending)
+            )
+            return cursor.rowcount == 1
+
+    def finish(self, job_id, status, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, updated = ? WHERE job_id = ?',
+                (status, json.dumps(result), error, time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT status, result, error, created, updated FROM jobs WHERE job_id = ?',
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, result, error, created, updated = row
+        return {'status': status, 'result': json.loads(result) if result else None,
+                'error': error, 'created': created, 'updated': updated}
+
+    def count_pending(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM jobs WHERE status = ?',
+                                (QUEUED,)).fetchone()[0]
+
+
+class JobQueue:
+    """
+    Bounded process-pool job queue with pollable job states
+    """
+
+    def __init__(self, store, max_workers=2, max_pending=32):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # The pool is created lazily so gunicorn's preloading master never
+        # owns worker processes that would be inherited by every fork
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _discard_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _submit(self, fn, args):
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A pool child died (OOM, segfault) and the pool refuses all
+            # further work; jobs it held fail, later ones get a fresh pool
+            self._discard_executor(executor)
+            return self._get_executor().submit(fn, *args)
+
+    def submit(self, fn, *args, on_done=None):
+        """
+        Queue fn(*args) and return its job id
+
+        on_done(result) is called in this process once the job succeeds.
+        Raises QueueFull when max_pending jobs are already waiting.
+        """
+        job_id = uuid.uuid4().hex
+        # Checked and inserted atomically, also across processes sharing the store
+        if not self.store.create(job_id, self.max_pending):
+            raise QueueFull(f"Job queue is full ({self.max_pending} pending jobs)")
+        try:
+            future = self._submit(fn, args)
+        except Exception as e:
+            # Never leave a queued job behind that no worker will finish
+            self.store.finish(job_id, FAILED, error=str(e))
+            raise
+        future.add_done_callback(lambda f: self._finish(job_id, f, on_done))
+        return job_id
+
+    def _finish(self, job_id, future, on_done):
+        try:
+            result = future.result()
+            if on_done is not None:
+                on_done(result)
+        except Exception as e:
+            self.store.finish(job_id, FAILED, error=str(e))
+        else:
+            self.store.finish(job_id, DONE, result=result)
+
+    def get(self, job_id):
+        """Return the job state dict, or None for an unknown job"""
+        return self.store.get(job_id)
+
+    def wait(self, job_id, timeout, poll_interval=0.05):
+        """Block until the job finishes or timeout seconds pass; return its state"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job['status'] != QUEUED or time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def stats(self):
+        """Return queue depth and limits"""
+        return {
+            'pending': self.store.count_pending(),
+            'max_pending': self.max_pending,
+            'workers': self.max_workers
+        }
+
+
+def create_job_queue(job_config):
+    """Build the job queue described by JOB_QUEUE_CONFIG"""
+    ttl = job_config['result_ttl']
+    if job_config['backend'] == 'sqlite':
+        store = SQLiteJobStore(job_config['db_path'], ttl=ttl)
+    else:
+        store = MemoryJobStore(ttl=ttl)
+    return JobQueue(store, max_workers=job_config['max_workers'],
+                    max_pending=job_config['max_pending'])
@@ -0,0 +1,284 @@
+"""
+Prometheus-text metrics with multi-process aggregation
+
+Each process records counters and histograms in memory. When a
+multiprocess directory is configured (gunicorn.conf.py sets
+METRICS_MULTIPROC_DIR), every process periodically writes a snapshot of
+its values to <dir>/metrics_<pid>_<token>.json, and rendering sums the
+snapshots of all processes, dead workers included, so counters never go
+backwards when a worker is recycled. The random token keeps a worker that
+gets a dead worker's pid from overwriting its snapshot, and rendering
+folds the snapshots of exited processes into <dir>/aggregate.json so the
+directory does not grow with every recycled worker. Without a directory
+only the current process is reported.
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots of exited processes are kept, not folded
+    fcntl = None
+
+from config import METRICS_CONFIG
+
+# Request latencies are milliseconds to seconds, pipeline stages can be far below
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+AGGREGATE_FILENAME = 'aggregate.json'
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _merge(snapshots):
+    """Sum snapshots into ({(name, labels): value}, {(name, labels): values})"""
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+    return counters, histograms
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    with open(f'{path}.{os.getpid()}.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(f'{path}.{os.getpid()}.tmp', path)
+
+
+def _process_exited(filename):
+    """Whether the process that wrote metrics_<pid>_<token>.json has exited"""
+    pid = int(filename[len('metrics_'):-len('.json')].split('_', 1)[0])
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms rendered in the Prometheus text format
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = {}  # name -> (type, help, buckets)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._token = uuid.uuid4().hex[:12]
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self._last_flush = 0.0
+
+    def _check_fork(self):
+        # Values inherited from the parent belong to the parent's snapshot
+        if self._pid != os.getpid():
+            self._reset()
+
+    def counter(self, name, help_text):
+        """Declare a counter"""
+        self._metrics[name] = ('counter', help_text, None)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        """Declare a histogram with the given upper bounds"""
+        self._metrics[name] = ('histogram', help_text, tuple(buckets))
+
+    def inc(self, name, labels=None, value=1):
+        """Increment a counter"""
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._check_fork()
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        """Record one histogram observation"""
+        buckets = self._metrics[name][2]
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._check_fork()
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    values[i] += 1
+                    break
+            else:
+                values[len(buckets)] += 1
+            values[-1] += value
+
+    @contextmanager
+    def time(self, name, labels=None):
+        """Observe the duration of the enclosed block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def _snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return {
+                'counters': [[name, labels, value]
+                             for (name, labels), value in self._counters.items()],
+                'histograms': [[name, labels, list(values)]
+                               for (name, labels), values in self._histograms.items()]
+            }
+
+    def flush(self, force=False):
+        """Write this process's snapshot to the multiprocess directory"""
+        if self.directory is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot = self._snapshot()  # also notices a fork before the path is built
+        _write_json(self._snapshot_path(), snapshot)
+
+    def _snapshot_path(self):
+        return os.path.join(self.directory, f'metrics_{self._pid}_{self._token}.json')
+
+    def _fold_exited(self):
+        """
+        Add the snapshots of exited processes to the aggregate and delete them
+
+        The aggregate lists the snapshot files it already contains, so a
+        fold interrupted before the deletes never counts a file twice.
+        Returns the aggregate snapshot.
+        """
+        aggregate_path = os.path.join(self.directory, AGGREGATE_FILENAME)
+        if fcntl is None:
+            return _read_json(aggregate_path) or {'counters': [], 'histograms': [], 'folded': []}
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.aggregate.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                aggregate = _read_json(aggregate_path) or {'counters': [], 'histograms': [], 'folded': []}
+                paths = glob.glob(os.path.join(self.directory, 'metrics_*.json'))
+                exited = {os.path.basename(path) for path in paths
+                          if _process_exited(os.path.basename(path))}
+                folded = set(aggregate['folded'])
+                new = exited - folded
+                if new or folded - exited:
+                    counters, histograms = _merge(
+                        [aggregate] + [snapshot for snapshot in
+                                       (_read_json(os.path.join(self.directory, name)) for name in new)
+                                       if snapshot is not None])
+                    aggregate = {
+                        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+                        'histograms': [[name, labels, values]
+                                       for (name, labels), values in histograms.items()],
+                        'folded': sorted(exited)
+                    }
+                    _write_json(aggregate_path, aggregate)
+                for name in exited:
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+                return aggregate
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def collect(self):
+        """Return (counters, histograms) summed over all processes"""
+        snapshots = [self._snapshot()]
+        if self.directory is not None:
+            aggregate = self._fold_exited()
+            snapshots.append(aggregate)
+            skipped = {self._snapshot_path()} | {os.path.join(self.directory, name)
+                                                 for name in aggregate['folded']}
+            for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+                if path in skipped:
+                    continue
+                snapshot = _read_json(path)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        return _merge(snapshots)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (metric_type, help_text, buckets) in sorted(self._metrics.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            if metric_type == 'counter':
+                for (sample_name, labels), value in sorted(counters.items()):
+                    if sample_name == name:
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            for (sample_name, labels), values in sorted(histograms.items()):
+                if sample_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float('inf'),), values):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(values[-1])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry(
+    directory=os.environ.get('METRICS_MULTIPROC_DIR') or METRICS_CONFIG['multiprocess_dir'],
+    flush_interval=METRICS_CONFIG['flush_interval']
+)
+METRICS.counter('nutrivision_http_requests_total', 'HTTP requests by route, method and status')
+METRICS.counter('nutrivision_http_request_errors_total', 'HTTP requests answered with a 4xx or 5xx status')
+METRICS.histogram('nutrivision_http_request_duration_seconds', 'HTTP request latency by route')
+METRICS.histogram('nutrivision_stage_duration_seconds', 'Latency of individual pipeline stages')
+METRICS.counter('nutrivision_cascade_images_total', 'Images classified by the model cascade')
+METRICS.counter('nutrivision_cascade_escalations_total', 'Cascade images escalated to the full model')
+atexit.register(METRICS.flush, force=True)
+
+
+def time_stage(stage):
+    """Time a pipeline stage into nutrivision_stage_duration_seconds"""
+    return METRICS.time('nutrivision_stage_duration_seconds', {'stage': stage})
@@ -0,0 +1,173 @@
+"""
+Shared nutrition table for the web interface
+
+The table is built once at import time from the single source below and
+stored as a read-only NumPy foods x nutrients matrix plus a name -> row
+index. When gunicorn runs with preload_app the master imports this module
+before forking, so every worker shares the same matrix pages copy-on-write
+instead of rebuilding its own dicts on each request.
+"""
+
+from types import MappingProxyType
+
+import numpy as np
+
+# Column order of the nutrient matrix (values per 100g)
+NUTRIENTS = (
+    'calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar',
+    'sodium', 'vitamin_c', 'vitamin_a', 'calcium', 'iron'
+)
+
+# Single source of nutrition data per 100g, columns in NUTRIENTS order
+_FOOD_ROWS = {
+    # Fruits
+    'apple':      (52, 0.3, 14, 0.2, 2.4, 10, 1, 4.6, 3, 6, 0.1),
+    'banana':     (89, 1.1, 23, 0.3, 2.6, 12, 1, 8.7, 3, 5, 0.3),
+    'orange':     (47, 0.9, 12, 0.1, 2.4, 9, 0, 53.2, 225, 40, 0.1),
+    'strawberry': (32, 0.7, 8, 0.3, 2.0, 4.9, 1, 58.8, 12, 16, 0.4),
+    'grape':      (62, 0.6, 16, 0.2, 0.9, 16, 2, 3.2, 3, 10, 0.4),
+
+    # Vegetables
+    'broccoli':   (34, 2.8, 7, 0.4, 2.6, 1.5, 33, 89.2, 623, 47, 0.7),
+    'spinach':    (23, 2.9, 3.6, 0.4, 2.2, 0.4, 79, 28.1, 469, 99, 2.7),
+    'carrot':     (41, 0.9, 10, 0.2, 2.8, 4.7, 69, 5.9, 835, 33, 0.3),
+    'tomato':     (18, 0.9, 3.9, 0.2, 1.2, 2.6, 5, 13.7, 833, 10, 0.3),
+    'cucumber':   (16, 0.7, 3.6, 0.1, 0.5, 1.7, 2, 2.8, 105, 16, 0.3),
+    'salad':      (25, 2.1, 4.8, 0.3, 2.1, 2.2, 28, 15.3, 156, 32, 0.8),
+
+    # Proteins
+    'chicken':    (165, 31, 0, 3.6, 0, 0, 74, 0, 6, 15, 1.0),
+    'beef':       (250, 26, 0, 15, 0, 0, 72, 0, 0, 18, 2.6),
+    'salmon':     (208, 25, 0, 12, 0, 0, 59, 3.9, 149, 9, 0.3),
+    'fish':       (208, 25, 0, 12, 0, 0, 59, 3.9, 149, 9, 0.3),
+    'eggs':       (155, 13, 1.1, 11, 0, 1.1, 124, 0, 160, 56, 1.8),
+    'tofu':       (76, 8, 1.9, 4.8, 0.3, 0.6, 7, 0.1, 0, 350, 3.4),
+
+    # Grains
+    'rice':       (130, 2.7, 28, 0.3, 0.4, 0.1, 1, 0, 0, 10, 0.2),
+    'bread':      (265, 9, 49, 3.2, 2.7, 5, 491, 0, 0, 151, 3.6),
+    'pasta':      (131, 5, 25, 1.1, 1.8, 0.8, 6, 0, 0, 7, 0.5),
+    'oatmeal':    (68, 2.4, 12, 1.4, 1.7, 0.3, 49, 0, 0, 21, 0.6),
+    'quinoa':     (120, 4.4, 22, 1.9, 2.8, 0.9, 7, 0, 0, 17, 1.5),
+
+    # Dairy
+    'milk':       (42, 3.4, 5, 1, 0, 5, 44, 0.9, 46, 113, 0.1),
+    'yogurt':     (59, 10, 3.6, 0.4, 0, 3.2, 36, 0.5, 27, 110, 0.1),
+    'cheese':     (113, 7, 0.4, 9, 0, 0.1, 190, 0, 249, 202, 0.1),
+
+    # Nuts and Seeds
+    'almonds':    (579, 21, 22, 50, 12.5, 4.8, 1, 0, 0, 269, 3.7),
+    'peanuts':    (567, 26, 16, 49, 8.5, 4.7, 18, 0, 0, 92, 4.6),
+    'chia seeds': (486, 17, 42, 31, 34.4, 0, 16, 1.6, 54, 631, 7.7),
+
+    # Legumes
+    'beans':      (127, 9, 23, 0.5, 6.4, 0.3, 1, 1.2, 0, 35, 2.1),
+    'lentils':    (116, 9, 20, 0.4, 7.9, 1.8, 2, 1.5, 0, 19, 3.3),
+    'chickpeas':  (164, 8.9, 27, 2.6, 7.6, 4.8, 6, 1.3, 1, 49, 2.9),
+
+    # Mixed dishes
+    'pizza':      (266, 11, 33, 10, 2.5, 3.8, 598, 1.2, 89, 188, 2.1),
+    'sandwich':   (245, 12.5, 28.3, 8.7, 4.2, 6.8, 320, 15.2, 180, 85, 2.1),
+}
+
+# Presentation data for image uploads; nutrition comes from the table
+UPLOAD_SCENARIOS = MappingProxyType({
+    # Fruits
+    'apple': ('Apple', 0.92, (
+        'Great source of fiber and vitamin C',
+        'Low in calories, perfect for snacking',
+        'Contains antioxidants for heart health'
+    )),
+    'banana': ('Banana', 0.89, (
+        'Excellent source of potassium',
+        'Good for pre/post workout energy',
+        'Natural mood booster'
+    )),
+    'orange': ('Orange', 0.91, (
+        'Excellent source of vitamin C',
+        'Boosts immune system',
+        'Good for skin health'
+    )),
+    # Vegetables
+    'broccoli': ('Broccoli', 0.88, (
+        'Superfood with high vitamin C content',
+        'Excellent for bone health',
+        'Anti-inflammatory properties'
+    )),
+    'salad': ('Mixed Salad', 0.85, (
+        'Low calorie, high nutrient density',
+        'Great for weight management',
+        'Add protein for balanced meal'
+    )),
+    # Proteins
+    'chicken': ('Grilled Chicken', 0.87, (
+        'Excellent lean protein source',
+        'Great for muscle building',
+        'Low in saturated fat'
+    )),
+    'fish': ('Grilled Fish', 0.84, (
+        'Rich in omega-3 fatty acids',
+        'Great for heart health',
+        'High-quality protein source'
+    )),
+    # Grains
+    'rice': ('Steamed Rice', 0.86, (
+        'Good energy source',
+        'Pair with protein and vegetables',
+        'Consider brown rice for more fiber'
+    )),
+    'bread': ('Fresh Bread', 0.83, (
+        'Good source of B vitamins',
+        'Watch sodium content',
+        'Choose whole grain for more fiber'
+    )),
+    # Mixed dishes
+    'pizza': ('Pizza Slice', 0.82, (
+        'Moderate portion size',
+        'Add vegetables for nutrition',
+        'Consider thin crust for fewer calories'
+    )),
+    'sandwich': ('Sandwich', 0.81, (
+        'Good protein-carb balance',
+        'Add vegetables for fiber',
+        'Choose lean protein options'
+    )),
+})
+
+
+class NutritionTable:
+    """
+    Immutable foods x nutrients table backed by a single NumPy matrix
+    """
+
+    def __init__(self, rows, nutrients=NUTRIENTS):
+        self.nutrients = tuple(nutrients)
+        self.names = tuple(rows)
+        self.index = MappingProxyType({name: i for i, name in enumerate(self.names)})
+
+        # One contiguous read-only buffer keeps the pages shared after fork
+        matrix = np.array([rows[name] for name in self.names], dtype=np.float64)
+        matrix.setflags(write=False)
+        self.matrix = matrix
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def row(self, name):
+        """Return the read-only nutrient vector for a food"""
+        return self.matrix[self.index[name]]
+
+    def nutrition(self, name):
+        """Return a fresh nutrient dict for a food"""
+        return self.to_dict(self.row(name))
+
+    def to_dict(self, values):
+        """Convert a nutrient vector into a {nutrient: value} dict"""
+        return dict(zip(self.nutrients, values.tolist()))
+
+
+NUTRITION_TABLE = NutritionTable(_FOOD_ROWS)
+del _FOOD_ROWS
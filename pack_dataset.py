@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Pack a folder of food images into shards for PackedFoodDataset
+
+Reads a class-per-folder tree (one sub-directory of images per class),
+resizes every image to MODEL_CONFIG['input_size'] and writes the pixels as
+uint8 .npy shards plus an index.json with labels and class names. The
+output directory can be passed to NutritionDetectionSystem.train_model,
+evaluate_model and prepare_inference_model in place of image paths.
+
+Usage:
+    python pack_dataset.py IMAGES_DIR OUTPUT_DIR [--shard-size 1024]
+"""
+
+import argparse
+import time
+
+from config import MODEL_CONFIG
+from food_models import list_image_folder, pack_images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('images', help='directory with one folder of images per class')
+    parser.add_argument('output', help='directory for the shards and index.json')
+    parser.add_argument('--shard-size', type=int, default=1024, help='images per shard')
+    parser.add_argument('--size', type=int, nargs=2, default=list(MODEL_CONFIG['input_size']),
+                        metavar=('H', 'W'))
+    args = parser.parse_args()
+
+    paths, labels, class_names = list_image_folder(args.images)
+    print(f"Packing {len(paths)} images in {len(class_names)} classes...")
+    start = time.perf_counter()
+    index = pack_images(paths, labels, args.output, input_size=args.size,
+                        shard_size=args.shard_size, class_names=class_names)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {len(index['shards'])} shards to {args.output} "
+          f"in {elapsed:.1f}s ({len(paths) / max(elapsed, 1e-9):.0f} images/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Tests for the Flask web interface using Flask's test client
+"""
+
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from app import app
+from config import PERFORMANCE_CONFIG
+
+
+def test_analyze_foods():
+    """Manual food analysis sums the matched foods"""
+    client = app.test_client()
+    response = client.post('/analyze_foods', json={'foods': ['apple', 'chicken', 'unknown dish']})
+    assert response.status_code == 200
+
+    result = response.get_json()
+    assert [detail['is_irrelevant'] for detail in result['food_details']] == [False, False, True]
+    assert result['total_nutrition']['calories'] == 52 + 165
+    assert result['total_nutrition']['protein'] == 31.3
+    assert 0 <= result['health_score'] <= 100
+    assert result['suggestions']
+
+    response = client.post('/analyze_foods', json={'foods': []})
+    assert response.status_code == 400
+
+
+def test_analyze_foods_batch_matches_single_requests():
+    """Every meal in a batch gets the same result as its own request"""
+    client = app.test_client()
+    meals = [
+        {'foods': ['apple', 'banana']},
+        {'foods': ['salmon', 'rice', 'broccoli', 'salmon']},
+        {'foods': []},
+        {'foods': ['pizza', 'cheese', 'bread']},
+    ]
+    response = client.post('/analyze_foods/batch', json={'meals': meals})
+    assert response.status_code == 200
+
+    results = response.get_json()['results']
+    assert len(results) == len(meals)
+    assert results[2] == {'error': 'No foods provided'}
+    for meal, result in zip(meals, results):
+        if meal['foods']:
+            assert result == client.post('/analyze_foods', json=meal).get_json()
+
+    response = client.post('/analyze_foods/batch', json={'meals': []})
+    assert response.status_code == 400
+
+
+def test_upload_reuses_cached_result(tmp_path, monkeypatch):
+    """Re-uploading the same bytes skips the disk write and detection"""
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    client = app.test_client()
+
+    def upload(name):
+        response = client.post('/upload', data={'file': (io.BytesIO(b'fake image bytes'), name)})
+        # Closing the response runs the deferred upload write
+        response.close()
+        return response
+
+    first = upload('banana.jpg')
+    assert first.status_code == 200
+    assert first.get_json()['food_name'] == 'Banana'
+    assert len([path for path in tmp_path.rglob('*') if path.is_file()]) == 1
+
+    second = upload('retry.jpg')
+    assert second.get_json() == first.get_json()
+    assert len([path for path in tmp_path.rglob('*') if path.is_file()]) == 1
+
+    stats = client.get('/health').get_json()['upload_cache']
+    assert stats['hits'] >= 1
+
+
+def test_upload_persistence_modes(tmp_path, monkeypatch):
+    """Uploads are processed from memory and saved after the response, if at all"""
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    client = app.test_client()
+    image = bytes(range(256)) * 4096  # large enough for Werkzeug to spool by default
+
+    monkeypatch.setitem(PERFORMANCE_CONFIG, 'persist_uploads', False)
+    response = client.post('/upload', data={'file': (io.BytesIO(image), 'apple.jpg')})
+    response.close()
+    assert response.get_json()['food_name'] == 'Apple'
+    assert response.get_json()['image_path'] is None
+    assert not list(tmp_path.iterdir())
+
+    monkeypatch.setitem(PERFORMANCE_CONFIG, 'persist_uploads', True)
+    response = client.post('/upload', data={'file': (io.BytesIO(image[::-1]), 'apple.jpg')})
+    saved = tmp_path.joinpath(*response.get_json()['image_path'].split('/')[1:])
+    assert not saved.exists()
+    response.close()
+    assert saved.read_bytes() == image[::-1]
+
+    monkeypatch.setitem(PERFORMANCE_CONFIG, 'in_memory_uploads', False)
+    response = client.post('/upload', data={'file': (io.BytesIO(image + b'!'), 'apple.jpg')})
+    saved = tmp_path.joinpath(*response.get_json()['image_path'].split('/')[1:])
+    assert saved.read_bytes() == image + b'!'
+    response.close()
+
+
+def test_served_model_classifies_saved_and_in_memory_uploads(tmp_path, monkeypatch):
+    """With serve_model the engine answers, by class name, whether or not uploads are processed in memory"""
+    torch = pytest.importorskip('torch')
+    from PIL import Image
+
+    import app as app_module
+
+    class FixedEngine:
+        # Trained models order their classes by folder name, not UPLOAD_SCENARIOS
+        model = SimpleNamespace(class_names=['apple', 'bread', 'rice'])
+
+        def __init__(self):
+            self.calls = 0
+
+        def infer(self, tensor):
+            self.calls += 1
+            return torch.tensor([0.0, 0.0, 1.0])
+
+    engine = FixedEngine()
+    monkeypatch.setattr(app_module, 'INFERENCE_ENGINE', engine)
+    monkeypatch.setitem(app_module.MODEL_CONFIG, 'serve_model', True)
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    client = app.test_client()
+    image = io.BytesIO()
+    Image.new('RGB', (32, 32), (200, 120, 40)).save(image, format='PNG')
+
+    for index, in_memory in enumerate((True, False)):
+        monkeypatch.setitem(PERFORMANCE_CONFIG, 'in_memory_uploads', in_memory)
+        # A distinct byte appended per round keeps the result cache out of the way
+        data = image.getvalue() + bytes([index])
+        response = client.post('/upload', data={'file': (io.BytesIO(data), 'apple.png')})
+        response.close()
+        assert response.get_json()['food_name'] == 'Steamed Rice'
+        assert engine.calls == index + 1
+
+
+def test_upload_job_mode(tmp_path, monkeypatch):
+    """Async uploads return a job id whose result can be polled"""
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    client = app.test_client()
+
+    response = client.post('/upload?async=1', data={'file': (io.BytesIO(b'queued bytes'), 'rice.jpg')})
+    response.close()
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['status'] == 'queued'
+
+    result = client.get(f"{job['status_url']}?wait=30").get_json()
+    assert result['status'] == 'done'
+    assert result['result']['food_name'] == 'Steamed Rice'
+
+    assert client.get('/jobs/unknown').status_code == 404
+
+
+def test_metrics_endpoint():
+    """/metrics reports request counts and stage latencies per route"""
+    client = app.test_client()
+    client.post('/analyze_foods', json={'foods': ['apple']})
+    client.post('/get_vdic_info', json={'food_name': ''})
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'nutrivision_http_requests_total{method="POST",route="/analyze_foods",status="200"}' in text
+    assert 'nutrivision_http_request_errors_total{route="/get_vdic_info"}' in text
+    assert 'nutrivision_http_request_duration_seconds_bucket{route="/analyze_foods",le="+Inf"}' in text
+    assert 'nutrivision_stage_duration_seconds_count{stage="suggestions"}' in text
+    assert '/metrics"' not in text
@@ -0,0 +1,64 @@
+"""
+Tests for data-parallel training over torch.distributed (gloo)
+"""
+
+import socket
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from config import PERFORMANCE_CONFIG, TRAINING_CONFIG
+from distributed_training import rank_thread_budget, train_distributed
+from food_models import PackedFoodDataset, pack_images
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def small_model():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.Flatten(), torch.nn.Linear(4 * 30 * 30, 2))
+
+
+def test_rank_thread_budget_splits_cores(monkeypatch):
+    """Each rank gets its share of the cores minus its DataLoader workers"""
+    monkeypatch.setattr('os.cpu_count', lambda: 64)
+    assert rank_thread_budget(8, 2) == 6
+    assert rank_thread_budget(64, 4) == 1
+    assert rank_thread_budget(8, 2, threads_per_rank=3) == 3
+
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_two_ranks_train_one_model(tmp_path, packed):
+    """Two gloo ranks train and return the rank 0 weights, even with uneven shards"""
+    if packed:
+        from PIL import Image
+        import numpy as np
+
+        paths = []
+        for i in range(10):
+            path = str(tmp_path / f'food_{i}.jpg')
+            Image.fromarray(np.full((32, 32, 3), 20 * i, dtype=np.uint8)).save(path)
+            paths.append(path)
+        # Shards of 4, 4 and 2 images: the ranks get different numbers of batches
+        pack_images(paths, [i % 2 for i in range(10)], str(tmp_path / 'packed'),
+                    input_size=(32, 32), shard_size=4)
+        train_set = PackedFoodDataset(str(tmp_path / 'packed'), shuffle=True)
+    else:
+        images = torch.randn(40, 3, 32, 32)
+        train_set = torch.utils.data.TensorDataset(images, (images.mean(dim=(1, 2, 3)) > 0).long())
+
+    model = small_model()
+    initial = [param.detach().clone() for param in model.parameters()]
+    config = dict(TRAINING_CONFIG, ranks_per_node=2, master_port=free_port(), scheduler=None,
+                  gradient_accumulation_steps=2, threads_per_rank=1)
+    history = train_distributed(model, train_set, num_epochs=2, batch_size=4, config=config,
+                                performance_config=dict(PERFORMANCE_CONFIG, num_workers=0))
+
+    assert len(history) == 2
+    assert all(record['images_per_second'] > 0 for record in history)
+    assert any(not torch.equal(before, after) for before, after in zip(initial, model.parameters()))
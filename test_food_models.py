@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Tests for the torch-backed food classifier and dataset
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from torch.utils.data import DataLoader
+
+from config import MODEL_CONFIG, PERFORMANCE_CONFIG, TRAINING_CONFIG
+from food_models import (BACKBONES, BatchAugmentation, CascadeClassifier, FoodClassifier, FoodDataset,
+                         PackedFoodDataset, cache_backbone_features, cache_teacher_logits,
+                         create_data_loader, distill_student, export_classifier,
+                         load_checkpoint, load_classifier, load_inference_model, load_serving_model,
+                         open_dataset,
+                         pack_images, probe_batch_size, progressive_resizing_schedule,
+                         quantize_classifier, save_checkpoint, save_quantized_classifier, split_dataset,
+                         train_classifier, train_head)
+
+
+def test_dataset_decodes_jpegs_in_draft_mode(tmp_path):
+    """Large JPEGs decode at a reduced scale that still covers input_size"""
+    from PIL import Image
+
+    path = str(tmp_path / 'large.jpg')
+    Image.fromarray(np.zeros((1200, 1600, 3), dtype=np.uint8)).save(path)
+    dataset = FoodDataset([path], [3])
+
+    assert dataset.load_image(path).size == (400, 300)
+    image, label = dataset[0]
+    assert image.shape == (3, 224, 224) and label == 3
+
+
+@pytest.mark.parametrize('architecture', ['resnet18', 'mobilenet_v3_small', 'efficientnet_b0'])
+def test_head_matches_backbone_features(architecture):
+    """Every backbone feeds its own feature dimension into the shared head"""
+    model = FoodClassifier(num_classes=7, pretrained=False, architecture=architecture).eval()
+    with torch.inference_mode():
+        features = model.backbone(torch.randn(2, 3, 224, 224))
+        assert features.shape == (2, model.head[1].in_features)
+        assert model(torch.randn(2, 3, 224, 224)).shape == (2, 7)
+
+
+def test_unknown_architecture():
+    """Unregistered architectures are rejected with the available choices"""
+    with pytest.raises(ValueError, match='resnet18'):
+        FoodClassifier(num_classes=3, pretrained=False, architecture='vgg11')
+    assert 'resnet101' in BACKBONES
+
+
+def test_quantized_classifier_matches_fp32_shape():
+    """The int8 model keeps the output shape and quantizes the Linear head"""
+    torch.manual_seed(0)
+    model = FoodClassifier(num_classes=5, pretrained=False, architecture='resnet18').eval()
+    paths = [f'image_{i}.jpg' for i in range(4)]
+    loader = DataLoader(FoodDataset(paths, [0] * len(paths)), batch_size=2)
+
+    quantized = quantize_classifier(model, loader, num_batches=2)
+
+    images = torch.randn(3, 3, 224, 224)
+    with torch.inference_mode():
+        assert quantized(images).shape == model(images).shape == (3, 5)
+    head = dict(quantized.named_modules())['head.4']
+    assert 'quantized.dynamic' in type(head).__module__
+    # The fp32 model passed in is left untouched
+    assert isinstance(model.head[4], torch.nn.Linear)
+
+
+def test_int8_setting_serves_quantized_artifact(tmp_path):
+    """With quantization 'int8' the serving path loads the saved int8 model, never fp32"""
+    torch.manual_seed(0)
+    model = FoodClassifier(num_classes=5, pretrained=False, architecture='resnet18').eval()
+    loader = DataLoader(torch.utils.data.TensorDataset(torch.randn(4, 3, 64, 64), torch.zeros(4)),
+                        batch_size=2)
+    quantized = quantize_classifier(model, loader, num_batches=2)
+    config = dict(MODEL_CONFIG, quantization='int8', quantized_path=str(tmp_path / 'int8.pt'),
+                  cascade=False)
+    with pytest.raises(FileNotFoundError, match='int8'):
+        load_serving_model(5, config)
+
+    save_quantized_classifier(quantized, config['quantized_path'], input_size=(64, 64))
+    served = load_serving_model(5, config)
+    images = torch.randn(2, 3, 64, 64)
+    with torch.inference_mode():
+        torch.testing.assert_close(served(images), quantized(images))
+
+
+def test_serving_model_carries_saved_class_names(tmp_path):
+    """Checkpoints and exported artifacts keep the class of each output index"""
+    torch.manual_seed(0)
+    model = FoodClassifier(num_classes=3, pretrained=False, architecture='resnet18').eval()
+    class_names = ['apple', 'bread', 'rice']
+    config = dict(MODEL_CONFIG, quantization=None, cascade=False, inference_runtime='torchscript',
+                  weights_path=str(tmp_path / 'weights.pth'), optimized_path=str(tmp_path / 'missing.pt'))
+    save_checkpoint(model, config['weights_path'], class_names)
+
+    # The class count comes from the checkpoint, not the caller
+    served = load_serving_model(11, config)
+    assert served.class_names == class_names
+    with torch.inference_mode():
+        assert served(torch.randn(1, 3, 64, 64)).shape == (1, 3)
+
+    path = str(tmp_path / 'classifier.pt')
+    export_classifier(model, path, input_size=(64, 64), class_names=class_names)
+    assert load_inference_model(path).class_names == class_names
+
+
+def test_missing_weights_are_never_served_untrained(tmp_path):
+    """Without trained weights the serving path fails instead of using a random model"""
+    config = dict(MODEL_CONFIG, quantization=None, cascade=False, inference_runtime='torchscript',
+                  weights_path=str(tmp_path / 'missing.pth'), optimized_path=str(tmp_path / 'missing.pt'))
+    with pytest.raises(FileNotFoundError, match='missing.pth'):
+        load_serving_model(3, config)
+
+    untrained = load_classifier(3, 'resnet18', config['weights_path'], allow_untrained=True)
+    assert untrained.head[-1].out_features == 3
+
+
+def test_exported_classifier_matches_eager_model(tmp_path):
+    """The frozen artifact has no batch norm or dropout and keeps the outputs"""
+    torch.manual_seed(0)
+    model = FoodClassifier(num_classes=5, pretrained=False, architecture='resnet18').eval()
+    path = str(tmp_path / 'classifier.pt')
+    export_classifier(model, path)
+
+    loaded = load_inference_model(path)
+    graph = str(torch.jit.load(path).graph)
+    assert 'batch_norm' not in graph and 'dropout' not in graph
+
+    images = torch.randn(4, 3, 224, 224)
+    with torch.inference_mode():
+        expected = model(images)
+        actual = loaded(images)
+    torch.testing.assert_close(actual, expected, rtol=1e-3, atol=1e-3 * expected.abs().max().item())
+
+
+class FixedLogits(torch.nn.Module):
+    """Returns the logits stored for each input row's first value"""
+
+    def __init__(self, logits):
+        super().__init__()
+        self.logits = logits
+        self.seen = []
+
+    def forward(self, x):
+        self.seen.append(len(x))
+        return self.logits[x[:, 0].long()]
+
+
+def test_cascade_escalates_only_uncertain_images():
+    """Confident fast predictions are kept, uncertain ones go to the full model"""
+    fast = FixedLogits(torch.tensor([[10.0, 0.0, 0.0], [1.0, 0.9, 0.0], [0.0, 10.0, 0.0]]))
+    full = FixedLogits(torch.tensor([[0.0, 0.0, 10.0]] * 3))
+    cascade = CascadeClassifier(fast, full, confidence_threshold=0.8, margin_threshold=0.2)
+
+    images = torch.arange(3.0).view(3, 1)
+    probabilities, escalated = cascade.classify(images)
+
+    assert escalated.tolist() == [False, True, False]
+    assert probabilities.argmax(1).tolist() == [0, 2, 1]
+    assert full.seen == [1]
+    assert cascade.escalation_rate() == pytest.approx(1 / 3)
+    # Called like a model, the cascade returns log-probabilities
+    torch.testing.assert_close(torch.softmax(cascade(images), dim=1), probabilities)
+
+
+def write_images(directory, count):
+    from PIL import Image
+
+    paths = []
+    for i in range(count):
+        path = str(directory / f'food_{i}.jpg')
+        Image.fromarray(np.full((64, 64, 3), 40 * i, dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_distilled_student_checkpoint(tmp_path):
+    """Teacher logits are cached once and the student checkpoint reloads"""
+    from fd import NutritionDetectionSystem
+
+    torch.manual_seed(0)
+    teacher = FoodClassifier(num_classes=3, pretrained=False, architecture='resnet18').eval()
+    paths = write_images(tmp_path, 4)
+    dataset = FoodDataset(paths, [0, 1, 2, 0])
+    logits_path = str(tmp_path / 'teacher.npy')
+
+    logits = cache_teacher_logits(teacher, dataset, logits_path, batch_size=2)
+    assert logits.shape == (4, 3)
+    # Same teacher and data: served from disk without recomputing
+    assert isinstance(cache_teacher_logits(teacher, dataset, logits_path), np.memmap)
+    relabelled = FoodDataset(paths, [1, 1, 2, 0])
+    assert not isinstance(cache_teacher_logits(teacher, relabelled, logits_path), np.memmap)
+
+    student = FoodClassifier(num_classes=3, pretrained=False, architecture='mobilenet_v3_small')
+    history = distill_student(student, dataset, logits, num_epochs=1, batch_size=2)
+    assert len(history) == 1 and np.isfinite(history[0])
+
+    checkpoint = str(tmp_path / 'student.pth')
+    save_checkpoint(student, checkpoint, ['apple', 'banana', 'bread'])
+    model, class_names = load_checkpoint(checkpoint)
+    assert model.architecture == 'mobilenet_v3_small'
+    assert class_names == ['apple', 'banana', 'bread']
+
+    system = NutritionDetectionSystem()
+    system.inference_model = teacher
+    assert system.classify_image_file(paths[0], checkpoint) in class_names
+    # The student is used for this file only; the served model stays in place
+    assert system.inference_model is teacher and system.class_names == []
+
+
+def test_backbone_feature_cache(tmp_path):
+    """Features are cached as float16 and re-extracted when inputs change"""
+    from torchvision import transforms
+
+    torch.manual_seed(0)
+    model = FoodClassifier(num_classes=3, pretrained=False, architecture='resnet18').eval()
+    paths = write_images(tmp_path, 5)
+    dataset = FoodDataset(paths, [0, 1, 2, 0, 1])
+    path = str(tmp_path / 'features.npy')
+
+    features = cache_backbone_features(model.backbone, dataset, path, batch_size=2)
+    assert features.features.dtype == np.float16
+    assert features.features.shape == (5, model.head[1].in_features)
+    with torch.inference_mode():
+        expected = model.backbone(torch.stack([dataset[i][0] for i in range(5)]))
+    torch.testing.assert_close(features[3][0], expected[3], rtol=1e-2, atol=1e-2)
+    mtime = os.path.getmtime(path)
+
+    # Unchanged backbone, transform and samples: the cache is reused
+    cache_backbone_features(model.backbone, dataset, path)
+    assert os.path.getmtime(path) == mtime
+
+    # A different transform invalidates it
+    resized = FoodDataset(paths, dataset.labels, transform=transforms.Compose([
+        transforms.Resize((160, 160)), transforms.ToTensor()]))
+    cache_backbone_features(model.backbone, resized, path)
+    assert os.path.getmtime(path) != mtime
+
+    history = train_head(model.head, features, num_epochs=2, batch_size=2)
+    assert len(history) == 2 and np.isfinite(history).all()
+
+    with pytest.raises(ValueError, match='empty dataset'):
+        cache_backbone_features(model.backbone, FoodDataset([], []), str(tmp_path / 'empty.npy'))
+    assert not os.path.exists(str(tmp_path / 'empty.npy.tmp'))
+
+
+def test_packed_dataset_matches_per_file_dataset(tmp_path):
+    """Packed shards yield the FoodDataset images, each once per shuffled epoch"""
+    paths = write_images(tmp_path, 7)
+    labels = list(range(7))
+    files = FoodDataset(paths, labels)
+    index = pack_images(paths, labels, str(tmp_path / 'packed'), shard_size=3, batch_size=2)
+    assert [shard['count'] for shard in index['shards']] == [3, 3, 1]
+
+    packed = open_dataset(str(tmp_path / 'packed'))
+    assert isinstance(packed, PackedFoodDataset) and len(packed) == 7
+    for (image, label), i in zip(packed, range(7)):
+        assert label == i
+        torch.testing.assert_close(image, files[i][0])
+
+    shuffled = PackedFoodDataset(str(tmp_path / 'packed'), shuffle=True, buffer_size=2)
+    epochs = []
+    for epoch in range(3):
+        shuffled.set_epoch(epoch)
+        epochs.append([label for _, label in shuffled])
+    assert all(sorted(epoch) == labels for epoch in epochs)
+    assert len({tuple(epoch) for epoch in epochs}) > 1
+
+    config = dict(PERFORMANCE_CONFIG, num_workers=2)
+    loader = create_data_loader(shuffled, batch_size=2, shuffle=True, performance_config=config)
+    assert sorted(torch.cat([batch for _, batch in loader]).tolist()) == labels
+
+    # The epoch reaches workers started afresh every epoch, and replays on resume
+    loader = DataLoader(shuffled, batch_size=2, num_workers=1)
+    worker_epochs = []
+    for epoch in (0, 1, 2, 1):
+        shuffled.set_epoch(epoch)
+        worker_epochs.append(torch.cat([batch for _, batch in loader]).tolist())
+    assert worker_epochs[:3] == epochs and worker_epochs[3] == epochs[1]
+
+
+def test_split_dataset_holds_out_samples_or_shards(tmp_path):
+    """Validation splits are disjoint, per sample or per packed shard"""
+    paths = write_images(tmp_path, 6)
+    train, validation = split_dataset(FoodDataset(paths, list(range(6))), 0.2, seed=1)
+    assert len(validation) == 1
+    assert sorted(train.labels + validation.labels) == list(range(6))
+
+    pack_images(paths, list(range(6)), str(tmp_path / 'packed'), shard_size=2)
+    train, validation = split_dataset(PackedFoodDataset(str(tmp_path / 'packed'), shuffle=True), 0.5)
+    assert len(validation.shards) == 2 and not validation.shuffle
+    assert sorted(train.labels + validation.labels) == list(range(6))
+    assert sorted(label for _, label in validation) == sorted(validation.labels)
+
+
+def test_train_classifier_accumulates_and_stops_early():
+    """Training learns with accumulated gradients and stops when validation stalls"""
+    torch.manual_seed(0)
+    images = torch.randn(64, 3, 8, 8)
+    labels = (images.mean(dim=(1, 2, 3)) > 0).long()
+    loader = DataLoader(torch.utils.data.TensorDataset(images, labels), batch_size=8)
+    model = torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.Flatten(), torch.nn.Linear(144, 2))
+    config = dict(TRAINING_CONFIG, scheduler=None, gradient_accumulation_steps=2,
+                  early_stopping_patience=2)
+
+    history = train_classifier(model, loader, loader, num_epochs=10, learning_rate=1e-2, config=config)
+    assert history[-1]['val_loss'] < history[0]['val_loss']
+    assert all(record['images_per_second'] > 0 for record in history)
+
+    # Nothing can improve without a learning rate: epoch 1 plus `patience` epochs
+    history = train_classifier(model, loader, loader, num_epochs=10, learning_rate=0.0, config=config)
+    assert len(history) == 3
+
+
+def test_training_resumes_from_background_checkpoints(tmp_path):
+    """An interrupted run resumed from its checkpoints matches an uninterrupted one"""
+    images = torch.randn(32, 3, 8, 8)
+    labels = (images.mean(dim=(1, 2, 3)) > 0).long()
+    loader = DataLoader(torch.utils.data.TensorDataset(images, labels), batch_size=8)
+    config = dict(TRAINING_CONFIG, scheduler='step', scheduler_step_size=2, keep_checkpoints=2,
+                  resume=True, early_stopping_patience=10)
+
+    def build():
+        torch.manual_seed(0)
+        return torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.Flatten(), torch.nn.Linear(144, 2))
+
+    directory = str(tmp_path / 'checkpoints')
+    first = train_classifier(build(), loader, num_epochs=3, learning_rate=1e-2, config=config,
+                             checkpoint_dir=directory)
+    assert sorted(os.listdir(directory)) == ['checkpoint_0002.pth', 'checkpoint_0003.pth']
+
+    resumed_model = build()
+    resumed = train_classifier(resumed_model, loader, num_epochs=5, learning_rate=1e-2,
+                               config=config, checkpoint_dir=directory)
+    assert [r['loss'] for r in resumed[:3]] == [r['loss'] for r in first]
+    assert sorted(os.listdir(directory)) == ['checkpoint_0004.pth', 'checkpoint_0005.pth']
+
+    reference_model = build()
+    reference = train_classifier(reference_model, loader, num_epochs=5, learning_rate=1e-2,
+                                 config=dict(config, resume=False))
+    assert [r['loss'] for r in resumed] == pytest.approx([r['loss'] for r in reference])
+    for resumed_param, reference_param in zip(resumed_model.parameters(), reference_model.parameters()):
+        torch.testing.assert_close(resumed_param, reference_param)
+
+
+def test_load_classifier_maps_saved_weights(tmp_path):
+    """Weights loaded through the memory map give the saved model's outputs"""
+    torch.manual_seed(0)
+    model = FoodClassifier(num_classes=3, pretrained=False, architecture='resnet18').eval()
+    path = str(tmp_path / 'weights.pth')
+    torch.save(model.state_dict(), path)
+
+    loaded = load_classifier(3, 'resnet18', path)
+    assert not any(param.is_meta for param in loaded.parameters())
+    images = torch.randn(2, 3, 64, 64)
+    with torch.inference_mode():
+        torch.testing.assert_close(loaded(images), model(images))
+
+
+@pytest.mark.parametrize('architecture', ['resnet18', 'mobilenet_v3_small'])
+def test_activation_checkpointing_matches_gradients(architecture):
+    """Recomputing stage activations in backward gives the same gradients"""
+    torch.manual_seed(0)
+    model = FoodClassifier(num_classes=3, pretrained=False, architecture=architecture).train()
+    model.head.eval()  # same dropout masks in both passes
+    images = torch.randn(2, 3, 64, 64)
+    gradients = []
+    for checkpointing in (False, True):
+        model.zero_grad()
+        model.activation_checkpointing = checkpointing
+        model(images).sum().backward()
+        gradients.append([param.grad.clone() for param in model.parameters()])
+    for plain, recomputed in zip(*gradients):
+        torch.testing.assert_close(plain, recomputed)
+
+
+def test_probe_batch_size_fits_budget(monkeypatch):
+    """A tight budget shrinks the batch, accumulation keeps the effective batch"""
+    import food_models
+
+    torch.manual_seed(0)
+    model = FoodClassifier(num_classes=3, pretrained=False, architecture='resnet18')
+    buffers = {name: buffer.clone() for name, buffer in model.named_buffers()}
+    monkeypatch.setattr(food_models, 'available_memory', lambda: 2 ** 30)
+    performance_config = dict(PERFORMANCE_CONFIG, max_memory_usage=0.5)
+
+    batch_size, steps = probe_batch_size(model, (224, 224), 256, performance_config=performance_config)
+    assert batch_size < 256 and batch_size * steps >= 256
+    for name, buffer in model.named_buffers():
+        torch.testing.assert_close(buffer, buffers[name])
+
+    model.activation_checkpointing = True
+    assert probe_batch_size(model, (224, 224), 256, performance_config=performance_config)[0] > batch_size
+    assert model.activation_checkpointing
+
+
+def test_progressive_resizing_schedule():
+    """Resolution ramps up to the final size, batches grow as images shrink"""
+    schedule = progressive_resizing_schedule(10, (224, 224), 32)
+    assert schedule[0] == ((128, 128), 98)
+    assert schedule[7:] == [((224, 224), 32)] * 3
+    sides = [size[0] for size, _ in schedule]
+    assert sides == sorted(sides) and all(side % 32 == 0 for side in sides)
+    assert progressive_resizing_schedule(1, (224, 224), 32) == [((224, 224), 32)]
+
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_resolution_schedule_reaches_persistent_workers(tmp_path, packed):
+    """Each epoch's size and batch reach the loader without restarting its workers"""
+    paths = write_images(tmp_path, 6)
+    labels = [i % 2 for i in range(6)]
+    dataset = FoodDataset(paths, labels, input_size=(32, 32))
+    if packed:
+        pack_images(paths, labels, str(tmp_path / 'packed'), input_size=(32, 32), shard_size=3)
+        dataset = PackedFoodDataset(str(tmp_path / 'packed'))
+    performance_config = dict(PERFORMANCE_CONFIG, num_workers=2, prefetch_factor=2)
+    loader = create_data_loader(dataset, 2, shuffle=True, performance_config=performance_config)
+
+    shapes = []
+    model = torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.AdaptiveAvgPool2d(1),
+                                torch.nn.Flatten(), torch.nn.Linear(4, 2))
+    model.register_forward_pre_hook(lambda module, inputs: shapes.append(tuple(inputs[0].shape)))
+    schedule = [((16, 16), 3), ((32, 32), 2)]
+    history = train_classifier(model, loader, num_epochs=2, config=TRAINING_CONFIG,
+                               resolution_schedule=schedule)
+    workers = loader._iterator._workers
+
+    assert [record['input_size'] for record in history] == [(16, 16), (32, 32)]
+    # Workers of an iterable dataset each batch their own shards
+    for (size, batch_size), batches in zip(schedule, (shapes[:2], shapes[2:])):
+        assert {shape[2:] for shape in batches} == {size}
+        assert max(shape[0] for shape in batches) == batch_size
+        assert sum(shape[0] for shape in batches) == 6
+    if packed:
+        assert dataset.epoch == 1
+    train_classifier(model, loader, num_epochs=1, config=TRAINING_CONFIG, resolution_schedule=schedule)
+    assert loader._iterator._workers == workers
+
+
+def test_batch_augmentation_draws_parameters_per_sample():
+    """Flips are exact, gray stays gray under color jitter, samples differ"""
+    generator = torch.Generator().manual_seed(0)
+    images = torch.rand(8, 3, 16, 24)
+    flip = BatchAugmentation(horizontal_flip=1.0, mean=None, std=None)
+    torch.testing.assert_close(flip(images), images.flip(-1))
+    uint8 = (images * 255).to(torch.uint8)
+    assert torch.equal(flip(uint8), uint8.flip(-1))
+
+    jitter = BatchAugmentation(horizontal_flip=0.0, saturation=0.5, hue=0.2, generator=generator)
+    gray = images[:, :1].expand(8, 3, 16, 24)
+    mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+    std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+    torch.testing.assert_close(jitter((gray - mean) / std), (gray - mean) / std, atol=1e-3, rtol=0)
+
+    colors = torch.rand(1, 3, 1, 1).expand(8, 3, 16, 24)
+    augmented = BatchAugmentation(rotation=15, brightness=0.2, contrast=0.2, saturation=0.2,
+                                  hue=0.1, mean=None, std=None, generator=generator)(colors)
+    assert augmented.shape == colors.shape and 0 <= augmented.min() and augmented.max() <= 1
+    centers = augmented[:, :, 8, 12]
+    assert len({tuple(center.tolist()) for center in centers}) == 8
+
+
+def test_augmentation_applies_to_training_batches_only(tmp_path):
+    """The training part of a split is augmented by its loader, validation is not"""
+    from PIL import Image
+
+    paths = []
+    for i in range(6):
+        paths.append(str(tmp_path / f'food_{i}.png'))
+        Image.fromarray(np.tile(np.arange(0, 256, 8, dtype=np.uint8)[None, :, None] // (i + 1),
+                                (32, 1, 3))).save(paths[-1])
+    augmentation = BatchAugmentation(horizontal_flip=1.0)
+    dataset = FoodDataset(paths, [0] * 6, input_size=(32, 32), augmentation=augmentation)
+    train_set, val_set = split_dataset(dataset, 0.5)
+    assert train_set.augmentation is augmentation and val_set.augmentation is None
+
+    images, _ = next(iter(create_data_loader(train_set, 3)))
+    plain = torch.stack([train_set[i][0] for i in range(3)])
+    assert not torch.allclose(images, plain)
+    torch.testing.assert_close(images, plain.flip(-1))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the micro-batching inference engine
+"""
+
+import io
+import threading
+import time
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from inference_engine import BatchingInferenceEngine, decode_image
+from job_queue import QueueFull
+
+
+class TinyClassifier(torch.nn.Module):
+    def __init__(self, num_classes=4):
+        super().__init__()
+        torch.manual_seed(0)
+        self.linear = torch.nn.Linear(3 * 8 * 8, num_classes)
+        self.batch_sizes = []
+
+    def forward(self, x):
+        self.batch_sizes.append(len(x))
+        return self.linear(x.flatten(1))
+
+
+def test_concurrent_requests_are_batched():
+    """Concurrent callers share forward passes and get their own rows back"""
+    model = TinyClassifier()
+    engine = BatchingInferenceEngine(lambda: model, max_batch_size=8, max_wait_ms=50)
+    images = [torch.randn(3, 8, 8) for _ in range(16)]
+    results = [None] * len(images)
+
+    def classify(i):
+        results[i] = engine.infer(images[i], timeout=30)
+
+    threads = [threading.Thread(target=classify, args=(i,)) for i in range(len(images))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with torch.inference_mode():
+        expected = torch.softmax(model.linear(torch.stack(images).flatten(1)), dim=1)
+    for result, row in zip(results, expected):
+        assert torch.allclose(result, row, atol=1e-6)
+
+    stats = engine.stats()
+    assert stats['images'] == 16
+    assert stats['batches'] < 16
+    assert max(model.batch_sizes) <= 8
+    assert 0 < stats['mean_batch_fill'] <= 1
+
+
+def test_queue_depth_limit():
+    """Requests beyond the queue depth are rejected"""
+    release = threading.Event()
+
+    class BlockingClassifier(TinyClassifier):
+        def forward(self, x):
+            release.wait(30)
+            return super().forward(x)
+
+    engine = BatchingInferenceEngine(BlockingClassifier, max_batch_size=1, max_wait_ms=0,
+                                     max_queue_depth=2)
+    futures = [engine.submit(torch.randn(3, 8, 8))]
+    # Wait until the batcher is blocked inside the first forward pass
+    deadline = time.monotonic() + 5
+    while engine.stats()['batches'] == 0:
+        if time.monotonic() > deadline:
+            release.set()
+            pytest.fail('the batcher did not start the first batch within 5s')
+        time.sleep(0.01)
+    futures += [engine.submit(torch.randn(3, 8, 8)) for _ in range(2)]
+    with pytest.raises(QueueFull):
+        engine.submit(torch.randn(3, 8, 8))
+
+    release.set()
+    for future in futures:
+        assert future.result(30).shape == (4,)
+
+
+def test_decode_image_reads_memoryviews_in_place():
+    """A memoryview over a larger buffer decodes like the image bytes alone"""
+    from PIL import Image
+
+    image = io.BytesIO()
+    Image.new('RGB', (40, 30), (200, 120, 40)).save(image, format='JPEG')
+    data = image.getvalue()
+    body = bytearray(b'--boundary\r\n' + data + b'\r\n--boundary--')
+    view = memoryview(body)[12:12 + len(data)]
+
+    torch.testing.assert_close(decode_image(view, (16, 16)), decode_image(data, (16, 16)))
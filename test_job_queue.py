@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the background job queue
+"""
+
+import os
+import time
+
+import pytest
+
+from job_queue import DONE, FAILED, QUEUED, JobQueue, MemoryJobStore, QueueFull, SQLiteJobStore
+
+
+def slow_square(value, delay=0.0):
+    time.sleep(delay)
+    if value < 0:
+        raise ValueError('negative value')
+    return value * value
+
+
+def crash(code):
+    os._exit(code)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteJobStore(str(tmp_path / 'jobs.sqlite3'))
+    return MemoryJobStore()
+
+
+def test_jobs_run_and_report_results(store):
+    """Jobs finish in the pool and their results can be polled"""
+    queue = JobQueue(store, max_workers=2, max_pending=8)
+    finished = []
+
+    ok = queue.submit(slow_square, 7, on_done=finished.append)
+    failed = queue.submit(slow_square, -1)
+
+    assert queue.wait(ok, timeout=30)['status'] == DONE
+    assert queue.get(ok)['result'] == 49
+    assert finished == [49]
+
+    job = queue.wait(failed, timeout=30)
+    assert job['status'] == FAILED
+    assert 'negative value' in job['error']
+    assert queue.get('missing') is None
+
+
+def test_limit_holds_under_concurrent_submits(tmp_path):
+    """Threads and processes sharing the store never queue more than max_pending"""
+    import threading
+
+    path = str(tmp_path / 'jobs.sqlite3')
+    stores = [SQLiteJobStore(path), SQLiteJobStore(path), MemoryJobStore()]
+    for shared in (stores[:2], stores[2:]):
+        barrier = threading.Barrier(16)
+        created = []
+
+        def create(index):
+            barrier.wait()
+            created.append(shared[index % len(shared)].create(f'job-{index}', 5))
+
+        threads = [threading.Thread(target=create, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert created.count(True) == 5
+        assert shared[0].count_pending() == 5
+
+
+def test_backpressure(store):
+    """Submitting beyond max_pending raises QueueFull"""
+    queue = JobQueue(store, max_workers=1, max_pending=2)
+    first = queue.submit(slow_square, 1, 0.5)
+    queue.submit(slow_square, 2, 0.5)
+    with pytest.raises(QueueFull):
+        queue.submit(slow_square, 3)
+
+    assert queue.get(first)['status'] == QUEUED
+    assert queue.stats()['pending'] == 2
+    queue.wait(first, timeout=30)
+
+
+def test_pool_recovers_from_a_dead_worker(store):
+    """A crashed pool child fails its job and later jobs get a fresh pool"""
+    queue = JobQueue(store, max_workers=1, max_pending=2)
+
+    crashed = queue.submit(crash, 1)
+    assert queue.wait(crashed, timeout=30)['status'] == FAILED
+
+    for value in range(4):
+        job_id = queue.submit(slow_square, value)
+        assert queue.wait(job_id, timeout=30)['result'] == value * value
+    assert queue.stats()['pending'] == 0
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the Prometheus metrics registry
+"""
+
+import multiprocessing
+import os
+
+from metrics import MetricsRegistry
+
+
+def make_registry(directory=None):
+    registry = MetricsRegistry(directory=directory, flush_interval=0)
+    registry.counter('requests_total', 'Requests')
+    registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    return registry
+
+
+def record_in_worker(directory):
+    registry = make_registry(directory)
+    registry.inc('requests_total', {'route': '/upload'}, value=2)
+    registry.observe('latency_seconds', 5.0, {'route': '/upload'})
+    registry.flush()
+
+
+def test_render_histogram_and_counter():
+    """Histogram buckets are cumulative and end in +Inf"""
+    registry = make_registry()
+    registry.inc('requests_total', {'route': '/upload'})
+    registry.observe('latency_seconds', 0.05, {'route': '/upload'})
+    registry.observe('latency_seconds', 0.5, {'route': '/upload'})
+
+    text = registry.render()
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'requests_total{route="/upload"} 1' in text
+    assert 'latency_seconds_bucket{route="/upload",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/upload",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{route="/upload",le="+Inf"} 2' in text
+    assert 'latency_seconds_count{route="/upload"} 2' in text
+    assert 'latency_seconds_sum{route="/upload"} 0.55' in text
+
+
+def test_values_are_summed_across_processes(tmp_path):
+    """Snapshots written by other processes are added to this one's values"""
+    worker = multiprocessing.get_context('fork').Process(target=record_in_worker, args=(str(tmp_path),))
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+
+    registry = make_registry(str(tmp_path))
+    registry.inc('requests_total', {'route': '/upload'})
+
+    text = registry.render()
+    assert 'requests_total{route="/upload"} 3' in text
+    assert 'latency_seconds_bucket{route="/upload",le="+Inf"} 1' in text
+    assert 'latency_seconds_bucket{route="/upload",le="1.0"} 0' in text
+
+
+def test_recycled_workers_are_folded_into_the_aggregate(tmp_path):
+    """Snapshots of exited workers are folded once and counters never go backwards"""
+    fork = multiprocessing.get_context('fork')
+    registry = make_registry(str(tmp_path))
+    for expected in (2, 4):
+        worker = fork.Process(target=record_in_worker, args=(str(tmp_path),))
+        worker.start()
+        worker.join()
+        assert f'requests_total{{route="/upload"}} {expected}' in registry.render()
+        # Rendering again neither loses nor double-counts the folded values
+        assert f'requests_total{{route="/upload"}} {expected}' in registry.render()
+    assert sorted(os.listdir(tmp_path)) == ['.aggregate.lock', 'aggregate.json']
+
+    # A live process's snapshot is never taken over by another registry in it
+    registry.flush(force=True)
+    other = make_registry(str(tmp_path))
+    other.flush(force=True)
+    snapshots = [name for name in os.listdir(tmp_path) if name.startswith('metrics_')]
+    assert len(snapshots) == 2 and all(name.startswith(f'metrics_{os.getpid()}_') for name in snapshots)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared nutrition table used by the web interface
+"""
+
+import numpy as np
+
+from food_matcher import TrigramIndex
+from nutrition_db import NUTRIENTS, NUTRITION_TABLE, UPLOAD_SCENARIOS
+
+
+def test_table_layout():
+    """The table is one read-only foods x nutrients matrix"""
+    assert NUTRITION_TABLE.matrix.shape == (len(NUTRITION_TABLE), len(NUTRIENTS))
+    assert NUTRITION_TABLE.matrix.flags.c_contiguous
+    assert not NUTRITION_TABLE.matrix.flags.writeable
+    for name, row in NUTRITION_TABLE.index.items():
+        assert NUTRITION_TABLE.names[row] == name
+
+
+def test_nutrition_lookup():
+    """Lookups return fresh dicts in nutrient order"""
+    apple = NUTRITION_TABLE.nutrition('apple')
+    assert list(apple) == list(NUTRIENTS)
+    assert apple['calories'] == 52
+    assert apple['vitamin_c'] == 4.6
+
+    apple['calories'] = 0
+    assert NUTRITION_TABLE.nutrition('apple')['calories'] == 52
+    np.testing.assert_array_equal(NUTRITION_TABLE.row('apple'), list(NUTRITION_TABLE.nutrition('apple').values()))
+
+
+def test_upload_scenarios_have_nutrition():
+    """Every upload scenario reads its nutrition from the shared table"""
+    for food_key in UPLOAD_SCENARIOS:
+        assert food_key in NUTRITION_TABLE
+
+
+def test_fuzzy_matcher_ranks_best_match():
+    """The trigram index returns the closest name, not the first substring hit"""
+    matcher = TrigramIndex(NUTRITION_TABLE.names)
+
+    assert matcher.match('apple') == [('apple', 1.0)]
+    assert matcher.best('grilled chicken breast') == 'chicken'
+    assert matcher.best('chiken') == 'chicken'
+    assert matcher.best('almond') == 'almonds'
+    assert matcher.best('xyz') is None
+    assert matcher.best('') is None
+
+    scores = [score for _, score in matcher.match('chicken and rice', limit=3)]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_fuzzy_matcher_rejects_lookalike_foods():
+    """Foods missing from the table stay unknown instead of matching a similar name"""
+    matcher = TrigramIndex(NUTRITION_TABLE.names)
+
+    for query in ('peach', 'pear', 'beer', 'chips', 'lemon', 'bacon', 'cake'):
+        assert matcher.best(query) is None, query
+
+    assert matcher.best('grilled chiken') == 'chicken'
+    assert matcher.best('brocoli') == 'broccoli'
+    assert matcher.best('chia seds') == 'chia seeds'
+    assert matcher.best('egg') == 'eggs'
+
+
+def test_fuzzy_matcher_candidate_budget():
+    """Restricting candidates to rare trigrams keeps the best match"""
+    names = [f"{brand} {food} {i}" for i in range(200)
+             for brand in ('acme', 'sunrise') for food in NUTRITION_TABLE.names]
+    exhaustive = TrigramIndex(names, candidate_budget=len(names) * 64)
+    budgeted = TrigramIndex(names, candidate_budget=64)
+
+    for query in ('acme apple 17', 'sunrise chia seds 123', 'acme brocoli 42'):
+        assert budgeted.match(query, limit=1) == exhaustive.match(query, limit=1)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed upload result cache
+"""
+
+import hashlib
+import io
+import time
+
+from upload_cache import MemoryResultCache, SQLiteResultCache, create_result_cache, hash_stream
+
+
+def test_hash_stream():
+    """Hashing reads the whole stream and keeps its bytes"""
+    data = bytes(range(256)) * 1000
+    digest, buffer = hash_stream(io.BytesIO(data), chunk_size=1000)
+    assert digest == hashlib.blake2b(data, digest_size=32).hexdigest()
+    assert buffer.getvalue() == data
+
+
+def check_lru_and_ttl(cache):
+    cache.put('a', {'value': 1})
+    cache.put('b', {'value': 2})
+    assert cache.get('a') == {'value': 1}
+
+    # 'b' is now least recently used and is evicted first
+    cache.put('c', {'value': 3})
+    assert cache.get('b') is None
+    assert cache.get('c') == {'value': 3}
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    cache.ttl = 0.01
+    time.sleep(0.02)
+    assert cache.get('a') is None
+
+
+def test_memory_cache():
+    """The in-process cache is a bounded LRU with TTL"""
+    check_lru_and_ttl(MemoryResultCache(max_size=2))
+
+
+def test_sqlite_cache(tmp_path):
+    """The SQLite cache behaves like the in-process one and is shared"""
+    path = str(tmp_path / 'cache' / 'results.sqlite3')
+    check_lru_and_ttl(SQLiteResultCache(path, max_size=2))
+
+    first = SQLiteResultCache(path, max_size=2)
+    second = SQLiteResultCache(path, max_size=2)
+    first.put('shared', {'food_name': 'Apple'})
+    assert second.get('shared') == {'food_name': 'Apple'}
+
+
+def test_create_result_cache(tmp_path):
+    """The backend is selected from PERFORMANCE_CONFIG"""
+    config = {'cache_size': 10, 'cache_ttl': 60}
+    assert isinstance(create_result_cache(config), MemoryResultCache)
+
+    config.update(cache_backend='sqlite', cache_path=str(tmp_path / 'results.sqlite3'))
+    cache = create_result_cache(config)
+    assert isinstance(cache, SQLiteResultCache)
+    assert cache.stats()['max_size'] == 10
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for the static/uploads janitor
+"""
+
+import os
+import time
+
+from upload_janitor import UploadJanitor, shard_relpath
+
+
+def write_upload(root, name, size, age):
+    path = root / shard_relpath(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'x' * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_shard_relpath():
+    """Uploads are spread over two levels of hash-prefix directories"""
+    relpath = shard_relpath('1234_apple.jpg')
+    first, second, name = relpath.split('/')
+    assert len(first) == len(second) == 2
+    assert name == '1234_apple.jpg'
+    assert shard_relpath('1234_apple.jpg') == relpath
+
+
+def test_sweep_evicts_expired_then_oldest(tmp_path):
+    """Expired files go first, then the oldest until under the low-water mark"""
+    state_dir = str(tmp_path / 'state')
+    uploads = tmp_path / 'uploads'
+    janitor = UploadJanitor(str(uploads), max_bytes=1000, max_age=3600, low_water_ratio=0.5,
+                            state_dir=state_dir)
+    expired = write_upload(uploads, 'expired.jpg', 100, age=7200)
+    oldest = write_upload(uploads, 'oldest.jpg', 400, age=300)
+    older = write_upload(uploads, 'older.jpg', 400, age=200)
+    newest = write_upload(uploads, 'newest.jpg', 400, age=100)
+
+    stats = janitor.sweep()
+    assert not expired.exists() and not oldest.exists() and not older.exists()
+    assert newest.exists()
+    assert (stats['bytes'], stats['files'], stats['evictions']) == (400, 1, 3)
+    # Emptied shard directories are pruned, and no janitor files are served
+    assert sorted(str(path.relative_to(uploads)) for path in uploads.rglob('*')) == [
+        str(newest.parent.parent.relative_to(uploads)),
+        str(newest.parent.relative_to(uploads)),
+        str(newest.relative_to(uploads))
+    ]
+
+    # Within quota: nothing else is removed and the stats are shared on disk
+    stats = janitor.sweep()
+    assert newest.exists()
+    assert stats['evictions'] == 3
+    assert UploadJanitor(str(uploads), 1000, 3600, state_dir=state_dir).stats()['files'] == 1
+
+
+def test_concurrent_sweeps_are_serialized(tmp_path):
+    """Only one process sweeps a directory at a time, and once per interval"""
+    first = UploadJanitor(str(tmp_path / 'uploads'), max_bytes=1000, max_age=3600,
+                          state_dir=str(tmp_path / 'state'))
+    second = UploadJanitor(str(tmp_path / 'uploads'), max_bytes=1000, max_age=3600,
+                           state_dir=str(tmp_path / 'state'))
+    with first._exclusive() as acquired:
+        assert acquired
+        assert second.sweep() is None
+    assert second.sweep() is not None
+    # Background sweeps skip a period another process already covered
+    assert first.sweep(min_interval=60) is None
+    assert first.sweep(min_interval=0) is not None
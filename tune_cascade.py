@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Offline threshold tuning for the FoodClassifier cascade
+
+Runs the fast and the full model once over a validation set, then sweeps
+the confidence and margin thresholds and computes for every pair the
+cascade accuracy and mean per-image latency (fast model always, full model
+for escalated images). The accuracy / latency trade-off is plotted and the
+Pareto-optimal settings are printed, together with the best setting for an
+optional latency budget or accuracy target.
+
+The validation directory holds one sub-directory of images per class, in
+class-index order. Without --images random inputs are used and accuracy is
+measured as agreement with the full model.
+
+Usage:
+    python tune_cascade.py [--images DIR] [--plot cascade_tradeoff.png]
+        [--latency-budget-ms 50] [--max-accuracy-drop 0.01]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from config import MODEL_CONFIG
+from food_models import list_image_folder, load_classifier, needs_escalation
+from inference_engine import decode_image
+
+def run_model(model, images):
+    """Classify images one at a time; return (probabilities, mean latency ms)"""
+    probabilities = []
+    latencies = []
+    with torch.inference_mode():
+        model(images[0])
+        for image in images:
+            start = time.perf_counter()
+            probabilities.append(torch.softmax(model(image), dim=1)[0])
+            latencies.append(time.perf_counter() - start)
+    return torch.stack(probabilities), 1000 * float(np.mean(latencies))
+
+
+def sweep(fast_probabilities, full_probabilities, labels, fast_ms, full_ms):
+    """Return [(confidence, margin, escalation rate, accuracy, mean latency ms)]"""
+    fast_correct = (fast_probabilities.argmax(1).numpy() == labels)
+    full_correct = (full_probabilities.argmax(1).numpy() == labels)
+    results = []
+    for confidence in np.round(np.arange(0.0, 1.0001, 0.05), 2):
+        for margin in np.round(np.arange(0.0, 0.5001, 0.05), 2):
+            escalated = needs_escalation(fast_probabilities, confidence, margin).numpy()
+            accuracy = float(np.where(escalated, full_correct, fast_correct).mean())
+            rate = float(escalated.mean())
+            results.append((confidence, margin, rate, accuracy, fast_ms + rate * full_ms))
+    return results
+
+
+def pareto_front(results):
+    """Settings not beaten on both accuracy and latency by another setting"""
+    front = []
+    best_accuracy = -1.0
+    for result in sorted(results, key=lambda r: (r[4], -r[3])):
+        if result[3] > best_accuracy:
+            front.append(result)
+            best_accuracy = result[3]
+    return front
+
+
+def plot(results, front, full_accuracy, full_ms, path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.scatter([r[4] for r in results], [r[3] for r in results], s=8, alpha=0.3,
+               label='threshold pairs')
+    ax.plot([r[4] for r in front], [r[3] for r in front], 'o-', color='tab:red',
+            label='Pareto front')
+    ax.scatter([full_ms], [full_accuracy], marker='*', s=150, color='black',
+               label='full model only')
+    ax.set_xlabel('mean latency per image (ms)')
+    ax.set_ylabel('accuracy')
+    ax.set_title('Cascade accuracy vs latency')
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--images', help='validation directory with one folder per class')
+    parser.add_argument('--synthetic', type=int, default=200,
+                        help='random images to use when --images is not given')
+    parser.add_argument('--num-classes', type=int, default=MODEL_CONFIG['num_classes'])
+    parser.add_argument('--plot', default='cascade_tradeoff.png')
+    parser.add_argument('--latency-budget-ms', type=float)
+    parser.add_argument('--max-accuracy-drop', type=float,
+                        help='largest accuracy loss vs the full model to accept')
+    args = parser.parse_args()
+
+    if args.images:
+        paths, labels, class_names = list_image_folder(args.images)
+        labels = np.array(labels)
+        num_classes = len(class_names)
+        images = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                images.append(decode_image(f.read(), MODEL_CONFIG['input_size']).unsqueeze(0))
+    else:
+        num_classes = args.num_classes
+        images = [torch.randn(1, 3, *MODEL_CONFIG['input_size']) for _ in range(args.synthetic)]
+        labels = None
+    print(f"Validation images: {len(images)}, classes: {num_classes}")
+
+    # Without trained weights the latencies are still representative
+    fast = load_classifier(num_classes, MODEL_CONFIG['cascade_fast_architecture'],
+                           MODEL_CONFIG['cascade_fast_weights_path'], allow_untrained=True)
+    full = load_classifier(num_classes, MODEL_CONFIG['architecture'], MODEL_CONFIG['weights_path'],
+                           allow_untrained=True)
+    fast_probabilities, fast_ms = run_model(fast, images)
+    full_probabilities, full_ms = run_model(full, images)
+    if labels is None:
+        labels = full_probabilities.argmax(1).numpy()
+
+    full_accuracy = float((full_probabilities.argmax(1).numpy() == labels).mean())
+    fast_accuracy = float((fast_probabilities.argmax(1).numpy() == labels).mean())
+    print(f"Fast model ({MODEL_CONFIG['cascade_fast_architecture']}): "
+          f"accuracy {fast_accuracy:.3f}, {fast_ms:.1f}ms/image")
+    print(f"Full model ({MODEL_CONFIG['architecture']}): "
+          f"accuracy {full_accuracy:.3f}, {full_ms:.1f}ms/image")
+
+    results = sweep(fast_probabilities, full_probabilities, labels, fast_ms, full_ms)
+    front = pareto_front(results)
+    print("\nPareto-optimal thresholds")
+    print("confidence | margin | escalated | accuracy | latency ms")
+    print("-" * 56)
+    for confidence, margin, rate, accuracy, latency in front:
+        print(f"{confidence:10.2f} | {margin:6.2f} | {100 * rate:8.1f}% | {accuracy:8.3f} | {latency:10.1f}")
+
+    candidates = front
+    if args.latency_budget_ms is not None:
+        candidates = [r for r in candidates if r[4] <= args.latency_budget_ms]
+    if args.max_accuracy_drop is not None:
+        candidates = [r for r in candidates if r[3] >= full_accuracy - args.max_accuracy_drop]
+    if args.latency_budget_ms is not None or args.max_accuracy_drop is not None:
+        if candidates:
+            # Most accurate under a latency budget, otherwise fastest meeting the target
+            pick = (max(candidates, key=lambda r: r[3]) if args.latency_budget_ms is not None
+                    else min(candidates, key=lambda r: r[4]))
+            print(f"\nRecommended: cascade_confidence_threshold={pick[0]:.2f}, "
+                  f"cascade_margin_threshold={pick[1]:.2f} "
+                  f"(accuracy {pick[3]:.3f}, {pick[4]:.1f}ms, {100 * pick[2]:.1f}% escalated)")
+        else:
+            print("\nNo threshold pair meets the requested budget")
+
+    plot(results, front, full_accuracy, full_ms, args.plot)
+    print(f"\nTrade-off plot written to {args.plot}")
+
+
+if __name__ == '__main__':
+    main()
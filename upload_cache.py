@@ -0,0 +1,181 @@
+"""
+Content-addressed result cache for image uploads
+
+Uploads are keyed by a hash of their bytes, computed while the request
+stream is read, so re-uploading the same photo returns the stored analysis
+without writing the file again or re-running detection. Two backends are
+available: an in-process LRU (per worker) and a SQLite file that all
+gunicorn workers on the host share.
+"""
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CHUNK_SIZE = 64 * 1024
+
+
+def hash_stream(stream, chunk_size=CHUNK_SIZE):
+    """
+    Read a binary stream to the end, hashing it on the way
+
+    Returns (hex digest, BytesIO holding the bytes read).
+    """
+    hasher = hashlib.blake2b(digest_size=32)
+    buffer = io.BytesIO()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        hasher.update(chunk)
+        buffer.write(chunk)
+    buffer.seek(0)
+    return hasher.hexdigest(), buffer
+
+
+class MemoryResultCache:
+    """
+    Bounded in-process LRU cache with a per-entry TTL
+    """
+
+    def __init__(self, max_size=1000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """Store value under key, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        return {
+            'backend': 'memory',
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self),
+            'max_size': self.max_size
+        }
+
+
+class SQLiteResultCache:
+    """
+    LRU cache with TTL stored in a SQLite file shared between processes
+
+    Values must be JSON serializable. Each thread keeps its own connection;
+    the database runs in WAL mode so readers do not block the writer.
+    """
+
+    def __init__(self, path, max_size=1000, ttl=3600):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'created REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        # Connections must not cross a fork, so reconnect in child processes
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value, created FROM results WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    conn.execute('DELETE FROM results WHERE key = ?', (key,))
+                self.misses += 1
+                return None
+            conn.execute('UPDATE results SET accessed = ? WHERE key = ?', (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """Store value under key, dropping expired and least recently used entries"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO results (key, value, created, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now, now)
+            )
+            conn.execute('DELETE FROM results WHERE created < ?', (now - self.ttl,))
+            conn.execute(
+                'DELETE FROM results WHERE key IN ('
+                'SELECT key FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self.max_size,)
+            )
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def stats(self):
+        """Return this process's hit/miss counters and the shared size"""
+        return {
+            'backend': 'sqlite',
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self),
+            'max_size': self.max_size
+        }
+
+
+def create_result_cache(performance_config):
+    """Build the upload result cache described by PERFORMANCE_CONFIG"""
+    max_size = performance_config['cache_size']
+    ttl = performance_config.get('cache_ttl', 3600)
+    if performance_config.get('cache_backend', 'memory') == 'sqlite':
+        return SQLiteResultCache(performance_config['cache_path'], max_size=max_size, ttl=ttl)
+    return MemoryResultCache(max_size=max_size, ttl=ttl)
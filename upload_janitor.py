@@ -0,0 +1,211 @@
+"""
+Bounded-quota lifecycle management for static/uploads
+
+Uploads are stored in hash-prefix shards (static/uploads/ab/cd/<file>) so
+no single directory grows to millions of entries. A background janitor
+periodically sweeps the tree, deleting files older than the configured age
+and, when the total size exceeds the quota, the oldest files until usage
+drops to the low-water mark. Shard directories left empty by an eviction
+are removed.
+
+Several gunicorn workers may run a janitor against the same directory: a
+sweep only proceeds while holding an exclusive lock file, and the sweep
+results (bytes, files, evictions) are written to a shared stats file so
+every worker reports the same figures. A background sweep is skipped when
+the stats show that any worker swept within the interval, so N workers
+still scan the tree once per interval. Both files live in a separate
+state directory, never in the publicly served upload tree.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sweeps are not serialized, deletes stay tolerant
+    fcntl = None
+
+LOCK_FILENAME = '.janitor.lock'
+STATS_FILENAME = '.janitor_stats.json'
+
+
+def shard_relpath(filename, depth=2):
+    """Return the '/'-separated shard path for an upload filename"""
+    digest = hashlib.md5(filename.encode('utf-8')).hexdigest()
+    return '/'.join([digest[2 * i:2 * i + 2] for i in range(depth)] + [filename])
+
+
+class UploadJanitor:
+    """
+    Background thread enforcing an age and size quota on an upload directory
+    """
+
+    def __init__(self, root, max_bytes, max_age, interval=300, low_water_ratio=0.9,
+                 state_dir=None):
+        self.root = root
+        # Without a state directory, one per upload root in the system temp directory
+        self.state_dir = state_dir or os.path.join(
+            tempfile.gettempdir(),
+            'upload_janitor_' + hashlib.md5(os.path.abspath(root).encode('utf-8')).hexdigest()[:12])
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self.low_water_ratio = low_water_ratio
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, root, storage_config):
+        """Build a janitor from UPLOAD_STORAGE_CONFIG"""
+        return cls(
+            root,
+            max_bytes=storage_config['max_bytes'],
+            max_age=storage_config['max_age'],
+            interval=storage_config['sweep_interval'],
+            low_water_ratio=storage_config['low_water_ratio'],
+            state_dir=storage_config['state_dir']
+        )
+
+    def start(self):
+        """Start sweeping in a daemon thread (no-op if already running here)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='upload-janitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the sweeping thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep(min_interval=self.interval)
+            except OSError as e:
+                print(f"Upload janitor sweep failed: {e}")
+            self._stop.wait(self.interval)
+
+    @contextmanager
+    def _exclusive(self):
+        """Yield True if this process holds the sweep lock"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(self.state_dir, LOCK_FILENAME), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _scan(self):
+        """Return [(mtime, size, path)] for every upload under root"""
+        files = []
+        stack = [self.root]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            files.append((stat.st_mtime, stat.st_size, entry.path))
+                    except FileNotFoundError:
+                        continue
+        return files
+
+    def sweep(self, min_interval=0):
+        """
+        Run one eviction pass
+
+        Returns the updated stats, or None if another process is sweeping or
+        any process swept less than min_interval seconds ago.
+        """
+        with self._exclusive() as acquired:
+            if not acquired:
+                return None
+
+            now = time.time()
+            # Read under the lock, so the sweep that just finished is seen
+            last_sweep = self.stats()['last_sweep']
+            if last_sweep is not None and now - last_sweep < min_interval:
+                return None
+            files = sorted(self._scan())
+            total_bytes = sum(size for _, size, _ in files)
+            evicted = 0
+
+            # Oldest first: drop expired files, then keep going while over quota
+            low_water = self.max_bytes * self.low_water_ratio
+            over_quota = total_bytes > self.max_bytes
+            for mtime, size, path in files:
+                expired = now - mtime > self.max_age
+                if not expired and not (over_quota and total_bytes > low_water):
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self._prune(os.path.dirname(path))
+                total_bytes -= size
+                evicted += 1
+
+            stats = self.stats()
+            stats.update(
+                bytes=total_bytes,
+                files=len(files) - evicted,
+                evictions=stats['evictions'] + evicted,
+                last_sweep=now
+            )
+            self._write_stats(stats)
+            return stats
+
+    def _prune(self, directory):
+        """Remove directory and its parents below root while they are empty"""
+        root = os.path.abspath(self.root)
+        directory = os.path.abspath(directory)
+        while directory != root and directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:  # not empty, or already gone
+                return
+            directory = os.path.dirname(directory)
+
+    def _write_stats(self, stats):
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = os.path.join(self.state_dir, STATS_FILENAME)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, path)
+
+    def stats(self):
+        """Return bytes, files and evictions as of the latest sweep by any process"""
+        stats = {'bytes': 0, 'files': 0, 'evictions': 0, 'last_sweep': None}
+        try:
+            with open(os.path.join(self.state_dir, STATS_FILENAME)) as f:
+                stats.update(json.load(f))
+        except (FileNotFoundError, ValueError):
+            pass
+        stats.update(max_bytes=self.max_bytes, max_age=self.max_age)
+        return stats
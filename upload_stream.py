@@ -0,0 +1,70 @@
+"""
+In-memory handling of uploaded images
+
+By default Werkzeug spools multipart file parts larger than 500KB to a
+temporary file, and the app then saved that file again under
+UPLOAD_FOLDER before detection re-read it. InMemoryUploadRequest keeps
+every part in a BytesIO instead (uploads are already capped by
+MAX_CONTENT_LENGTH), and read_upload hands out a memoryview over that
+buffer so hashing and detection work on the received bytes without copies.
+"""
+
+import hashlib
+import io
+import os
+
+from flask import Request
+
+from upload_cache import hash_stream
+
+
+class UploadBuffer(io.BytesIO):
+    """
+    BytesIO for one uploaded file that tolerates live buffer views
+
+    Werkzeug closes request files when the request context ends, which can
+    happen before a deferred write has finished with its memoryview.
+    BytesIO.close() refuses to run while views exist; the memory is then
+    released once the last view is dropped.
+    """
+
+    def close(self):
+        try:
+            super().close()
+        except BufferError:
+            pass
+
+
+class InMemoryUploadRequest(Request):
+    """Flask request class that never spools file uploads to disk"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return UploadBuffer()
+
+
+def read_upload(stream):
+    """
+    Return (hex digest, memoryview) for an uploaded file stream
+
+    Streams created by InMemoryUploadRequest are viewed in place; anything
+    else is read and hashed chunk by chunk into a new buffer.
+    """
+    if isinstance(stream, io.BytesIO):
+        view = stream.getbuffer()
+        return hashlib.blake2b(view, digest_size=32).hexdigest(), view
+    digest, buffer = hash_stream(stream)
+    return digest, buffer.getbuffer()
+
+
+def save_upload(filepath, image_data):
+    """Write an uploaded image buffer to disk"""
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    try:
+        f = open(filepath, 'wb')
+    except FileNotFoundError:
+        # The upload janitor pruned the shard directory while it was empty
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        f = open(filepath, 'wb')
+    with f:
+        f.write(image_data)